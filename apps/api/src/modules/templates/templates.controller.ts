@@ -63,6 +63,13 @@ export class TemplatesController {
     const filename = `${Date.now()}-${Math.random().toString(16).slice(2)}.pptx`;
     const fullpath = path.join(baseDir, filename);
     await fs.writeFile(fullpath, file.buffer);
+    // notebook-service 側でテンプレートを検証し、解析済みキャッシュに載せておく（失敗してもアップロードは継続）
+    const notebookUrl = process.env.NOTEBOOK_SERVICE_URL || 'http://localhost:8000';
+    fetch(`${notebookUrl}/templates/preflight`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ templatePath: fullpath }),
+    }).catch(() => undefined);
     const content = {
       storagePath: fullpath,
       originalName: file.originalname,
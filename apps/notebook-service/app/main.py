@@ -1,18 +1,155 @@
 from __future__ import annotations
+import asyncio
+import hmac
+import io
+import json
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+import pstats
+import shutil
+import tempfile
+import weakref
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Iterator, Optional
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from .schemas import HealthResponse, ParseResponse
-from .schemas_export import ExportRequest, ExportJob
-from .services.parser import parse_ipynb_bytes
-from .services.exporter import Exporter
+from .schemas_export import (
+    ExportBatch,
+    ExportBatchRequest,
+    ExportRequest,
+    ExportJob,
+    TemplatePreflightRequest,
+    TemplatePreflightResponse,
+)
+from .services.parser import ParseMode, parse_ipynb_bytes, iter_ipynb_cells
+from .services.exporter import Exporter, IdempotencyKeyConflict
+from .services.engine import ExportEngine
+from .services.blob_store import LocalBlobStore, sniff_media_type
+from .services.sweeper import ExportSweeper
+from .services.downloads import artifact_response, download_filename
+from .services.metrics import BYTES, CONTENT_TYPE, REGISTRY, Counter, Gauge, rss_bytes
 
 
 APP_VERSION = os.getenv("APP_VERSION", "0.1.0")
 EXPORT_OUT_DIR = os.getenv("EXPORT_OUT_DIR", os.path.join(os.getcwd(), "exports"))
+# /export/batch で 1 回に受け付けるリクエスト数の上限
+EXPORT_BATCH_MAX_ITEMS = int(os.getenv("EXPORT_BATCH_MAX_ITEMS", "500"))
+# ダウンロードの Cache-Control max-age（秒）。期限後は ETag で再検証させる
+EXPORT_DOWNLOAD_MAX_AGE = int(os.getenv("EXPORT_DOWNLOAD_MAX_AGE", "0"))
+# プロファイル取得: ヘッダ X-Export-Profile にこのトークンを付けたリクエストは計測する
+# （未設定なら無効）。リクエストの profile フラグは EXPORT_PROFILE_ALLOW_REQUEST=true のときだけ
+# 受け付ける（既定では拒否。運用者が明示的に許可する）
+EXPORT_PROFILE_TOKEN = os.getenv("EXPORT_PROFILE_TOKEN", "")
+EXPORT_PROFILE_ALLOW_REQUEST = os.getenv(
+    "EXPORT_PROFILE_ALLOW_REQUEST", "false"
+).strip().lower() in ("1", "true", "yes", "on")
+# /export-jobs/{job_id}/events がジョブストアを確認する間隔と、keep-alive コメントの間隔（秒）
+EXPORT_EVENTS_POLL_SECONDS = float(os.getenv("EXPORT_EVENTS_POLL_SECONDS", "0.25"))
+EXPORT_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EXPORT_EVENTS_KEEPALIVE_SECONDS", "15"))
 
-app = FastAPI(title="Notebook Service", version=APP_VERSION)
-exporter = Exporter(EXPORT_OUT_DIR)
+# BLOB_STORE_DIR, BLOB_REF_MIN_BYTES, BLOB_RETENTION_SECONDS, BLOB_MAX_BYTES
+blob_store = LocalBlobStore.from_env()
+# EXPORT_EXECUTOR=inline|thread|process, EXPORT_MAX_WORKERS, EXPORT_MAX_JOBS_PER_WORKER
+# JOB_STORE=memory|sqlite, JOB_STORE_PATH, JOB_TTL_SECONDS
+exporter = Exporter(EXPORT_OUT_DIR, engine=ExportEngine.from_env(), blob_store=blob_store)
+# EXPORT_RETENTION_SECONDS, EXPORT_MAX_BYTES, EXPORT_TMP_GRACE_SECONDS,
+# EXPORT_SWEEP_INTERVAL_SECONDS
+# Blob ストアの BLOB_RETENTION_SECONDS, BLOB_MAX_BYTES も同じスイーパーで適用する
+sweeper = ExportSweeper.from_env(EXPORT_OUT_DIR, exporter.job_store, blob_store)
+
+
+def _cache_requests():
+    v = exporter.visual_cache.stats()
+    yield {"cache": "visual", "result": "hit_memory"}, v["hits_memory"]
+    yield {"cache": "visual", "result": "hit_disk"}, v["hits_disk"]
+    yield {"cache": "visual", "result": "miss"}, v["misses"]
+    t = exporter.template_cache.stats()
+    yield {"cache": "template", "result": "hit_memory"}, t["hits"]
+    yield {"cache": "template", "result": "miss"}, t["misses"]
+    f = exporter.fragment_cache.stats()
+    if f:
+        yield {"cache": "fragment", "result": "hit_memory"}, f["hits_memory"]
+        yield {"cache": "fragment", "result": "hit_disk"}, f["hits_disk"]
+        yield {"cache": "fragment", "result": "miss"}, f["misses"]
+
+
+def _cache_bytes():
+    v = exporter.visual_cache.stats()
+    yield {"cache": "visual", "tier": "memory"}, v["memory_bytes"]
+    yield {"cache": "visual", "tier": "disk"}, v["disk_bytes"]
+    yield {"cache": "template", "tier": "memory"}, exporter.template_cache.stats()["bytes"]
+    f = exporter.fragment_cache.stats()
+    if f:
+        yield {"cache": "fragment", "tier": "memory"}, f["memory_bytes"]
+        yield {"cache": "fragment", "tier": "disk"}, f["disk_bytes"]
+
+
+def _process_rss():
+    yield {"role": "api", "pid": os.getpid()}, rss_bytes()
+    for pid in exporter.engine.worker_pids():
+        yield {"role": "export_worker", "pid": pid}, rss_bytes(pid)
+    for pid in exporter.plotly_renderer.pids():
+        yield {"role": "plotly_renderer", "pid": pid}, rss_bytes(pid)
+
+
+# スクレイプ時に各コンポーネントの統計から値を求めるメトリクス
+REGISTRY.register(
+    Counter(
+        "notebook_cache_requests_total",
+        "Cache lookups by cache and result.",
+        ("cache", "result"),
+        _cache_requests,
+    )
+)
+REGISTRY.register(
+    Gauge("notebook_cache_bytes", "Bytes held by caches.", ("cache", "tier"), _cache_bytes)
+)
+REGISTRY.register(
+    Counter(
+        "notebook_export_dedup_total",
+        "Export requests and deduplication outcomes.",
+        ("result",),
+        lambda: (({"result": k}, v) for k, v in dict(exporter.dedup_stats).items()),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "notebook_export_jobs_inflight",
+        "Export jobs waiting for or holding an execution slot in this process.",
+        ("state",),
+        lambda: [
+            ({"state": "queued"}, exporter.engine.queued),
+            ({"state": "running"}, exporter.engine.running),
+        ],
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "notebook_process_rss_bytes",
+        "Resident memory of the API process and its workers.",
+        ("role", "pid"),
+        _process_rss,
+    )
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if exporter.engine.mode != "process":
+        # Kaleido の描画プロセスを先に温めておく（process モードでは各ワーカーが自前で描画する）
+        exporter.plotly_renderer.start()
+    sweeper.start()
+    yield
+    sweeper.stop()
+    exporter.engine.shutdown(wait=False)
+    exporter.plotly_renderer.shutdown()
+    exporter.visual_pool.shutdown()
+    exporter.job_store.close()
+
+
+app = FastAPI(title="Notebook Service", version=APP_VERSION, lifespan=lifespan)
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -20,31 +157,160 @@ def health() -> HealthResponse:
     return HealthResponse(version=APP_VERSION)
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    # Prometheus のテキスト形式。uvicorn を複数ワーカーで動かす場合は値はワーカー毎
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/parse", response_model=ParseResponse)
-async def parse(file: UploadFile = File(...)) -> ParseResponse:
+async def parse(
+    file: Annotated[UploadFile, File()], mode: Optional[ParseMode] = None, refs: bool = False
+) -> ParseResponse:
     if not file.filename.endswith(".ipynb"):
         raise HTTPException(status_code=400, detail="Only .ipynb is supported")
     content = await file.read()
+    BYTES.inc(len(content), direction="in", kind="notebook")
     try:
-        cells = parse_ipynb_bytes(content, file.filename)
+        cells = parse_ipynb_bytes(content, file.filename, mode, blob_store if refs else None)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid notebook file")
     return ParseResponse(name=file.filename, cells=cells)
 
 
-@app.post("/export", response_model=ExportJob)
-async def export(req: ExportRequest) -> ExportJob:
-    job = exporter.create_job()
+def _spool_upload(src, chunk_size: int = 1 << 20) -> str:
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=".ipynb")
+    with os.fdopen(fd, "wb") as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+    return path
+
+
+def _remove_file(path: str) -> None:
     try:
-        # 同期実行（本番では背景ジョブに）
-        exporter.run(job.jobId, req)
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@app.post("/parse/stream")
+async def parse_stream(
+    file: Annotated[UploadFile, File()], refs: bool = False
+) -> StreamingResponse:
+    """巨大なノートブック向けのストリーミング解析。セルを 1 行 1 件の NDJSON で返す。
+
+    レスポンス送信開始後に不正な JSON を検出した場合は、最終行に {"error": ...} を返す。
+    """
+    if not file.filename.endswith(".ipynb"):
+        raise HTTPException(status_code=400, detail="Only .ipynb is supported")
+    # アップロードはディスクに退避し、レスポンス中はそこから逐次読み出す
+    path = await run_in_threadpool(_spool_upload, file.file)
+    BYTES.inc(os.path.getsize(path), direction="in", kind="notebook")
+    name = file.filename
+
+    def lines() -> Iterator[bytes]:
+        try:
+            with open(path, "rb") as fp:
+                for cell in iter_ipynb_cells(fp, name, blob_store if refs else None):
+                    yield cell.model_dump_json().encode("utf-8") + b"\n"
+        except Exception:
+            yield json.dumps({"error": "Invalid notebook file"}).encode("utf-8") + b"\n"
+
+    body = lines()
+    # 一時ファイルは送信後に消す。送信前の切断などで本文が読まれないままレスポンスが
+    # 破棄された場合（バックグラウンドタスクも実行されない）は、本文の破棄時に消す
+    weakref.finalize(body, _remove_file, path)
+    return StreamingResponse(
+        body, media_type="application/x-ndjson", background=BackgroundTask(_remove_file, path)
+    )
+
+
+@app.get("/blobs/{sha}")
+def get_blob(sha: str) -> Response:
+    # /parse?refs=true が返す {"$ref": sha256} の実体
+    data = blob_store.get(sha)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return Response(
+        content=data,
+        media_type=sniff_media_type(data),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.post("/templates/preflight", response_model=TemplatePreflightResponse)
+def preflight_template(req: TemplatePreflightRequest) -> TemplatePreflightResponse:
+    # テンプレートのアップロード時に呼び出し、検証とキャッシュの事前読み込みを行う
+    try:
+        info = exporter.template_cache.preflight(req.templatePath)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Template not found") from e
     except Exception as e:
-        j = exporter.get_job(job.jobId)
-        if j:
-            j.status = "failed"
-            j.error = f"failed: {e}"
-        return j  # type: ignore
-    return exporter.get_job(job.jobId)  # type: ignore
+        return TemplatePreflightResponse(
+            templatePath=req.templatePath, valid=False, errors=[f"invalid template: {e}"]
+        )
+    return TemplatePreflightResponse(templatePath=req.templatePath, **info)
+
+
+def _with_profiling(req: ExportRequest, token: Optional[str]) -> ExportRequest:
+    if token is not None:
+        if not EXPORT_PROFILE_TOKEN or not hmac.compare_digest(token, EXPORT_PROFILE_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid profiling token")
+        return req.model_copy(update={"profile": True})
+    if req.profile and not EXPORT_PROFILE_ALLOW_REQUEST:
+        raise HTTPException(status_code=403, detail="Profiling requires X-Export-Profile")
+    return req
+
+
+def _count_request_bytes(request: Request) -> None:
+    size = int(request.headers.get("content-length") or 0)
+    BYTES.inc(size, direction="in", kind="export_request")
+
+
+@app.post("/export", response_model=ExportJob)
+async def export(
+    req: ExportRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    profile_token: Optional[str] = Header(None, alias="X-Export-Profile"),
+) -> ExportJob:
+    _count_request_bytes(request)
+    req = _with_profiling(req, profile_token)
+    # 実行エンジンに投入して即座に返す（状態は /export-jobs/{job_id} で確認）。
+    # 同じリクエストの実行中/完了済みジョブがあれば、そのジョブを返す
+    try:
+        return await run_in_threadpool(exporter.submit_request, req, idempotency_key)
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+
+@app.post("/export/batch", response_model=ExportBatch)
+async def export_batch(
+    batch: ExportBatchRequest,
+    request: Request,
+    profile_token: Optional[str] = Header(None, alias="X-Export-Profile"),
+) -> ExportBatch:
+    _count_request_bytes(request)
+    batch.requests = [_with_profiling(r, profile_token) for r in batch.requests]
+    # 複数のレポートをまとめて投入する（ジョブは 1 件ずつ実行し、共通の図の描画はバッチ内で 1 回）。
+    # 状態は /export-batches/{batch_id}、各ジョブは /export-jobs/{job_id} で確認
+    if len(batch.requests) > EXPORT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Too many requests in batch (max {EXPORT_BATCH_MAX_ITEMS})"
+        )
+    return await run_in_threadpool(exporter.submit_batch, batch.requests)
+
+
+@app.get("/export-batches/{batch_id}", response_model=ExportBatch)
+def get_export_batch(batch_id: str) -> ExportBatch:
+    batch = exporter.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@app.get("/export-stats")
+def export_stats() -> dict:
+    return {"dedup": dict(exporter.dedup_stats)}
 
 
 @app.get("/export-jobs/{job_id}", response_model=ExportJob)
@@ -55,53 +321,106 @@ def get_export_job(job_id: str) -> ExportJob:
     return job
 
 
-@app.get("/exports/{job_id}.pptx")
-def download_export(job_id: str):
-    path = os.path.join(EXPORT_OUT_DIR, f"{job_id}.pptx")
+def _sse(event_id: int, event: str, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/export-jobs/{job_id}/events")
+async def export_job_events(job_id: str, request: Request) -> StreamingResponse:
+    # 状態遷移（event: state）と進捗（event: progress）を Server-Sent Events で送る。
+    # completed/failed/expired で終了する。ジョブストアの確認はサーバー内で行うので、
+    # 別ワーカー/プロセスで実行中のジョブ（JOB_STORE=sqlite）も追える
+    job = await run_in_threadpool(exporter.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        current: Optional[ExportJob] = job
+        last_status: Optional[str] = None
+        last_progress: Optional[dict] = None
+        event_id = 0
+        idle = 0.0
+        while True:
+            if current is None:
+                # TTL で消えた
+                event_id += 1
+                yield _sse(event_id, "state", {"jobId": job_id, "status": "expired"})
+                return
+            if current.status != last_status:
+                event_id += 1
+                yield _sse(event_id, "state", current.model_dump())
+                last_status, last_progress, idle = current.status, current.progress, 0.0
+            elif current.progress != last_progress:
+                event_id += 1
+                yield _sse(event_id, "progress", {"jobId": job_id, **(current.progress or {})})
+                last_progress, idle = current.progress, 0.0
+            if current.status in ("completed", "failed", "expired"):
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(EXPORT_EVENTS_POLL_SECONDS)
+            idle += EXPORT_EVENTS_POLL_SECONDS
+            if idle >= EXPORT_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            current = await run_in_threadpool(exporter.get_job, job_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/export-sweeper/stats")
+def export_sweeper_stats() -> dict:
+    return sweeper.stats()
+
+
+def _artifact_path(job_id: str, ext: str) -> str:
+    path = os.path.join(EXPORT_OUT_DIR, f"{job_id}.{ext}")
     if not os.path.exists(path):
+        job = exporter.get_job(job_id)
+        if job is not None and job.status == "expired":
+            # 保持期間/容量上限によりスイーパーが削除した
+            raise HTTPException(status_code=410, detail="Export expired")
         raise HTTPException(status_code=404, detail="File not found")
-    # ダウンロード名にタイトル/プロジェクトID/日時を含める（URLはjobIdのまま）
-    filename = f"report-{job_id}.pptx"
+    sweeper.touch(path)
+    return path
+
+
+def _download(request: Request, job_id: str, ext: str, media_type: str) -> Response:
+    path = _artifact_path(job_id, ext)
     try:
-        meta = exporter.job_meta.get(job_id, {})
-        title = meta.get("title") or "report"
-        project_id = (meta.get("metadata") or {}).get("projectId")
-        project_name = (meta.get("metadata") or {}).get("projectName")
-        ts = os.path.getmtime(path)
-        stamp = __import__("datetime").datetime.utcfromtimestamp(ts).strftime("%Y%m%d-%H%M%S")
-        def slug(s: str) -> str:
-            import re
-            return re.sub(r"[^A-Za-z0-9_.-]+", "-", s).strip("-_.")[:60] or "report"
-        base = slug(f"{(project_name or project_id) or 'project'}_{title}_{stamp}")
-        filename = f"{base}.pptx"
-    except Exception:
-        pass
-    return FileResponse(
-        path,
-        media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        filename=filename,
+        st = os.stat(path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail="File not found") from e
+    # ダウンロード名にタイトル/プロジェクトID/日時を含める（URLはjobIdのまま）
+    filename = download_filename(exporter.get_job_meta(job_id), job_id, ext, st.st_mtime)
+    # ETag/Last-Modified による 304 と Range による 206（再オープンや中断したダウンロードの再開）
+    return artifact_response(
+        request.headers, path, media_type, filename, EXPORT_DOWNLOAD_MAX_AGE, st
     )
 
 
+@app.get("/exports/{job_id}.pptx")
+def download_export(job_id: str, request: Request):
+    media_type = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+    return _download(request, job_id, "pptx", media_type)
+
+
 @app.get("/exports/{job_id}.pdf")
-def download_export_pdf(job_id: str):
-    path = os.path.join(EXPORT_OUT_DIR, f"{job_id}.pdf")
-    if not os.path.exists(path):
-        raise HTTPException(status_code=404, detail="File not found")
-    # ダウンロード名はPPTXと同じ規則でベースを生成
-    filename = f"report-{job_id}.pdf"
-    try:
-        meta = exporter.job_meta.get(job_id, {})
-        title = meta.get("title") or "report"
-        project_id = (meta.get("metadata") or {}).get("projectId")
-        project_name = (meta.get("metadata") or {}).get("projectName")
-        ts = os.path.getmtime(path)
-        stamp = __import__("datetime").datetime.utcfromtimestamp(ts).strftime("%Y%m%d-%H%M%S")
-        def slug(s: str) -> str:
-            import re
-            return re.sub(r"[^A-Za-z0-9_.-]+", "-", s).strip("-_.")[:60] or "report"
-        base = slug(f"{(project_name or project_id) or 'project'}_{title}_{stamp}")
-        filename = f"{base}.pdf"
-    except Exception:
-        pass
-    return FileResponse(path, media_type="application/pdf", filename=filename)
+def download_export_pdf(job_id: str, request: Request):
+    return _download(request, job_id, "pdf", "application/pdf")
+
+
+@app.get("/exports/{job_id}.prof")
+def download_export_profile(job_id: str, request: Request, format: Optional[str] = None):
+    # profile 指定のエクスポートで取得した cProfile の結果
+    # （pstats 形式。format=text で上位の関数を表示）
+    if format == "text":
+        path = _artifact_path(job_id, "prof")
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(50)
+        return PlainTextResponse(out.getvalue())
+    return _download(request, job_id, "prof", "application/octet-stream")
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
-from typing import Literal
 
 
 class ExportMetadata(BaseModel):
@@ -11,6 +10,10 @@ class ExportMetadata(BaseModel):
     reportId: Optional[str] = None
     author: Optional[str] = None
     dataSources: Optional[List[str]] = None
+    projectName: Optional[str] = None
+    pdfStyle: Optional[Dict[str, Any]] = Field(
+        None, description="PDF layout: margins, font sizes, bodyLeading, columns, columnGap"
+    )
 
 
 class ExportRequest(BaseModel):
@@ -19,6 +22,13 @@ class ExportRequest(BaseModel):
     metadata: Optional[ExportMetadata] = None
     templatePath: Optional[str] = Field(None, description="PPTX template path (optional)")
     format: Literal['pptx', 'pdf'] = Field('pptx', description="Output format")
+    profile: bool = Field(
+        False,
+        description=(
+            "Capture a cProfile profile of this export (downloadable as profileUrl); "
+            "rejected unless EXPORT_PROFILE_ALLOW_REQUEST is enabled"
+        ),
+    )
 
 
 class ExportJob(BaseModel):
@@ -26,3 +36,36 @@ class ExportJob(BaseModel):
     status: str
     error: Optional[str] = None
     downloadUrl: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = Field(
+        None, description="stage, items/itemsTotal, cachedItems, visuals, pages, bytes"
+    )
+    timings: Optional[Dict[str, float]] = Field(
+        None, description="Seconds per pipeline stage ('stage:detail') and total"
+    )
+    profileUrl: Optional[str] = None
+    memory: Optional[Dict[str, Any]] = Field(
+        None,
+        description="bounded, startRssBytes, peakRssBytes (process RSS), jobBytes, spilledBytes",
+    )
+
+
+class ExportBatchRequest(BaseModel):
+    requests: List[ExportRequest] = Field(..., min_length=1, description="ExportRequest[]")
+
+
+class ExportBatch(BaseModel):
+    batchId: str
+    status: str
+    counts: Dict[str, int] = Field(default_factory=dict, description="ジョブの状態毎の件数")
+    jobs: List[ExportJob] = Field(default_factory=list)
+
+
+class TemplatePreflightRequest(BaseModel):
+    templatePath: str = Field(..., description="PPTX template path")
+
+
+class TemplatePreflightResponse(BaseModel):
+    templatePath: str
+    valid: bool
+    layouts: int = 0
+    errors: List[str] = Field(default_factory=list)
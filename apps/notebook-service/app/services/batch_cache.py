@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+from typing import Dict, Iterable
+
+from .fragment_cache import FragmentCache
+from .visual_cache import VisualCache
+
+
+class _LayeredStore:
+    """バッチ用の層（top）を共通のキャッシュ（base）の前に置く。書き込みは両方に行う。"""
+
+    def __init__(self, top: VisualCache, base: VisualCache | None):
+        self.top = top
+        self.base = base
+
+    def get(self, key: str) -> bytes | None:
+        data = self.top.get(key)
+        if data is None and self.base is not None:
+            data = self.base.get(key)
+            if data is not None:
+                self.top.put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.top.put(key, data)
+        if self.base is not None:
+            self.base.put(key, data)
+
+    def stats(self) -> Dict[str, int]:
+        return self.top.stats()
+
+
+class BatchCache:
+    """バッチ内のジョブで共有する、可視出力とフラグメントのキャッシュ層。
+
+    バッチの各リクエストは通常のジョブとして 1 件ずつ実行エンジンに投入し、共通の図や同じ項目は
+    この層を通して使い回す（共通のキャッシュが小さい/無効でもバッチ内では 1 回の描画で済む）。
+    同じプロセス内のジョブは準備（ラスタライズ）を lock で順に行うので、同時に実行されても
+    共通の図を二重に描画しない。process モードではプロセス間で共有できるよう cache_dir に置く
+    （ワーカーは open で開く）。すべてのジョブが done を呼ぶと破棄する。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | None,
+        visual_cache: VisualCache | None,
+        fragment_cache: FragmentCache,
+        max_memory_bytes: int = 128 << 20,
+        max_disk_bytes: int = 1 << 30,
+        job_ids: Iterable[str] = (),
+    ):
+        self.cache_dir = cache_dir
+        disk = max_disk_bytes if cache_dir else 0
+
+        def layer(name: str, suffix: str) -> VisualCache:
+            path = os.path.join(cache_dir, name) if cache_dir else None
+            return VisualCache(path, max_memory_bytes, disk, suffix=suffix)
+
+        self.visuals = _LayeredStore(layer("visuals", ".png"), visual_cache)
+        self.fragments = FragmentCache(
+            _LayeredStore(layer("fragments", ".frag"), fragment_cache.store)  # type: ignore[arg-type]
+        )
+        self.lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = set(job_ids)
+
+    @classmethod
+    def from_env(
+        cls,
+        out_dir: str,
+        batch_id: str,
+        visual_cache: VisualCache | None,
+        fragment_cache: FragmentCache,
+        job_ids: Iterable[str],
+        shared: bool = False,
+    ) -> "BatchCache":
+        """shared ならプロセス間で共有するため {out_dir}/.batch-cache/{batch_id} に置く。"""
+        mem = int(os.getenv("EXPORT_BATCH_CACHE_MEMORY_BYTES", str(128 << 20)))
+        disk = int(os.getenv("EXPORT_BATCH_CACHE_DISK_BYTES", str(1 << 30)))
+        cache_dir = os.path.join(out_dir, ".batch-cache", batch_id) if shared else None
+        return cls(cache_dir, visual_cache, fragment_cache, mem, disk, job_ids)
+
+    @classmethod
+    def open(
+        cls, cache_dir: str, visual_cache: VisualCache | None, fragment_cache: FragmentCache
+    ) -> "BatchCache":
+        """process モードのワーカーで、親プロセスが作ったバッチの層を開く（メモリ層は持たない）。"""
+        disk = int(os.getenv("EXPORT_BATCH_CACHE_DISK_BYTES", str(1 << 30)))
+        return cls(cache_dir, visual_cache, fragment_cache, 0, disk)
+
+    def done(self, job_id: str) -> None:
+        """ジョブの終了（成功/失敗）を記録する。最後のジョブが終わったら層を破棄する。"""
+        with self._pending_lock:
+            if job_id not in self._pending:
+                return
+            self._pending.discard(job_id)
+            if self._pending:
+                return
+        self.close()
+
+    def close(self) -> None:
+        if self.cache_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
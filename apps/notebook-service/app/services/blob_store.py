@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def blob_ref(value: Any) -> str | None:
+    """{"$ref": "<sha256>"} 形式のハンドルなら sha256 を返す。"""
+    if isinstance(value, dict) and len(value) == 1:
+        ref = value.get("$ref")
+        if isinstance(ref, str) and _SHA256_RE.match(ref):
+            return ref
+    return None
+
+
+def sniff_media_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    head = data[:256].lstrip()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in data[:4096]):
+        return "image/svg+xml"
+    if head.startswith(b"{") or head.startswith(b"["):
+        return "application/json"
+    return "application/octet-stream"
+
+
+class LocalBlobStore:
+    """ローカルファイルシステム上の内容アドレス型 Blob ストア（キーは内容の sha256）。
+
+    /parse で大きな出力（PNG / SVG / Plotly JSON）を退避し、レスポンスや ExportRequest には
+    {"$ref": "<sha256>"} だけを載せるために使う。
+    保持期間は sweep（ExportSweeper から定期的に呼ぶ）で適用する:
+    - max_age_seconds: 最終アクセス（put / get で atime を更新）からの保持期間（0 で無期限）
+    - max_bytes: 合計サイズ上限（0 で無制限）。超えた分は最終アクセスの古い順に削除
+    """
+
+    def __init__(
+        self,
+        root: str,
+        ref_min_bytes: int = 64 * 1024,
+        max_age_seconds: float = 0,
+        max_bytes: int = 0,
+        tmp_grace_seconds: float = 3600,
+    ):
+        self.root = root
+        self.ref_min_bytes = max(0, int(ref_min_bytes))
+        self.max_age_seconds = max(0.0, float(max_age_seconds))
+        self.max_bytes = max(0, int(max_bytes))
+        self.tmp_grace_seconds = max(0.0, float(tmp_grace_seconds))
+
+    @classmethod
+    def from_env(cls) -> "LocalBlobStore":
+        root = os.getenv("BLOB_STORE_DIR", os.path.join(os.getcwd(), "blobs"))
+        return cls(
+            root,
+            int(os.getenv("BLOB_REF_MIN_BYTES", str(64 * 1024))),
+            max_age_seconds=float(os.getenv("BLOB_RETENTION_SECONDS", str(7 * 86400))),
+            max_bytes=int(os.getenv("BLOB_MAX_BYTES", "0")),
+        )
+
+    def path(self, sha: str) -> str:
+        if not _SHA256_RE.match(sha):
+            raise ValueError("invalid blob id")
+        return os.path.join(self.root, sha[:2], sha)
+
+    def put(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.path(sha)
+        if os.path.exists(path):
+            # 同じ内容の再アップロードは保持期間を延ばす
+            self._touch(path)
+            return sha
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return sha
+
+    def get(self, sha: str) -> bytes | None:
+        try:
+            path = self.path(sha)
+            with open(path, "rb") as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return data
+
+    def exists(self, sha: str) -> bool:
+        try:
+            return os.path.exists(self.path(sha))
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        # noatime でマウントされていても LRU に使えるよう明示的に更新する
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str]], List[Tuple[float, str]]]:
+        blobs: List[Tuple[float, int, str]] = []
+        tmps: List[Tuple[float, str]] = []
+        try:
+            shards = [e for e in os.scandir(self.root) if e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return blobs, tmps
+        for shard in shards:
+            try:
+                entries = list(os.scandir(shard.path))
+            except FileNotFoundError:
+                continue
+            for e in entries:
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if _SHA256_RE.match(e.name):
+                    blobs.append((max(st.st_atime, st.st_mtime), st.st_size, e.path))
+                elif e.name.endswith(".tmp"):
+                    tmps.append((st.st_mtime, e.path))
+        return blobs, tmps
+
+    def sweep(self) -> Dict[str, int]:
+        """保持期間を過ぎた Blob と、容量上限を超えた分（最終アクセスの古い順）を削除する。
+
+        削除した Blob を参照するエクスポートでは、その出力は描画されない（参照切れとして扱う）。
+        """
+        now = time.time()
+        blobs, tmps = self._scan()
+        victims: List[Tuple[float, int, str]] = []
+        keep: List[Tuple[float, int, str]] = []
+        for b in blobs:
+            if self.max_age_seconds and now - b[0] >= self.max_age_seconds:
+                victims.append(b)
+            else:
+                keep.append(b)
+        total = sum(b[1] for b in keep)
+        if self.max_bytes and total > self.max_bytes:
+            keep.sort(key=lambda b: b[0])
+            while keep and total > self.max_bytes:
+                b = keep.pop(0)
+                victims.append(b)
+                total -= b[1]
+        deleted = deleted_bytes = 0
+        for _, size, path in victims:
+            if self._remove(path):
+                deleted += 1
+                deleted_bytes += size
+        for mtime, path in tmps:
+            if now - mtime >= self.tmp_grace_seconds:
+                self._remove(path)
+        return {
+            "deleted_files": deleted,
+            "deleted_bytes": deleted_bytes,
+            "files": len(keep),
+            "bytes": total,
+        }
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            logger.warning("failed to remove blob %s", path, exc_info=True)
+            return False
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Literal, Tuple
+
+# 可視出力として扱う MIME タイプ（優先順）
+VISUAL_MIMES = ("image/png", "image/svg+xml", "application/vnd.plotly.v1+json")
+
+_MD_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+)$")
+_MD_HEADING_PREFIX = re.compile(r"^\s{0,3}#{1,6}\s+")
+_HTML_HEADING = re.compile(r"<h([12])[^>]*>(.*?)</h[12]>", flags=re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+
+ItemKind = Literal["text_box", "notebook_markdown", "notebook_code", "other"]
+
+
+@dataclass(frozen=True, slots=True)
+class ContentItem:
+    """検証済みのコンテンツ項目（ReportContentItem 1 件）。
+
+    ExportRequest.content の辞書はリクエスト毎に 1 回だけ読み、見出し・見出しを除いた本文・
+    先頭の可視出力をここで求めておく（PPTX/PDF のレイアウトと目次はこの値を使い回す）。
+    先頭の可視出力を読めない場合に備えて、後続の出力の可視出力も fallbacks に残す。
+    raw は元の項目（フラグメントキーと、種類が不明な項目の表示に使う）。
+    """
+
+    kind: ItemKind
+    # text_box は content、それ以外は source（種類が不明な項目は str(raw)）
+    text: str
+    # (見出し, レベル)
+    heading: Tuple[str, int] | None
+    # PDF の本文（見出しがあればそれを除いたもの）
+    body: str
+    # notebook_code の先頭の可視出力 (MIME タイプ, 値)
+    visual: Tuple[str, Any] | None
+    # 出典（"ノートブック名#cell-番号"）
+    origin: str | None
+    raw: Any
+    # 2 番目以降の出力の可視出力（出力毎に先頭の MIME タイプ）
+    fallbacks: Tuple[Tuple[str, Any], ...] = ()
+
+
+def strip_tags(html: str) -> str:
+    return _TAG.sub("", html or "").strip()
+
+
+def _text(value: Any) -> str:
+    if not value:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _markdown_heading(src: str) -> tuple[Tuple[str, int] | None, str]:
+    """Markdown の最初の見出しと、最初の見出し行（"# " で始まる行）を除いた本文。"""
+    lines = src.splitlines()
+    for line in lines:
+        m = _MD_HEADING.match(line)
+        if m:
+            heading = (m.group(2).strip(), len(m.group(1)))
+            break
+    else:
+        return None, src
+    for i, line in enumerate(lines):
+        if _MD_HEADING_PREFIX.match(line):
+            return heading, "\n".join(lines[:i] + lines[i + 1:])
+    return heading, src
+
+
+def _html_heading(html: str) -> tuple[Tuple[str, int] | None, str]:
+    """HTML の最初の h1/h2（無ければ先頭行）と、タグを除いた本文。"""
+    m = _HTML_HEADING.search(html)
+    if m:
+        return (strip_tags(m.group(2)).strip(), 1 if m.group(1) == "1" else 2), strip_tags(html)
+    txt = strip_tags(html)
+    if txt:
+        return (txt.splitlines()[0].strip(), 2), txt
+    return None, html
+
+
+def _visuals(outputs: Any) -> Tuple[Tuple[str, Any], ...]:
+    """可視出力を持つ出力毎の (MIME タイプ, 値)（出力の順）。"""
+    found = []
+    for out in outputs if isinstance(outputs, list) else ():
+        data = (out.get("data") if isinstance(out, dict) else None) or {}
+        for mime in VISUAL_MIMES:
+            if mime in data:
+                found.append((mime, data[mime]))
+                break
+    return tuple(found)
+
+
+def _origin(value: Any) -> str | None:
+    if not value or not isinstance(value, dict):
+        return None
+    return f"{value.get('notebookName', '')}#cell-{value.get('cellIndex', '')}"
+
+
+def content_item(item: Any) -> ContentItem:
+    if isinstance(item, ContentItem):
+        return item
+    kind = item.get("type") if isinstance(item, dict) else None
+    origin = _origin(item.get("origin")) if isinstance(item, dict) else None
+    if kind == "text_box":
+        text = _text(item.get("content"))
+        heading, body = _html_heading(text)
+        return ContentItem("text_box", text, heading, body, None, origin, item)
+    if kind == "notebook_markdown":
+        text = _text(item.get("source"))
+        heading, body = _markdown_heading(text)
+        return ContentItem("notebook_markdown", text, heading, body, None, origin, item)
+    if kind == "notebook_code":
+        text = _text(item.get("source"))
+        visuals = _visuals(item.get("outputs"))
+        first = visuals[0] if visuals else None
+        return ContentItem("notebook_code", text, None, text, first, origin, item, visuals[1:])
+    text = str(item)
+    return ContentItem("other", text, None, text, None, origin, item)
+
+
+def compile_content(items: Iterable[Any] | None) -> List[ContentItem]:
+    """ExportRequest.content を ContentItem のリストにする（ContentItem はそのまま）。"""
+    return [content_item(item) for item in items or ()]
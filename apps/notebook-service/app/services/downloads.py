@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Iterator, Mapping, Tuple
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# (パス, mtime_ns, サイズ) -> ETag。成果物は生成後に書き換えないので内容のハッシュを一度だけ求める
+_etags: Dict[Tuple[str, int, int], str] = {}
+_etags_lock = threading.Lock()
+_MAX_ETAGS = 4096
+_CHUNK = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def artifact_etag(path: str, st: os.stat_result | None = None) -> str:
+    """成果物の強い ETag（内容の sha256）。"""
+    st = st or os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _etags_lock:
+        etag = _etags.get(key)
+    if etag is not None:
+        return etag
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    etag = f'"{h.hexdigest()}"'
+    with _etags_lock:
+        if len(_etags) >= _MAX_ETAGS:
+            _etags.clear()
+        _etags[key] = etag
+    return etag
+
+
+def download_filename(meta: Mapping[str, Any], job_id: str, ext: str, mtime: float) -> str:
+    """ダウンロード名（プロジェクト名 or ID・タイトル・生成日時）。URL は jobId のまま。"""
+    try:
+        title = meta.get("title") or "report"
+        project_id = (meta.get("metadata") or {}).get("projectId")
+        project_name = (meta.get("metadata") or {}).get("projectName")
+        stamp = datetime.fromtimestamp(mtime, tz=timezone.utc).strftime("%Y%m%d-%H%M%S")
+        base = f"{(project_name or project_id) or 'project'}_{title}_{stamp}"
+        return f"{re.sub(r'[^A-Za-z0-9_.-]+', '-', base).strip('-_.')[:60] or 'report'}.{ext}"
+    except Exception:
+        return f"report-{job_id}.{ext}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match は弱い比較（W/ を無視して比較）
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(mtime) <= since.timestamp()
+
+
+def parse_range(header: str, size: int) -> Tuple[int, int] | None:
+    """単一の bytes 範囲を (start, end)（end を含む）で返す。
+
+    解釈できない/複数範囲の指定は None（全体を返す）。満たせない範囲は RangeNotSatisfiable。
+    """
+    m = _RANGE_RE.match(header.strip())
+    if m is None:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first:
+        if not last:
+            return None
+        # 末尾 N バイト
+        n = int(last)
+        if n == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - n), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _content_disposition(filename: str) -> str:
+    # FileResponse と同じ形式
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def artifact_response(
+    request_headers: Mapping[str, str],
+    path: str,
+    media_type: str,
+    filename: str,
+    max_age: int = 0,
+    st: os.stat_result | None = None,
+) -> Response:
+    """成果物のダウンロード応答。
+
+    強い ETag と Last-Modified を付け、If-None-Match / If-Modified-Since に 304 を返す。
+    Range（単一範囲、If-Range 対応）には 206 を返す。
+    """
+    st = st or os.stat(path)
+    etag = artifact_etag(path, st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        # 成果物は jobId 毎に不変だが、削除（410）を反映させるため期限後は再検証させる
+        "Cache-Control": f"private, max-age={max(0, int(max_age))}, must-revalidate",
+    }
+
+    inm = request_headers.get("if-none-match")
+    ims = request_headers.get("if-modified-since")
+    if (inm is not None and _etag_matches(inm, etag)) or (
+        inm is None and ims is not None and _not_modified_since(ims, st.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    http_range = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if http_range and (if_range is None or if_range.strip() in (etag, last_modified)):
+        try:
+            span = parse_range(http_range, st.st_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"}
+            )
+        if span is not None:
+            start, end = span
+            length = end - start + 1
+            return StreamingResponse(
+                _iter_file(path, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{end}/{st.st_size}",
+                    "Content-Length": str(length),
+                    "Content-Disposition": _content_disposition(filename),
+                },
+            )
+
+    return FileResponse(
+        path, media_type=media_type, filename=filename, headers=headers, stat_result=st
+    )
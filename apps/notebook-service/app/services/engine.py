@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Literal
+
+logger = logging.getLogger(__name__)
+
+EngineMode = Literal["inline", "thread", "process"]
+
+
+class ExportEngine:
+    """エクスポート処理をイベントループ外で実行する実行エンジン。
+
+    - inline: 呼び出し元スレッドで同期実行（テスト・デバッグ用）
+    - thread: スレッドプールで実行
+    - process: プロセスプールで実行。max_jobs_per_worker でワーカーを定期的に作り直し、
+      メモリの増加を抑える。ワーカーが異常終了して（OOM kill など）プールが壊れたら作り直し、
+      その時に実行中だったジョブは 1 回だけ新しいプールで再実行する
+    """
+
+    def __init__(
+        self, mode: EngineMode = "thread", max_workers: int = 2, max_jobs_per_worker: int = 0
+    ):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"unknown export engine mode: {mode}")
+        self.mode: EngineMode = mode
+        self.max_workers = max(1, int(max_workers))
+        self.max_jobs_per_worker = max(0, int(max_jobs_per_worker))
+        self._dispatcher: ThreadPoolExecutor | None = None
+        self._procs: ProcessPoolExecutor | None = None
+        self._procs_lock = threading.Lock()
+        # 実行待ち/実行中のジョブ数（メトリクス用）
+        self._count_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        if mode in ("thread", "process"):
+            # ディスパッチャのスレッド数 = 同時実行数。process モードでは各スレッドが
+            # プロセスプールの完了を待つので、ジョブが processing になるのは実際に実行枠を得た時点。
+            self._dispatcher = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="export"
+            )
+        if mode == "process":
+            self._procs = self._new_procs()
+
+    @classmethod
+    def from_env(cls) -> "ExportEngine":
+        mode = os.getenv("EXPORT_EXECUTOR", "thread")
+        max_workers = int(os.getenv("EXPORT_MAX_WORKERS", "2"))
+        max_jobs = int(os.getenv("EXPORT_MAX_JOBS_PER_WORKER", "0"))
+        return cls(mode, max_workers, max_jobs)  # type: ignore[arg-type]
+
+    def _new_procs(self) -> ProcessPoolExecutor:
+        kwargs: dict[str, Any] = {"max_workers": self.max_workers}
+        if self.max_jobs_per_worker:
+            # max_tasks_per_child は fork 以外の開始方式が必要
+            kwargs["mp_context"] = multiprocessing.get_context("spawn")
+            kwargs["max_tasks_per_child"] = self.max_jobs_per_worker
+        return ProcessPoolExecutor(**kwargs)
+
+    def _replace_procs(self, broken: ProcessPoolExecutor) -> None:
+        """壊れたプールを新しいものに置き換える（他のスレッドが置き換え済みなら何もしない）。"""
+        with self._procs_lock:
+            if self._procs is not broken:
+                return
+            self._procs = self._new_procs()
+        broken.shutdown(wait=False)
+
+    def _run_in_process(self, fn: Callable[..., Any], args: tuple) -> Any:
+        for attempt in range(2):
+            with self._procs_lock:
+                procs = self._procs
+            assert procs is not None
+            try:
+                return procs.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # 同じプールで実行中だった他のジョブも巻き込まれるので、1 回だけ再実行する
+                # （ワーカーを落としたジョブ自身は再実行でも落ちて失敗になる）
+                self._replace_procs(procs)
+                if attempt:
+                    raise
+                logger.warning("export worker process died; retrying the job on a new pool")
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        args: tuple,
+        on_start: Callable[[], None],
+        on_done: Callable[[Any], None],
+        on_error: Callable[[BaseException], None],
+    ) -> Future | None:
+        """fn(*args) を実行する。process モードでは fn と args は pickle 可能であること。
+
+        on_done が失敗した場合（ジョブストアへの書き込みなど）も on_error を呼んで
+        ジョブを終わらせる。
+        """
+
+        def _task() -> None:
+            self._add(queued=-1, running=1)
+            try:
+                on_start()
+                if self._procs is not None:
+                    result = self._run_in_process(fn, args)
+                else:
+                    result = fn(*args)
+                on_done(result)
+            except BaseException as e:
+                # ワーカー内の例外（SystemExit なども）はジョブの失敗として記録する
+                try:
+                    on_error(e)
+                except Exception:
+                    logger.exception("export job error handler failed")
+            finally:
+                self._add(running=-1)
+
+        self._add(queued=1)
+        if self._dispatcher is None:
+            _task()
+            return None
+        return self._dispatcher.submit(_task)
+
+    def _add(self, queued: int = 0, running: int = 0) -> None:
+        with self._count_lock:
+            self.queued += queued
+            self.running += running
+
+    def worker_pids(self) -> list[int]:
+        """process モードのワーカープロセスの PID。"""
+        procs = self._procs
+        if procs is None:
+            return []
+        processes = getattr(procs, "_processes", None) or {}
+        return [p.pid for p in list(processes.values()) if p.pid]
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown(wait=wait)
+        with self._procs_lock:
+            procs = self._procs
+        if procs is not None:
+            procs.shutdown(wait=wait)
@@ -1,41 +1,150 @@
 from __future__ import annotations
+import cProfile
+import hashlib
+import logging
 import os
+import threading
+import time
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, MutableMapping, Tuple
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image as PptxImage, ImagePart
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn
+from lxml import etree
 from ..schemas import ParsedCell
-from ..schemas_export import ExportRequest, ExportJob
-import plotly.io as pio
+from ..schemas_export import ExportBatch, ExportRequest, ExportJob
+from .batch_cache import BatchCache
+from .engine import ExportEngine
+from .visual_cache import VisualCache, visual_key
+from .plotly_renderer import PlotlyRenderer
+from .prerender import VisualPool, decode_png, svg_renderer_name, svg_to_png
+from .blob_store import LocalBlobStore, blob_ref
+from .content import ContentItem, compile_content
+from .image_opt import ImageOptimizer, ImageTooLarge, optimize_image
+from .template_cache import TemplateCache
+from .job_store import JobStore
+from .fragment_cache import FragmentCache, FragmentSet, fragment_key
+from .pdf_fragment import PdfRecorder, encode_pdf_image, replay_fragment
+from .linebreak import wrap_text
+from .metrics import BYTES, STAGE_SECONDS, capture, replay, stage_timings
+from .memory import JobMemory, MemoryPolicy
+from .spill import SpilledImagePart
+from .pptx_compat import ImageParts, add_picture_part, new_image_part, shape_tree
+import json
+import orjson
+from concurrent.futures import Future
 from datetime import datetime
 import re
 from reportlab.pdfgen import canvas as pdfcanvas
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.units import inch
 from io import BytesIO
-import base64
 from PIL import Image
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
-# CairoSVG はシステム依存ライブラリ (cairo) が必要になるため、
-# 実行環境によっては import に失敗することがある。テストや軽量環境では
-# フォールバック（簡易PNG生成）で代替する。
-try:  # pragma: no cover - import 可否は環境依存
-    import cairosvg as _cairosvg  # type: ignore
-except Exception:  # pragma: no cover
-    _cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+# 進捗（progress）をジョブストアに書き込む最小間隔（秒）。段階の切り替わりと完了は常に書き込む
+PROGRESS_INTERVAL = 0.25
+
+# 計測するジョブはプロセス内で 1 件ずつ（cProfile は同時に 1 つしか有効にできない）
+_PROFILE_LOCK = threading.Lock()
+
+# プロセスプールのワーカー内で使い回す Exporter（out_dir 毎）
+_worker_exporters: Dict[str, "Exporter"] = {}
+
+
+def _worker_exporter(out_dir: str) -> "Exporter":
+    exp = _worker_exporters.get(out_dir)
+    if exp is None:
+        # Kaleido は描画プロセス 1 つで使う（止まった描画はタイムアウトでプロセスごと破棄できる）
+        # ジョブ状態は親プロセス側で更新する。ワーカーは共有のジョブストア（JOB_STORE=sqlite）が
+        # あれば進捗だけを書き込み、無ければ進捗は捨てる
+        store = JobStore.from_env(out_dir)
+        exp = Exporter(out_dir, plotly_renderer=PlotlyRenderer.from_env(1), job_store=store)
+        # 段階毎の所要時間などは親プロセスに返してジョブに書き込む
+        exp._job_reports = {}
+        _worker_exporters[out_dir] = exp
+    return exp
+
+
+def _render_in_worker(
+    out_dir: str, job_id: str, req: ExportRequest, batch_dir: str | None = None
+) -> tuple[str, str, list, Dict[str, Any]]:
+    # メトリクスの観測値は親プロセスに返して反映する
+    exp = _worker_exporter(out_dir)
+    batch = BatchCache.open(batch_dir, exp.visual_cache, exp.fragment_cache) if batch_dir else None
+    with capture() as samples:
+        path, url = exp.render(job_id, req, batch=batch)
+    return path, url, samples, exp._job_reports.pop(job_id, {})  # type: ignore[union-attr]
+
+
+class IdempotencyKeyConflict(ValueError):
+    """同じ Idempotency-Key が異なるリクエストで使われた。"""
 
 
 class Exporter:
-    def __init__(self, out_dir: str):
+    def __init__(
+        self,
+        out_dir: str,
+        engine: ExportEngine | None = None,
+        visual_cache: VisualCache | None = None,
+        plotly_renderer: PlotlyRenderer | None = None,
+        visual_pool: VisualPool | None = None,
+        blob_store: LocalBlobStore | None = None,
+        image_optimizer: ImageOptimizer | None = None,
+        template_cache: TemplateCache | None = None,
+        job_store: JobStore | None = None,
+        fragment_cache: FragmentCache | None = None,
+        dedup: bool | None = None,
+        memory_policy: MemoryPolicy | None = None,
+    ):
         self.out_dir = out_dir
         os.makedirs(out_dir, exist_ok=True)
-        self.jobs: Dict[str, ExportJob] = {}
-        # 追加情報（ダウンロード名生成用など）
-        self.job_meta: Dict[str, Dict[str, Any]] = {}
+        self.engine = engine or ExportEngine("inline")
+        # ラスタライズ結果のキャッシュ（既定: {out_dir}/.visual-cache）
+        self.visual_cache = visual_cache or VisualCache.from_env(out_dir)
+        # Plotly(Kaleido) 描画プロセスのプール
+        self.plotly_renderer = plotly_renderer or PlotlyRenderer.from_env()
+        # レイアウト前の可視出力ラスタライズ用ワーカープール
+        self.visual_pool = visual_pool or VisualPool.from_env()
+        # /parse?refs=true で退避された出力 ({"$ref": sha256}) の参照先
+        self.blob_store = blob_store or LocalBlobStore.from_env()
+        # 表示枠に合わせた画像の縮小/再圧縮
+        self.image_optimizer = image_optimizer or ImageOptimizer.from_env()
+        # 解析済み PPTX テンプレート
+        self.template_cache = template_cache or TemplateCache.from_env()
+        # 項目毎のレンダリング済みフラグメント（再エクスポート時は変更された項目だけ描画する）
+        self.fragment_cache = fragment_cache or FragmentCache.from_env(out_dir)
+        # ジョブ状態と追加情報（ダウンロード名生成用など）。JOB_STORE=sqlite でワーカー間共有
+        self.job_store = job_store or JobStore.from_env(out_dir)
+        # 同一リクエスト（リクエストハッシュ / Idempotency-Key）を既存ジョブに寄せる
+        if dedup is None:
+            dedup = os.getenv("EXPORT_DEDUP", "true").strip().lower() in ("1", "true", "yes", "on")
+        self.dedup = dedup
+        # 大きなレポートのメモリ節約モードと、ジョブ毎のメモリ上限
+        self.memory_policy = memory_policy or MemoryPolicy.from_env()
+        self._stats_lock = threading.Lock()
+        self.dedup_stats: Dict[str, int] = {
+            "requests": 0,
+            "hits_inflight": 0,
+            "hits_completed": 0,
+            "idempotency_replays": 0,
+            "conflicts": 0,
+        }
+        # ジョブ毎の進捗 job_id -> [最終書き込み時刻, 進捗]
+        self._progress_lock = threading.Lock()
+        self._progress_state: Dict[str, list] = {}
+        # 実行中のジョブのメモリ計測（進捗の更新時に RSS を測り、上限を確認する）
+        self._job_memory: Dict[str, JobMemory] = {}
+        # プロセスプールのワーカーでは render の結果（timings 等）をここに残し、親に返す
+        self._job_reports: Dict[str, Dict[str, Any]] | None = None
         # PDFフォント設定（日本語対応）
         self.pdf_font_regular = "Helvetica"
         self.pdf_font_bold = "Helvetica-Bold"
@@ -82,13 +191,196 @@ class Exporter:
             self.pdf_font_bold = "Helvetica-Bold"
 
     def create_job(self) -> ExportJob:
-        job_id = uuid.uuid4().hex
-        job = ExportJob(jobId=job_id, status="queued")
-        self.jobs[job_id] = job
-        return job
+        job = ExportJob(jobId=uuid.uuid4().hex, status="queued")
+        self.job_store.create(job)
+        return job.model_copy()
 
     def get_job(self, job_id: str) -> ExportJob | None:
-        return self.jobs.get(job_id)
+        return self.job_store.get(job_id)
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        self.job_store.update(job_id, **fields)
+
+    def get_job_meta(self, job_id: str) -> Dict[str, Any]:
+        return self.job_store.get_meta(job_id) or {}
+
+    def _remember_meta(self, job_id: str, req: ExportRequest) -> None:
+        try:
+            metadata = getattr(req, "metadata", None)
+            meta_dump = metadata.model_dump() if metadata is not None else {}
+        except Exception:
+            meta_dump = {}
+        meta = self.get_job_meta(job_id)
+        meta.update({"title": req.title, "metadata": meta_dump})
+        self.job_store.set_meta(job_id, meta)
+
+    def request_hash(self, req: ExportRequest) -> str:
+        """リクエストの正規化ハッシュ（タイトル・内容・メタデータ・形式とテンプレートの実体）。"""
+        try:
+            template = list(self.template_cache.key(req.templatePath))
+        except OSError:
+            template = [req.templatePath, None, None]
+        body = req.model_dump(mode="json", exclude={"templatePath"})
+        return hashlib.sha256(
+            orjson.dumps({"request": body, "template": template}, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.dedup_stats[name] += 1
+
+    def _reusable(self, job_id: str) -> bool:
+        job = self.get_job(job_id)
+        if job is None:
+            return False
+        if job.status == "completed" and job.downloadUrl:
+            # 成果物が消えていれば作り直す
+            path = os.path.join(self.out_dir, os.path.basename(job.downloadUrl))
+            if not os.path.exists(path):
+                self.update_job(
+                    job_id, status="expired", downloadUrl=None, error="export artifact expired"
+                )
+                return False
+        return True
+
+    def submit_request(self, req: ExportRequest, idempotency_key: str | None = None) -> ExportJob:
+        """ジョブを作成して投入する。同じリクエストの実行中/完了済みジョブがあればそれを返す。
+
+        Idempotency-Key が指定され、既に別の内容のリクエストで使われていれば
+        IdempotencyKeyConflict。
+        """
+        job, new = self._claim_job(req, idempotency_key)
+        return self.submit(job.jobId, req) if new else job
+
+    def _claim_job(
+        self, req: ExportRequest, idempotency_key: str | None = None
+    ) -> tuple[ExportJob, bool]:
+        """リクエストに対応するジョブを返す。(ジョブ, 新規に作成して投入が必要か)。"""
+        self._count("requests")
+        if not self.dedup and not idempotency_key:
+            return self.create_job(), True
+        req_hash = self.request_hash(req)
+        for _ in range(2):
+            job = self.create_job()
+            self.job_store.set_meta(job.jobId, {"requestHash": req_hash})
+            target = self.job_store.claim(f"req:{req_hash}", job.jobId) if self.dedup else job.jobId
+            if idempotency_key:
+                bound = self.job_store.claim(f"idem:{idempotency_key}", target)
+                if bound != target:
+                    if self.get_job_meta(bound).get("requestHash") != req_hash:
+                        self.job_store.delete(job.jobId)
+                        self._count("conflicts")
+                        raise IdempotencyKeyConflict(
+                            "Idempotency-Key was used with a different request"
+                        )
+                    target = bound
+            if target == job.jobId:
+                return job, True
+            self.job_store.delete(job.jobId)
+            if self._reusable(target):
+                existing = self.get_job(target)
+                if existing is not None:
+                    if idempotency_key:
+                        self._count("idempotency_replays")
+                    completed = existing.status == "completed"
+                    self._count("hits_completed" if completed else "hits_inflight")
+                    return existing, False
+        # 既存ジョブが直前に失効した場合は新しく作る
+        job = self.create_job()
+        self.job_store.set_meta(job.jobId, {"requestHash": req_hash})
+        return job, True
+
+    def submit(self, job_id: str, req: ExportRequest, batch: BatchCache | None = None) -> ExportJob:
+        """ジョブを実行エンジンに投入し、直後の状態（通常は queued）を返す。
+
+        batch があればバッチ内のジョブと可視出力/フラグメントのキャッシュ層を共有する。
+        """
+        self._remember_meta(job_id, req)
+        process = self.engine.mode == "process"
+        if process:
+            fn, args = _render_in_worker, (self.out_dir, job_id, req)
+        else:
+            fn, args = self.render, (job_id, req)
+        if batch is not None:
+            # process モードのワーカーはバッチのキャッシュ層をディレクトリから開く
+            args += (batch.cache_dir,) if process else (None, batch)
+
+        def on_done(result: tuple) -> None:
+            report: Dict[str, Any] = {}
+            if len(result) > 2:
+                replay(result[2])
+                report = result[3]
+            self.update_job(job_id, status="completed", downloadUrl=result[1], **report)
+            if batch is not None:
+                batch.done(job_id)
+
+        def on_error(e: BaseException) -> None:
+            try:
+                self.update_job(job_id, status="failed", error=f"failed: {e}")
+            finally:
+                if batch is not None:
+                    batch.done(job_id)
+
+        self.engine.submit(
+            fn,
+            args,
+            on_start=lambda: self.update_job(job_id, status="processing"),
+            on_done=on_done,
+            on_error=on_error,
+        )
+        return self.get_job(job_id)  # type: ignore[return-value]
+
+    def submit_batch(self, reqs: List[ExportRequest]) -> ExportBatch:
+        """複数のリクエストをまとめて投入し、バッチの状態を返す。
+
+        各リクエストには通常どおりジョブ ID を割り当て
+        （実行中/完了済みの同一リクエストは既存ジョブ）、新規のジョブは 1 件ずつ実行エンジンに
+        投入する（並行に実行され、状態も個別に進む）。共通の図のラスタライズと同じ項目の
+        レイアウトは、バッチ内で共有する BatchCache により 1 回で済む。
+        バッチ自体はジョブとは別の記録（JobStore.create_batch）として保存する。
+        """
+        batch_id = uuid.uuid4().hex
+        job_ids: List[str] = []
+        pending: List[tuple[str, ExportRequest]] = []
+        for req in reqs:
+            job, new = self._claim_job(req)
+            job_ids.append(job.jobId)
+            if new:
+                pending.append((job.jobId, req))
+        self.job_store.create_batch(batch_id, job_ids)
+        if pending:
+            cache = BatchCache.from_env(
+                self.out_dir,
+                batch_id,
+                self.visual_cache,
+                self.fragment_cache,
+                [job_id for job_id, _ in pending],
+                shared=self.engine.mode == "process",
+            )
+            for job_id, req in pending:
+                self.submit(job_id, req, cache)
+        return self.get_batch(batch_id)  # type: ignore[return-value]
+
+    def get_batch(self, batch_id: str) -> ExportBatch | None:
+        """バッチの状態。各ジョブの状態から集計する（queued/processing/completed/failed/partial）。"""
+        job_ids = self.job_store.get_batch(batch_id)
+        if job_ids is None:
+            return None
+        jobs: List[ExportJob] = []
+        for job_id in job_ids:
+            job = self.get_job(job_id)
+            jobs.append(job or ExportJob(jobId=job_id, status="expired", error="job expired"))
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        done = counts.get("completed", 0)
+        if done == len(jobs):
+            status = "completed"
+        elif counts.get("queued", 0) + counts.get("processing", 0):
+            status = "queued" if counts.get("queued", 0) == len(jobs) else "processing"
+        else:
+            status = "partial" if done else "failed"
+        return ExportBatch(batchId=batch_id, status=status, counts=counts, jobs=jobs)
 
     def _add_notes(self, slide, text: str):
         notes_slide = slide.notes_slide
@@ -106,36 +398,204 @@ class Exporter:
         p.alignment = PP_ALIGN.LEFT
         return s
 
-    def _add_image_slide(self, prs: Presentation, image_bytes: bytes):
+    def _add_image_slide(
+        self,
+        prs: Presentation,
+        image_bytes: bytes,
+        image_parts: ImageParts | None = None,
+        spill: MutableMapping[Any, bytes] | None = None,
+    ):
         layout = prs.slide_layouts[5]
         s = prs.slides.add_slide(layout)
-        img_path = os.path.join(self.out_dir, f"tmp-{uuid.uuid4().hex}.png")
-        with open(img_path, "wb") as f:
-            f.write(image_bytes)
-        s.shapes.add_picture(img_path, Inches(1), Inches(1), width=Inches(8))
-        try:
-            os.remove(img_path)
-        except OSError:
-            pass
+        left, top, width = Inches(1), Inches(1), Inches(8)
+        if image_parts is None:
+            s.shapes.add_picture(BytesIO(image_bytes), left, top, width=width)
+            return s
+        part = self._image_part(prs, image_bytes, image_parts, spill)
+        add_picture_part(s, part, left, top, width)
+        return s
+
+    def _image_part(
+        self,
+        prs: Presentation,
+        image_bytes: bytes,
+        image_parts: ImageParts,
+        spill: MutableMapping[Any, bytes] | None = None,
+    ) -> ImagePart:
+        # 同じ画像は 1 つの画像パートを共有する。python-pptx の add_picture は重複検出のため
+        # 画像毎にパッケージ全体を走査するので、プレゼンテーション単位の索引で置き換える。
+        sha1 = hashlib.sha1(image_bytes).hexdigest()
+        part = image_parts.get(sha1)
+        if part is None:
+            image = PptxImage.from_blob(image_bytes)
+            package = prs.part.package
+            partname = image_parts.next_partname(image.ext)
+            if spill is not None:
+                # 保存するまで画像の中身は一時ファイルに置く
+                part = SpilledImagePart.from_image(package, partname, image, spill)
+            else:
+                part = new_image_part(package, partname, image)
+            image_parts[sha1] = part
+        return part
+
+    def _capture_slide(self, slide, image_bytes: bytes | None) -> Dict[str, Any]:
+        """スライドの図形 XML をフラグメントとして取り出す（画像は内容アドレスで参照）。"""
+        tree = shape_tree(slide)
+        sp = [etree.tostring(el, encoding="unicode") for el in tree.iter_shape_elms()]
+        return {"sp": sp, "media": [hashlib.sha256(image_bytes).hexdigest()] if image_bytes else []}
+
+    def _replay_slide(
+        self,
+        prs: Presentation,
+        fragment: Dict[str, Any],
+        media: MutableMapping[str, bytes],
+        image_parts: ImageParts,
+        spill: MutableMapping[Any, bytes] | None = None,
+    ):
+        s = prs.slides.add_slide(prs.slide_layouts[5])
+        tree = shape_tree(s)
+        for el in list(tree.iter_shape_elms()):
+            tree.remove(el)
+        rId = None
+        for sha in fragment.get("media") or []:
+            rId = s.part.relate_to(self._image_part(prs, media[sha], image_parts, spill), RT.IMAGE)
+        for xml in fragment["sp"]:
+            el = parse_xml(xml)
+            if rId is not None:
+                # 画像の関係 ID はスライド毎に振り直す
+                for blip in el.iter(qn("a:blip")):
+                    blip.set(qn("r:embed"), rId)
+            tree.insert_element_before(el, "p:extLst")
         return s
 
-    def run(self, job_id: str, req: ExportRequest) -> str:
-        job = self.jobs[job_id]
-        job.status = "processing"
-        # ジョブのメタデータを保持
+    def _progress(self, job_id: str, force: bool = False, **fields: Any) -> None:
+        """ジョブの進捗（ExportJob.progress）を更新する。
+
+        頻繁な更新は PROGRESS_INTERVAL 毎に間引く。
+        """
+        mem = self._job_memory.get(job_id)
+        if mem is not None:
+            # メモリ上限を超えていれば MemoryBudgetExceeded（描画を打ち切ってジョブを失敗させる）
+            mem.sample()
+        now = time.monotonic()
+        with self._progress_lock:
+            rec = self._progress_state.setdefault(job_id, [0.0, {}])
+            rec[1].update(fields)
+            if not force and now - rec[0] < PROGRESS_INTERVAL:
+                return
+            rec[0] = now
+            snapshot = dict(rec[1])
+        self.job_store.update(job_id, progress=snapshot)
+
+    def _add_progress(self, job_id: str, name: str, n: int = 1) -> None:
+        with self._progress_lock:
+            rec = self._progress_state.get(job_id)
+            value = (rec[1].get(name, 0) if rec else 0) + n
+        self._progress(job_id, **{name: value})
+
+    def render(
+        self,
+        job_id: str,
+        req: ExportRequest,
+        memory: JobMemory | None = None,
+        batch: BatchCache | None = None,
+    ) -> tuple[str, str]:
+        """成果物を生成し (ファイルパス, ダウンロードURL) を返す。
+
+        ジョブの status には触れず、進捗（stage / items / visuals / pages / bytes）と、
+        完了時に段階毎の所要時間（timings）とメモリ使用量（memory、失敗時も）を書き込む。
+        req.profile なら cProfile で計測し、{job_id}.prof として成果物の隣に保存する（profileUrl）。
+        batch はバッチ内で共有するキャッシュ層（BatchCache）。
+        メモリ上限を超えた場合は MemoryBudgetExceeded。
+        """
+        started = time.perf_counter()
+        mem = memory or self.memory_policy.tracker(len(req.content or []))
+        self._job_memory[job_id] = mem
+        profiler = self._start_profiler(job_id) if req.profile else None
         try:
-            meta_dump = req.metadata.model_dump() if getattr(req, "metadata", None) is not None else {}
+            with capture() as samples:
+                self._progress(job_id, force=True, stage="prepare")
+                if batch is not None:
+                    # 同じプロセス内のバッチのジョブは順に準備し、共通の図を二重に描画しない
+                    with batch.lock:
+                        items, fragments, visuals = self._prepare(req, mem, batch)
+                else:
+                    items, fragments, visuals = self._prepare(req, mem)
+                self._progress(
+                    job_id,
+                    force=True,
+                    stage="layout",
+                    itemsTotal=len(items),
+                    items=0,
+                    cachedItems=len(fragments.fragments),
+                    visuals=len(visuals),
+                    pages=0,
+                    bytes=0,
+                )
+                path, url = self._render(job_id, req, items, fragments, visuals, mem)
+            if profiler is not None:
+                profiler.disable()
+            mem.sample(force=True)
+            size = os.path.getsize(path)
+            BYTES.inc(size, direction="out", kind=req.format)
+            self._progress(job_id, force=True, stage="done", items=len(items), bytes=size)
+            report: Dict[str, Any] = {
+                "timings": dict(
+                    stage_timings(samples), total=round(time.perf_counter() - started, 6)
+                ),
+                "memory": mem.report(),
+            }
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(self.out_dir, f"{job_id}.prof"))
+                report["profileUrl"] = f"/exports/{job_id}.prof"
+            self.update_job(job_id, **report)
+            if self._job_reports is not None:
+                self._job_reports[job_id] = report
+            return path, url
         except Exception:
-            meta_dump = {}
-        self.job_meta[job_id] = {"title": req.title, "metadata": meta_dump}
+            # 失敗したジョブにもそこまでのメモリ使用量を残す（上限超過の調査用）
+            self.update_job(job_id, memory=mem.report())
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _PROFILE_LOCK.release()
+            self._job_memory.pop(job_id, None)
+            # 退避した一時ファイルを消す（成果物は保存済み）
+            mem.close()
+            with self._progress_lock:
+                self._progress_state.pop(job_id, None)
+
+    def _start_profiler(self, job_id: str) -> cProfile.Profile | None:
+        # Python 3.12 以降の cProfile は sys.monitoring 経由で全スレッドを計測するため、
+        # .prof には同じプロセスで並行して動く計測なしのジョブやプールの処理も混ざる。
+        # 計測するジョブ同士は _PROFILE_LOCK で直列にし、1 つの .prof に 2 件分が入らないようにする
+        _PROFILE_LOCK.acquire()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # プロセス内で別のプロファイラが動いている
+            _PROFILE_LOCK.release()
+            logger.warning("profiling skipped for job %s: another profiler is active", job_id)
+            return None
+        return profiler
 
+    def _render(
+        self,
+        job_id: str,
+        req: ExportRequest,
+        items: List[ContentItem],
+        fragments: FragmentSet,
+        visuals: MutableMapping[int, bytes],
+        memory: JobMemory | None = None,
+    ) -> tuple[str, str]:
         if req.format == 'pdf':
-            path = self._run_pdf(job_id, req)
-            job.status = "completed"
-            job.downloadUrl = f"/exports/{job_id}.pdf"
-            return path
+            path = self._run_pdf(job_id, req, visuals, fragments, memory, items)
+            return path, f"/exports/{job_id}.pdf"
 
-        prs = Presentation(req.templatePath) if req.templatePath else Presentation()
+        layout_started = time.perf_counter()
+        prs = self.template_cache.load(req.templatePath)
 
         # Title slide
         title_layout = prs.slide_layouts[0]
@@ -155,97 +615,91 @@ class Exporter:
             title.placeholders[1].text = " | ".join([s for s in sub if s])
 
         references: set[str] = set()
+        image_parts = ImageParts(prs.part.package)
+        spill = memory.spill_store() if memory is not None and memory.bounded else None
 
-        items: List[dict[str, Any]] = list(req.content or [])
-        for item in items:
-            t = item.get("type")
-            if t == "text_box":
-                slide = self._add_text_slide(prs, item.get("content") or "")
-            elif t == "notebook_markdown":
-                slide = self._add_text_slide(prs, item.get("source") or "")
-            elif t == "notebook_code":
-                # Prefer first visual output
-                outputs = item.get("outputs") or []
-                inserted = False
-                for out in outputs:
-                    data = out.get("data") or {}
-                    if "image/png" in data:
-                        import base64
-
-                        b64 = data["image/png"]
-                        image_bytes = base64.b64decode(b64)
-                        slide = self._add_image_slide(prs, image_bytes)
-                        inserted = True
-                        break
-                    if "application/vnd.plotly.v1+json" in data:
-                        fig = data["application/vnd.plotly.v1+json"]
-                        img_bytes = pio.to_image(fig, format="png")
-                        slide = self._add_image_slide(prs, img_bytes)
-                        inserted = True
-                        break
-                if not inserted:
-                    slide = self._add_text_slide(prs, item.get("source") or "")
+        for idx, item in enumerate(items):
+            frag = fragments.fragments.get(idx)
+            if frag is not None:
+                slide = self._replay_slide(prs, frag, fragments.media, image_parts, spill)
             else:
-                slide = self._add_text_slide(prs, str(item))
+                img_bytes = None
+                if item.kind == "notebook_code":
+                    # Prefer first visual output
+                    # 描画した画像は visuals から外す
+                    # （画像パートとフラグメントのメディアにだけ残す）
+                    img_bytes = visuals.pop(idx, None)
+                if img_bytes:
+                    slide = self._add_image_slide(prs, img_bytes, image_parts, spill)
+                else:
+                    slide = self._add_text_slide(prs, item.text)
+                media = {hashlib.sha256(img_bytes).hexdigest(): img_bytes} if img_bytes else {}
+                fragments.store(idx, self._capture_slide(slide, img_bytes), media)
+            self._progress(job_id, items=idx + 1, pages=idx + 2)
 
-            origin = item.get("origin") or {}
-            ref = None
-            if origin:
-                ref = f"{origin.get('notebookName','')}#cell-{origin.get('cellIndex','')}"
-                references.add(ref)
-            if ref:
-                self._add_notes(slide, f"Origin: {ref}")
+            if item.origin:
+                references.add(item.origin)
+                self._add_notes(slide, f"Origin: {item.origin}")
 
         # References slide
         refs_text = "References:\n" + "\n".join(sorted(references)) if references else "References: (none)"
         self._add_text_slide(prs, refs_text)
 
         out_path = os.path.join(self.out_dir, f"{job_id}.pptx")
-        prs.save(out_path)
-        job.status = "completed"
-        job.downloadUrl = f"/exports/{job_id}.pptx"
-        return out_path
+        self._progress(job_id, force=True, stage="write", pages=len(prs.slides))
+        STAGE_SECONDS.observe(time.perf_counter() - layout_started, stage="layout", detail="pptx")
+        with STAGE_SECONDS.time(stage="serialize", detail="pptx"):
+            prs.save(out_path)
+        return out_path, f"/exports/{job_id}.pptx"
 
-    def _draw_multiline(self, c: pdfcanvas.Canvas, text: str, x: float, y: float, max_width: float, leading: float = 14):
-        # simple word-wrap
-        from reportlab.pdfbase.pdfmetrics import stringWidth
+    def _prepare(
+        self, req: ExportRequest, memory: JobMemory | None = None, batch: BatchCache | None = None
+    ) -> tuple[List[ContentItem], FragmentSet, MutableMapping[int, bytes]]:
+        """レイアウト前の準備。(項目, フラグメント, 可視出力の PNG) を返す。
+
+        項目は ContentItem にして（見出し・本文・可視出力をここで 1 回だけ求める）、
+        以降の処理で使い回す。可視出力はレイアウト前にまとめてラスタライズし、レイアウトは結果のバイト列だけを使う。
+        memory はメモリ計測（メモリ節約モードなら可視出力とメディアは SpillStore に置く）。
+        batch があればキャッシュはバッチの層を通す。
+        """
+        box_w, box_h = self._visual_box(req)
+        opts = self.image_optimizer.options_for(req.format, box_w, box_h)
+        items = compile_content(req.content)
+        # 変更のない項目はフラグメントキャッシュから組み立て、ラスタライズも省く
+        fragments = self._load_fragments(
+            req, items, opts, memory, batch.fragments if batch is not None else None
+        )
+        failed: set[int] = set()
+        visuals = self._prerender_visuals(
+            items,
+            opts,
+            skip=set(fragments.fragments),
+            failed=failed,
+            memory=memory,
+            cache=batch.visuals if batch is not None else None,
+        )
+        fragments.uncacheable.update(failed)
+        for idx, item in enumerate(items):
+            # 可視出力を描画できなかった項目（Blob 欠落など）は次回に描画し直す
+            if idx in visuals or idx in fragments.fragments:
+                continue
+            if item.visual is not None:
+                fragments.uncacheable.add(idx)
+        return items, fragments, visuals
 
+    def _draw_multiline(self, c: pdfcanvas.Canvas, text: str, x: float, y: float, max_width: float, leading: float = 14):
         if not text:
             return y
-        lines: list[str] = []
-        for raw_line in str(text).splitlines() or [""]:
-            words = raw_line.split(" ")
-            cur = ""
-            for w in words:
-                trial = (cur + (" " if cur else "") + w).strip()
-                if stringWidth(trial, "Helvetica", 12) <= max_width:
-                    cur = trial
-                else:
-                    if cur:
-                        lines.append(cur)
-                    cur = w
-            lines.append(cur)
-        for line in lines:
+        # 描画中のフォントで測る（CJK は文字間でも折り返す）
+        for line in wrap_text(text, max_width, c._fontname, c._fontsize):  # type: ignore[attr-defined]
             c.drawString(x, y, line)
             y -= leading
         return y
 
-    def _wrap_lines(self, text: str, col_w: float, font_name: str = "Helvetica", font_size: int = 12):
-        from reportlab.pdfbase.pdfmetrics import stringWidth
-        lines: list[str] = []
-        for raw_line in str(text or "").splitlines() or [""]:
-            words = raw_line.split(" ")
-            cur = ""
-            for w in words:
-                trial = (cur + (" " if cur else "") + w).strip()
-                if stringWidth(trial, font_name, font_size) <= col_w:
-                    cur = trial
-                else:
-                    if cur:
-                        lines.append(cur)
-                    cur = w
-            lines.append(cur)
-        return lines
+    def _wrap_lines(
+        self, text: str, col_w: float, font_name: str = "Helvetica", font_size: float = 12
+    ):
+        return wrap_text(text, col_w, font_name, font_size)
 
     def _draw_text_columns(
         self,
@@ -263,7 +717,7 @@ class Exporter:
         columns = max(1, int(columns))
         gap = max(0.0, float(gap))
         col_w = (page_w - gap * (columns - 1)) / columns if columns > 0 else page_w
-        lines = self._wrap_lines(text, col_w, self.pdf_font_regular, int(c._fontSize))  # type: ignore[attr-defined]
+        lines = self._wrap_lines(text, col_w, self.pdf_font_regular, c._fontsize)  # type: ignore[attr-defined]
         idx = 0
         y = top_y
         if new_page_cb is None:
@@ -297,42 +751,258 @@ class Exporter:
         pages = (len(lines) + lines_per_page - 1) // lines_per_page
         return max(1, pages)
 
-    def _extract_first_visual_bytes(self, item: dict) -> bytes | None:
-        outputs = item.get("outputs") or []
-        for out in outputs:
-            data = out.get("data") or {}
-            if "image/png" in data:
-                b64 = data["image/png"]
-                try:
-                    return base64.b64decode(b64)
-                except Exception:
-                    continue
-            if "image/svg+xml" in data:
-                svg = data["image/svg+xml"]
-                try:
-                    if _cairosvg:
-                        if isinstance(svg, (bytes, bytearray)):
-                            return _cairosvg.svg2png(bytestring=svg)
-                        if isinstance(svg, str):
-                            return _cairosvg.svg2png(bytestring=svg.encode("utf-8"))
-                    # フォールバック: 単色の小さなPNGプレースホルダーを生成
-                    from PIL import Image
-                    color = (11, 191, 255, 255)  # #0bf 的な色
-                    img = Image.new("RGBA", (100, 50), color)
-                    buf = BytesIO()
-                    img.save(buf, format="PNG")
-                    return buf.getvalue()
-                except Exception:
+    def _layout_toc(
+        self,
+        headings: list[tuple[str, int]],
+        first_y: float,
+        top_y: float,
+        bottom: float,
+        leading: float,
+    ) -> list[list[tuple[int, float]]]:
+        """目次行をページ毎に割り付ける。戻り値はページ毎の (見出しレベル, y座標) のリスト。"""
+        pages: list[list[tuple[int, float]]] = [[]]
+        y = first_y
+        for _title, lvl in headings:
+            pages[-1].append((lvl, y))
+            y -= leading
+            if y < bottom:
+                pages.append([])
+                y = top_y
+        return pages
+
+    def _visual_box(self, req: ExportRequest) -> tuple[float, float]:
+        """画像を配置する枠の大きさ（インチ）。"""
+        if req.format != 'pdf':
+            # _add_image_slide: 既定スライド(10x7.5in)の (1in, 1in) から幅 8in
+            return 8.0, 6.5
+        L = self._pdf_layout(req)
+        return L['page_w'] / inch, L['page_h'] / inch
+
+    def _prerender_visuals(
+        self,
+        items: List[ContentItem] | List[Any],
+        opts: Dict[str, Any] | None = None,
+        skip: set[int] | None = None,
+        failed: set[int] | None = None,
+        memory: JobMemory | None = None,
+        cache: Any = None,
+    ) -> MutableMapping[int, bytes]:
+        """全 notebook_code の先頭の可視出力をレイアウト前にまとめて PNG 化する。
+
+        先頭の可視出力を読めない（PNG のデコード失敗、SVG の描画失敗、Blob 欠落）場合は、
+        後続の出力の可視出力（ContentItem.fallbacks）を順に試す。
+
+        戻り値は items のインデックス -> PNG。PNG の base64 デコードと SVG->PNG はワーカープールで、
+        Plotly は描画プロセスプールで一括処理する（両者は並行して進む）。
+        SVG/Plotly はキャッシュを参照し、描画できなかった Plotly 図はプレースホルダーにする
+        （キャッシュはしない）。
+        opts があれば最後に表示枠に合わせて縮小/再圧縮する（画素数上限を超える画像は除外）。
+        skip のインデックス（フラグメントキャッシュ済み）は処理せず、
+        プレースホルダーにした項目は failed に加える。
+        memory があれば展開した画像のバイト数を数え、メモリ節約モードなら結果を SpillStore に置き、
+        同時に展開する画像を memory.window 件までに抑える（PNG はその場でデコードする）。
+        items は ContentItem（未変換の項目の辞書でもよい）。
+        cache は可視出力のキャッシュ（既定は self.visual_cache。バッチでは BatchCache.visuals）。
+        """
+        cache = cache if cache is not None else self.visual_cache
+        bounded = memory is not None and memory.bounded
+        window = memory.window if bounded else 0  # type: ignore[union-attr]
+        visuals: MutableMapping[int, bytes] = memory.spill_store() if memory is not None else {}
+        pending: Dict[int, Future] = {}
+        # MIME タイプ毎のラスタライズ完了時刻
+        # （メトリクス用。ワーカープール上で並行に進むため完了時刻で測る）
+        started = time.perf_counter()
+        finished: Dict[str, float] = {}
+
+        def track(mime: str, fut: Future) -> Future:
+            fut.add_done_callback(lambda _f: finished.__setitem__(mime, time.perf_counter()))
+            return fut
+
+        def put(idx: int, data: bytes) -> None:
+            visuals[idx] = data
+            if memory is not None:
+                memory.add_bytes(len(data))
+                memory.sample()
+
+        def collect(idx: int) -> None:
+            fut = pending.pop(idx)
+            try:
+                data = fut.result()
+            except Exception:
+                fallback(idx)
+                return
+            if idx in svg_keys:
+                cache.put(svg_keys[idx], data)
+            put(idx, data)
+
+        def fallback(idx: int) -> None:
+            # 可視出力を読めなかった（デコード失敗、Blob 欠落など）ら、次の出力の可視出力を使う
+            nxt = next(alternatives[idx], None)
+            if nxt is not None:
+                dispatch(idx, *nxt)
+
+        def dispatch(idx: int, mime: str, payload: Any) -> None:
+            ref = blob_ref(payload)
+            if mime == "image/png":
+                if ref:
+                    # Blob ストアにはデコード済みの PNG が入っている
+                    data = self.blob_store.get(ref)
+                    if data is not None:
+                        put(idx, data)
+                    else:
+                        fallback(idx)
+                    return
+                if bounded:
+                    # デコードは軽いので、結果をワーカープールに溜めずにその場で置き場所へ移す
+                    try:
+                        data = decode_png(payload)
+                    except (ValueError, TypeError):
+                        fallback(idx)
+                        return
+                    put(idx, data)
+                    return
+                pending[idx] = track(mime, self.visual_pool.submit(decode_png, payload))
+            elif mime == "image/svg+xml":
+                if ref:
+                    raw = self.blob_store.get(ref)
+                    if raw is None:
+                        fallback(idx)
+                        return
+                    key = visual_key(mime, f"sha256:{ref}", {"renderer": svg_renderer_name()})
+                elif isinstance(payload, (str, bytes, bytearray)):
+                    raw = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+                    key = visual_key(mime, raw, {"renderer": svg_renderer_name()})
+                else:
+                    fallback(idx)
+                    return
+                cached = cache.get(key)
+                if cached is not None:
+                    put(idx, cached)
+                    return
+                if key not in svg_futures:
+                    svg_futures[key] = track(mime, self.visual_pool.submit(svg_to_png, raw))
+                pending[idx] = svg_futures[key]
+                svg_keys[idx] = key
+                if window and len(pending) >= window:
+                    # 古いものから受け取り、ワーカープールに結果を溜めない
+                    collect(next(iter(pending)))
+            else:
+                # 参照の場合は内容アドレスをそのままキーにし、
+                # JSON の読み込みはキャッシュミス時だけ行う
+                key = visual_key(mime, f"sha256:{ref}" if ref else payload, {"format": "png"})
+                figs.setdefault(key, {"$ref": ref} if ref else payload)
+                fig_items.setdefault(key, []).append(idx)
+
+        def render_figs() -> None:
+            # Plotly 図は描画できなくてもプレースホルダーにする（次の出力には進まない）
+            missing: List[str] = []
+            for key in list(figs):
+                if key in rendered:
                     continue
-            if "application/vnd.plotly.v1+json" in data:
-                fig = data["application/vnd.plotly.v1+json"]
-                try:
-                    return pio.to_image(fig, format="png")
-                except Exception:
+                rendered.add(key)
+                cached = cache.get(key)
+                if cached is None:
+                    missing.append(key)
                     continue
-        return None
+                for idx in fig_items[key]:
+                    put(idx, cached)
+            # メモリ節約モードでは window 件ずつ描画する
+            chunk = window or max(1, len(missing))
+            for start in range(0, len(missing), chunk):
+                keys = missing[start:start + chunk]
+                batch = [self._resolve_json(figs[k]) for k in keys]
+                with STAGE_SECONDS.time(
+                    stage="rasterize", detail="application/vnd.plotly.v1+json"
+                ):
+                    figs_to_render = [f for f in batch if f is not None]
+                    results = self.plotly_renderer.render_batch(figs_to_render, format="png")
+                results_iter = iter(results)
+                for key, fig in zip(keys, batch, strict=True):
+                    data = next(results_iter) if fig is not None else None
+                    if data is None:
+                        data = self._placeholder_png("Figure could not be rendered")
+                        if failed is not None:
+                            failed.update(fig_items[key])
+                    else:
+                        cache.put(key, data)
+                    for idx in fig_items[key]:
+                        put(idx, data)
+
+        svg_futures: Dict[str, Future] = {}
+        svg_keys: Dict[int, str] = {}
+        figs: Dict[str, Any] = {}
+        fig_items: Dict[str, List[int]] = {}
+        rendered: set[str] = set()
+        alternatives: Dict[int, Iterator[Tuple[str, Any]]] = {}
+        for idx, item in enumerate(compile_content(items)):
+            if item.visual is None or (skip and idx in skip):
+                continue
+            alternatives[idx] = iter(item.fallbacks)
+            dispatch(idx, *item.visual)
+
+        # 待っている間に失敗した PNG/SVG が後続の Plotly 図に切り替わることがあるので、繰り返す
+        render_figs()
+        while pending:
+            collect(next(iter(pending)))
+            if not pending:
+                render_figs()
+
+        for mime, at in finished.items():
+            STAGE_SECONDS.observe(at - started, stage="rasterize", detail=mime)
+
+        if opts and visuals:
+            optimize_started = time.perf_counter()
+            indices = list(visuals)
+            chunk = window or len(indices)
+            for start in range(0, len(indices), chunk):
+                optimized: Dict[int, Future] = {}
+                # 同じ画像（共通の図など）は 1 回だけ最適化する。id() ではなく内容で比べる
+                # （SpillStore は読む度に新しい bytes を返すので、id が別の画像で再利用される）
+                by_digest: Dict[bytes, Future] = {}
+                for idx in indices[start:start + chunk]:
+                    data = visuals[idx]
+                    digest = hashlib.sha256(data).digest()
+                    if digest not in by_digest:
+                        by_digest[digest] = self.visual_pool.submit(optimize_image, data, opts)
+                    optimized[idx] = by_digest[digest]
+                for idx, fut in optimized.items():
+                    try:
+                        visuals[idx] = fut.result()
+                    except ImageTooLarge:
+                        del visuals[idx]
+                    except Exception:
+                        pass
+            STAGE_SECONDS.observe(
+                time.perf_counter() - optimize_started, stage="rasterize", detail="optimize"
+            )
+        return visuals
+
+    def _resolve_json(self, value: Any) -> Any:
+        ref = blob_ref(value)
+        if ref is None:
+            return value
+        raw = self.blob_store.get(ref)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _placeholder_png(self, text: str) -> bytes:
+        from PIL import ImageDraw
 
-    def _draw_image_fit(self, c: pdfcanvas.Canvas, img_bytes: bytes, x: float, y: float, max_w: float, max_h: float):
+        img = Image.new("RGB", (640, 360), (238, 238, 238))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([0, 0, 639, 359], outline=(170, 170, 170), width=2)
+        draw.text((24, 170), text, fill=(90, 90, 90))
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+
+    def _draw_image_fit(
+        self, c: PdfRecorder, img_bytes: bytes, x: float, y: float, max_w: float, max_h: float
+    ):
         # Fit image into the box (max_w x max_h), preserve aspect ratio
         with BytesIO(img_bytes) as bio:
             try:
@@ -342,140 +1012,208 @@ class Exporter:
                     raise ValueError('invalid image size')
                 scale = min(max_w / iw, max_h / ih)
                 dw, dh = iw * scale, ih * scale
-                img = ImageReader(im)
-                c.drawImage(img, x + (max_w - dw) / 2, y + (max_h - dh) / 2, width=dw, height=dh, preserveAspectRatio=True, mask='auto')
+                c.image(img_bytes, x + (max_w - dw) / 2, y + (max_h - dh) / 2, dw, dh)
             except Exception:
                 pass
 
-    def _strip_tags(self, html: str) -> str:
-        try:
-            return re.sub(r"<[^>]+>", "", html or "").strip()
-        except Exception:
-            return html or ""
-
-    def _first_heading(self, item: dict) -> tuple[str, int] | None:
-        t = item.get("type")
-        if t == "notebook_markdown":
-            src = item.get("source") or ""
-            for line in str(src).splitlines():
-                m = re.match(r"^\s{0,3}(#{1,6})\s+(.+)$", line)
-                if m:
-                    level = len(m.group(1))
-                    return (m.group(2).strip(), level)
-            return None
-        if t == "text_box":
-            html = item.get("content") or ""
-            # Prefer h1/h2
-            m = re.search(r"<h([12])[^>]*>(.*?)</h[12]>", html, flags=re.IGNORECASE | re.DOTALL)
-            if m:
-                    title = self._strip_tags(m.group(2)).strip()
-                    lvl = 1 if m.group(1) == '1' else 2
-                    return (title, lvl)
-            # Fallback to first line text
-            txt = self._strip_tags(html)
-            if txt:
-                return (txt.splitlines()[0].strip(), 2)
-        return None
-
-    def _run_pdf(self, job_id: str, req: ExportRequest) -> str:
-        out_path = os.path.join(self.out_dir, f"{job_id}.pdf")
+    def _pdf_layout(self, req: ExportRequest) -> Dict[str, Any]:
+        """PDF のページ/本文レイアウト設定（metadata.pdfStyle と既定値）。"""
         width, height = A4
         style = getattr(req, 'metadata', None)
+        pdf_style = (getattr(style, 'pdfStyle', None) or {}) if style else {}
         margins = {
-            'left': float(getattr(style, 'pdfStyle', {}).get('marginLeft', inch)) if style else inch,
-            'right': float(getattr(style, 'pdfStyle', {}).get('marginRight', inch)) if style else inch,
-            'top': float(getattr(style, 'pdfStyle', {}).get('marginTop', inch)) if style else inch,
-            'bottom': float(getattr(style, 'pdfStyle', {}).get('marginBottom', inch)) if style else inch,
+            'left': float(pdf_style.get('marginLeft', inch)),
+            'right': float(pdf_style.get('marginRight', inch)),
+            'top': float(pdf_style.get('marginTop', inch)),
+            'bottom': float(pdf_style.get('marginBottom', inch)),
         }
-        body_leading = float(getattr(style, 'pdfStyle', {}).get('bodyLeading', 14)) if style else 14
-        title_size = float(getattr(style, 'pdfStyle', {}).get('titleFontSize', 24)) if style else 24
-        heading_size = float(getattr(style, 'pdfStyle', {}).get('headingFontSize', 16)) if style else 16
-        body_size = float(getattr(style, 'pdfStyle', {}).get('bodyFontSize', 12)) if style else 12
-        columns = int(getattr(style, 'pdfStyle', {}).get('columns', 1)) if style else 1
-        column_gap = float(getattr(style, 'pdfStyle', {}).get('columnGap', 12)) if style else 12
-        page_w = width - margins['left'] - margins['right']
-        page_h = height - margins['top'] - margins['bottom']
+        return {
+            'width': width,
+            'height': height,
+            'margins': margins,
+            'body_leading': float(pdf_style.get('bodyLeading', 14)),
+            'title_size': float(pdf_style.get('titleFontSize', 24)),
+            'heading_size': float(pdf_style.get('headingFontSize', 16)),
+            'body_size': float(pdf_style.get('bodyFontSize', 12)),
+            'columns': int(pdf_style.get('columns', 1)),
+            'column_gap': float(pdf_style.get('columnGap', 12)),
+            'page_w': width - margins['left'] - margins['right'],
+            'page_h': height - margins['top'] - margins['bottom'],
+        }
+
+    def _font_file(self, name: str) -> str | None:
+        face = getattr(pdfmetrics.getFont(name), "face", None)
+        return getattr(face, "filename", None)
+
+    def _load_fragments(
+        self,
+        req: ExportRequest,
+        items: List[ContentItem],
+        opts: Dict[str, Any] | None,
+        memory: JobMemory | None = None,
+        cache: FragmentCache | None = None,
+    ) -> FragmentSet:
+        """項目毎のフラグメントキーを求め、キャッシュ済みのフラグメントを読み込む。
+
+        cache はフラグメントキャッシュ
+        （既定は self.fragment_cache。バッチでは BatchCache.fragments）。
+
+        キーには項目そのものに加え、出力形式・画像最適化設定・SVG 描画方式と、
+        PDF ならレイアウト設定とフォント、PPTX ならテンプレート（パス, mtime, サイズ）を含める。
+        """
+        context: Dict[str, Any] = {"format": req.format, "image": opts, "svg": svg_renderer_name()}
+        if req.format == 'pdf':
+            context["layout"] = self._pdf_layout(req)
+            fonts = (self.pdf_font_regular, self.pdf_font_bold)
+            context["fonts"] = [(name, self._font_file(name)) for name in fonts]
+            prefix = "pdf-"
+        else:
+            try:
+                context["template"] = list(self.template_cache.key(req.templatePath))
+            except OSError:
+                # テンプレートが無い場合はこの後の読み込みで失敗させる
+                context["template"] = None
+            prefix = "pptx-"
+        keys = [fragment_key(item.raw, context) for item in items]
+        media = memory.spill_store() if memory is not None else None
+        return FragmentSet(cache or self.fragment_cache, keys, prefix, media)
+
+    def _layout_pdf_item(
+        self, c: Any, item: ContentItem, img_bytes: bytes | None, new_page_cb, L: Dict[str, Any]
+    ) -> None:
+        """項目 1 件分の本文を描画する（c は PdfRecorder。new_page_cb で次のページへ進む）。"""
+        margins = L['margins']
+        height = L['height']
+        page_w, page_h = L['page_w'], L['page_h']
+        body_leading, body_size, heading_size = L['body_leading'], L['body_size'], L['heading_size']
+        columns, column_gap = L['columns'], L['column_gap']
+        c.setFont(self.pdf_font_regular, body_size)
+        y = height - margins['top']
+
+        def draw_text(txt: str, y: float) -> float:
+            if columns > 1:
+                return self._draw_text_columns(
+                    c, txt, margins['left'], y, page_w, page_h, columns, column_gap,
+                    body_leading, new_page_cb,
+                )
+            return self._draw_multiline(c, txt, margins['left'], y, page_w, leading=body_leading)
+
+        if item.heading:
+            title, _lvl = item.heading
+            c.setFont(self.pdf_font_bold, heading_size)
+            y = self._draw_multiline(c, title, margins['left'], y, page_w, leading=body_leading + 4)
+            c.setFont(self.pdf_font_regular, body_size)
+        if item.kind == "notebook_code" and img_bytes:
+            self._draw_image_fit(c, img_bytes, margins['left'], margins['bottom'], page_w, page_h)
+            if item.body:
+                new_page_cb()
+                draw_text(item.body, height - margins['top'])
+        else:
+            draw_text(item.body, y)
+
+    def _layout_pdf_fragments(
+        self,
+        items: List[ContentItem],
+        visuals: MutableMapping[int, bytes],
+        fragments: FragmentSet,
+        L: Dict[str, Any],
+        job_id: str | None = None,
+        window: int = 0,
+    ) -> None:
+        """キャッシュに無い項目を PdfRecorder にレイアウトし、新しい画像は並列にエンコードする。
+
+        window > 0（メモリ節約モード）なら window 件毎にエンコード結果を受け取り、元の画像を手放す。
+        """
+        pending: List[tuple[int, PdfRecorder]] = []
+        encodes: Dict[str, Future] = {}
+
+        def flush() -> None:
+            encoded: Dict[str, bytes] = {}
+            for sha, fut in encodes.items():
+                try:
+                    encoded[sha] = fut.result()
+                except Exception:
+                    # 壊れた画像は描画しない（従来どおり）
+                    pass
+            for idx, rec in pending:
+                media: Dict[str, bytes] = {}
+                for sha in rec.images:
+                    # 先にエンコード済み（キャッシュ済み）の画像もフラグメントのメディアに含める
+                    data = encoded.get(sha) or fragments.media.get(sha)
+                    if data is not None:
+                        media[sha] = data
+                frag = rec.fragment()
+                frag["media"] = sorted(media)
+                fragments.store(idx, frag, media)
+            pending.clear()
+            encodes.clear()
+
+        for idx, item in enumerate(items):
+            if idx in fragments.fragments:
+                continue
+            rec = PdfRecorder()
+            # 描画した画像は visuals から外す（エンコード後はフラグメントのメディアにだけ残す）
+            self._layout_pdf_item(rec, item, visuals.pop(idx, None), rec.new_page, L)
+            pending.append((idx, rec))
+            if job_id is not None:
+                self._add_progress(job_id, "items")
+            for sha, data in rec.images.items():
+                if sha not in fragments.media and sha not in encodes:
+                    encodes[sha] = self.visual_pool.submit(encode_pdf_image, data)
+            if window and len(pending) >= window:
+                flush()
+        flush()
+
+    def _run_pdf(
+        self,
+        job_id: str,
+        req: ExportRequest,
+        visuals: MutableMapping[int, bytes] | None = None,
+        fragments: FragmentSet | None = None,
+        memory: JobMemory | None = None,
+        items: List[ContentItem] | None = None,
+    ) -> str:
+        layout_started = time.perf_counter()
+        out_path = os.path.join(self.out_dir, f"{job_id}.pdf")
+        L = self._pdf_layout(req)
+        height = L['height']
+        margins = L['margins']
+        body_leading = L['body_leading']
+        title_size = L['title_size']
+        heading_size = L['heading_size']
+        body_size = L['body_size']
+        page_w = L['page_w']
+        if items is None:
+            items = compile_content(req.content)
+        if fragments is None:
+            fragments = self._load_fragments(req, items, None)
+        # 本文はフラグメント（項目毎の描画命令）として用意し、Canvas へは再生するだけにする
+        self._progress(job_id, items=len(fragments.fragments))
+        window = memory.window if memory is not None and memory.bounded else 0
+        self._layout_pdf_fragments(
+            items, visuals if visuals is not None else {}, fragments, L, job_id, window
+        )
+        self._progress(job_id, force=True, stage="write", items=len(items))
 
         def render_content(c: pdfcanvas.Canvas, new_page_cb, collect_headings: list | None, tracker: dict):
             summary_bookmarked = False
             outline_started = False
             references: set[str] = set()
-            items: list[dict] = list(req.content or [])
-            for item in items:
+            for idx, item in enumerate(items):
                 new_page_cb()
-                t = item.get("type")
-                c.setFont(self.pdf_font_regular, body_size)
-                y = height - margins['top']
                 should_bookmark_summary = False
-                if not summary_bookmarked and (t in ("text_box", "notebook_markdown")):
-                    txt = (item.get("content") or item.get("source") or "")
-                    if isinstance(txt, str) and ("エグゼクティブサマリー" in txt or "Executive Summary" in txt):
+                if not summary_bookmarked and item.kind in ("text_box", "notebook_markdown"):
+                    if "エグゼクティブサマリー" in item.text or "Executive Summary" in item.text:
                         should_bookmark_summary = True
 
-                heading = self._first_heading(item)
+                heading = item.heading
                 if collect_headings is not None and heading:
                     collect_headings.append((heading[0], heading[1], tracker['page']))
 
-                if t == "text_box":
-                    content_txt = item.get("content") or ""
-                    if heading:
-                        title, lvl = heading
-                        c.setFont(self.pdf_font_bold, heading_size)
-                        y = self._draw_multiline(c, title, margins['left'], y, page_w, leading=body_leading + 4)
-                        c.setFont(self.pdf_font_regular, body_size)
-                        content_txt = self._strip_tags(content_txt)
-                    if columns > 1:
-                        y = self._draw_text_columns(c, content_txt, margins['left'], y, page_w, page_h, columns, column_gap, body_leading, new_page_cb)
-                    else:
-                        y = self._draw_multiline(c, content_txt, margins['left'], y, page_w, leading=body_leading)
-                elif t == "notebook_markdown":
-                    md = item.get("source") or ""
-                    if heading:
-                        title, lvl = heading
-                        c.setFont(self.pdf_font_bold, heading_size)
-                        y = self._draw_multiline(c, title, margins['left'], y, page_w, leading=body_leading + 4)
-                        c.setFont(self.pdf_font_regular, body_size)
-                        lines = []
-                        used = False
-                        for line in str(md).splitlines():
-                            if not used and re.match(r"^\s{0,3}#{1,6}\s+", line):
-                                used = True
-                                continue
-                            lines.append(line)
-                        md = "\n".join(lines)
-                    if columns > 1:
-                        y = self._draw_text_columns(c, md, margins['left'], y, page_w, page_h, columns, column_gap, body_leading, new_page_cb)
-                    else:
-                        y = self._draw_multiline(c, md, margins['left'], y, page_w, leading=body_leading)
-                elif t == "notebook_code":
-                    img_bytes = self._extract_first_visual_bytes(item)
-                    if img_bytes:
-                        self._draw_image_fit(c, img_bytes, margins['left'], margins['bottom'], page_w, page_h)
-                        txt = item.get("source") or ""
-                        if txt:
-                            new_page_cb()
-                            y = height - margins['top']
-                            if columns > 1:
-                                self._draw_text_columns(c, txt, margins['left'], y, page_w, page_h, columns, column_gap, body_leading, new_page_cb)
-                            else:
-                                self._draw_multiline(c, txt, margins['left'], y, page_w, leading=body_leading)
-                    else:
-                        txt = item.get("source") or ""
-                        if columns > 1:
-                            y = self._draw_text_columns(c, txt, margins['left'], y, page_w, page_h, columns, column_gap, body_leading, new_page_cb)
-                        else:
-                            y = self._draw_multiline(c, txt, margins['left'], y, page_w, leading=body_leading)
-                else:
-                    txt = str(item)
-                    if columns > 1:
-                        y = self._draw_text_columns(c, txt, margins['left'], y, page_w, page_h, columns, column_gap, body_leading, new_page_cb)
-                    else:
-                        y = self._draw_multiline(c, txt, margins['left'], y, page_w, leading=body_leading)
+                replay_fragment(c, fragments.fragments[idx], fragments.media, new_page_cb)
 
-                origin = item.get("origin") or {}
-                if origin:
-                    ref = f"{origin.get('notebookName','')}#cell-{origin.get('cellIndex','')}"
-                    references.add(ref)
+                if item.origin:
+                    references.add(item.origin)
 
                 if heading:
                     title, lvl = heading
@@ -504,33 +1242,25 @@ class Exporter:
             c.bookmarkPage("references")
             c.addOutlineEntry("References", "references", level=0)
 
-        # Pass 1: render to memory and collect heading pages
-        buf = BytesIO()
-        c1 = pdfcanvas.Canvas(buf, pagesize=A4)
-        c1.setAuthor((getattr(req.metadata, 'author', None) or "Notebook Report Weaver"))
-        tracker = {'page': 1}
-        def new_page1():
-            c1.showPage()
-            tracker['page'] += 1
-        c1.setFont(self.pdf_font_bold, title_size)
-        c1.drawString(margins['left'], height - margins['top'] * 0.75, req.title)
-        c1.setFont(self.pdf_font_regular, body_size)
-        new_page1()
-        c1.setFont(self.pdf_font_bold, heading_size)
-        c1.drawString(margins['left'], height - margins['top'] * 0.75, "Table of Contents")
-        c1.setFont(self.pdf_font_regular, body_size)
-        new_page1()
-        headings_acc: list[tuple[str, int, int]] = []
-        render_content(c1, new_page1, headings_acc, tracker)
-        c1.save()
+        # 単一パス描画: 見出しはレイアウト前に列挙できるので目次のページ数を先に確定し、
+        # 目次ページにはフォーム(XObject)の参照だけを置く。本文描画後にページ番号入りの
+        # 目次をフォームとして定義する（フォームは保存前であれば後から定義できる）。
+        toc_headings = [item.heading for item in items if item.heading]
+        toc_pages = self._layout_toc(
+            toc_headings,
+            height - margins['top'] * 1.2,
+            height - margins['top'],
+            margins['bottom'],
+            body_leading,
+        )
 
-        # Pass 2: final render with TOC
         c = pdfcanvas.Canvas(out_path, pagesize=A4)
         c.setAuthor((getattr(req.metadata, 'author', None) or "Notebook Report Weaver"))
-        tracker2 = {'page': 1}
-        def new_page2():
+        tracker = {'page': 1}
+        def new_page():
             c.showPage()
-            tracker2['page'] += 1
+            tracker['page'] += 1
+            self._progress(job_id, pages=tracker['page'] - 1)
         # Title page
         c.setFont(self.pdf_font_bold, title_size)
         c.drawString(margins['left'], height - margins['top'] * 0.75, req.title)
@@ -551,23 +1281,31 @@ class Exporter:
         for s in sub:
             c.drawString(margins['left'], y, s)
             y -= body_leading
-        new_page2()
-        # TOC
+        new_page()
+        # TOC（予約ページ）
         c.setFont(self.pdf_font_bold, heading_size)
         c.drawString(margins['left'], height - margins['top'] * 0.75, "Table of Contents")
         c.bookmarkPage("toc")
         c.addOutlineEntry("Table of Contents", "toc", level=0)
-        c.setFont(self.pdf_font_regular, body_size)
-        y = height - margins['top'] * 1.2
-        for title, lvl, pg in headings_acc:
-            indent = (lvl - 1) * 12
-            line = f"{title} ....... {pg}"
-            c.drawString(margins['left'] + indent, y, line)
-            y -= body_leading
-            if y < margins['bottom']:
-                new_page2()
-                y = height - margins['top']
-        new_page2()
-        render_content(c, new_page2, None, tracker2)
-        c.save()
+        for i in range(len(toc_pages)):
+            if i > 0:
+                new_page()
+            c.doForm(f"toc-{i}")
+        new_page()
+        headings_acc: list[tuple[str, int, int]] = []
+        render_content(c, new_page, headings_acc, tracker)
+        # 目次の中身を確定（本文で得たページ番号を埋める）
+        entries = iter(headings_acc)
+        for i, page_lines in enumerate(toc_pages):
+            c.beginForm(f"toc-{i}")
+            c.setFont(self.pdf_font_regular, body_size)
+            for lvl, y in page_lines:
+                title, _, pg = next(entries)
+                indent = (lvl - 1) * 12
+                c.drawString(margins['left'] + indent, y, f"{title} ....... {pg}")
+            c.endForm()
+        self._progress(job_id, force=True, pages=tracker['page'])
+        STAGE_SECONDS.observe(time.perf_counter() - layout_started, stage="layout", detail="pdf")
+        with STAGE_SECONDS.time(stage="serialize", detail="pdf"):
+            c.save()
         return out_path
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Dict, List, MutableMapping, Set
+
+import orjson
+
+from .visual_cache import VisualCache
+
+# フラグメントの形式/描画方法を変えたら上げる（古いキャッシュを無効化する）
+FRAGMENT_VERSION = 1
+
+
+def fragment_key(item: Any, context: Dict[str, Any]) -> str:
+    """コンテンツ項目 1 件分のフラグメントのキー。
+
+    項目 + 形式/スタイル/テンプレート等の sha256。
+    """
+    h = hashlib.sha256()
+    ctx = {"v": FRAGMENT_VERSION, "ctx": context}
+    h.update(orjson.dumps(ctx, option=orjson.OPT_SORT_KEYS, default=str))
+    h.update(b"\0")
+    h.update(orjson.dumps(item, option=orjson.OPT_SORT_KEYS, default=str))
+    return h.hexdigest()
+
+
+class FragmentCache:
+    """レンダリング済みフラグメント（項目毎のレイアウト結果）と、それが参照するメディアのキャッシュ。
+
+    フラグメントは JSON（PDF: ページ毎の描画命令 / PPTX: スライドの図形 XML）、メディアは
+    内容アドレスのバイト列（PDF: エンコード済み画像 / PPTX: 埋め込む画像）として
+    VisualCache に格納する。
+    再エクスポート時は変更のない項目をキャッシュから組み立て、変更された項目だけを描画し直す。
+    """
+
+    def __init__(self, store: VisualCache | None):
+        self.store = store
+
+    @classmethod
+    def from_env(cls, out_dir: str) -> "FragmentCache":
+        if os.getenv("FRAGMENT_CACHE", "true").strip().lower() not in ("1", "true", "yes", "on"):
+            return cls(None)
+        cache_dir = os.getenv("FRAGMENT_CACHE_DIR") or os.path.join(out_dir, ".fragment-cache")
+        mem = int(os.getenv("FRAGMENT_CACHE_MEMORY_BYTES", str(64 << 20)))
+        disk = int(os.getenv("FRAGMENT_CACHE_DISK_BYTES", str(512 << 20)))
+        return cls(VisualCache(cache_dir, mem, disk, suffix=".frag"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        if self.store is None:
+            return None
+        raw = self.store.get(f"f-{key}")
+        if raw is None:
+            return None
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return None
+
+    def put(self, key: str, fragment: Dict[str, Any]) -> None:
+        if self.store is not None:
+            self.store.put(f"f-{key}", orjson.dumps(fragment))
+
+    def get_media(self, key: str) -> bytes | None:
+        return self.store.get(f"m-{key}") if self.store is not None else None
+
+    def put_media(self, key: str, data: bytes) -> None:
+        if self.store is not None:
+            self.store.put(f"m-{key}", data)
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.stats() if self.store is not None else {}
+
+
+class FragmentSet:
+    """1 回のエクスポートで使うフラグメント（項目インデックス -> フラグメント）とメディア。
+
+    生成時にキャッシュ済みのフラグメントを読み込む（参照するメディアが欠けていればミス扱い）。
+    新たに描画した項目は store で追加し、キャッシュ可能なものはキャッシュにも書き込む。
+    media を渡すとメディアをそこに置く（メモリ節約モードの SpillStore）。
+    """
+
+    def __init__(
+        self,
+        cache: FragmentCache,
+        keys: List[str],
+        media_prefix: str,
+        media: MutableMapping[str, bytes] | None = None,
+    ):
+        self.cache = cache
+        self.keys = keys
+        self.media_prefix = media_prefix
+        self.fragments: Dict[int, Dict[str, Any]] = {}
+        self.media: MutableMapping[str, bytes] = media if media is not None else {}
+        # プレースホルダーを使った項目など、キャッシュしてはいけない項目
+        self.uncacheable: Set[int] = set()
+        self.hits = 0
+        if not cache.enabled:
+            return
+        for idx, key in enumerate(keys):
+            frag = cache.get(key)
+            if frag is None:
+                continue
+            media: Dict[str, bytes] = {}
+            for sha in frag.get("media") or []:
+                data = self.media.get(sha) or cache.get_media(media_prefix + sha)
+                if data is None:
+                    break
+                media[sha] = data
+            else:
+                self.fragments[idx] = frag
+                self.media.update(media)
+                self.hits += 1
+
+    def store(self, idx: int, fragment: Dict[str, Any], media: Dict[str, bytes]) -> None:
+        self.fragments[idx] = fragment
+        self.media.update(media)
+        if not self.cache.enabled or idx in self.uncacheable:
+            return
+        for sha, data in media.items():
+            self.cache.put_media(self.media_prefix + sha, data)
+        self.cache.put(self.keys[idx], fragment)
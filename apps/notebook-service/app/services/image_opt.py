@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+from io import BytesIO
+from typing import Any, Dict
+
+from PIL import Image
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    v = os.getenv(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _is_photo(im: Image.Image) -> bool:
+    # 縮小版の色数で写真/グラフを判定する（グラフは色数が少ない）
+    thumb = im.convert("RGB")
+    thumb.thumbnail((128, 128))
+    return thumb.getcolors(maxcolors=4096) is None
+
+
+def optimize_image(data: bytes, opts: Dict[str, Any]) -> bytes:
+    """表示枠に対して過剰な解像度の画像を縮小し、必要なら再圧縮する。
+
+    opts: box_w_in / box_h_in（表示枠インチ）, dpi, max_pixels, lossy, jpeg_quality, palette
+    （プロセスプールに渡せるよう dict で受け取る）。元より小さくならない場合は元のバイト列を返す。
+    """
+    with Image.open(BytesIO(data)) as src:
+        w, h = src.size
+        # ヘッダだけを読んだ段階で画素数を確認する（展開爆弾対策）
+        max_pixels = int(opts.get("max_pixels") or 0)
+        if w <= 0 or h <= 0 or (max_pixels and w * h > max_pixels):
+            raise ImageTooLarge(f"image too large: {w}x{h}")
+        dpi = float(opts.get("dpi") or 0)
+        scale = 1.0
+        if dpi > 0:
+            tw = float(opts.get("box_w_in") or 0) * dpi
+            th = float(opts.get("box_h_in") or 0) * dpi
+            if tw > 0 and th > 0:
+                scale = min(1.0, tw / w, th / h)
+        resized = scale < 0.95
+        if not resized and not opts.get("lossy") and not opts.get("palette"):
+            return data
+        if resized:
+            im = src.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+        else:
+            im = src.copy()
+
+    has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+    candidates: list[bytes] = []
+    if opts.get("lossy") and _is_photo(im):
+        rgb = im.convert("RGBA") if has_alpha else im.convert("RGB")
+        if has_alpha:
+            bg = Image.new("RGB", rgb.size, (255, 255, 255))
+            bg.paste(rgb, mask=rgb.split()[-1])
+            rgb = bg
+        buf = BytesIO()
+        rgb.save(buf, format="JPEG", quality=int(opts.get("jpeg_quality") or 85), optimize=True)
+        candidates.append(buf.getvalue())
+    elif opts.get("palette") and im.mode != "P":
+        method = Image.Quantize.FASTOCTREE if has_alpha else Image.Quantize.MEDIANCUT
+        base = im.convert("RGBA") if has_alpha else im.convert("RGB")
+        pal = base.quantize(colors=256, method=method)
+        buf = BytesIO()
+        pal.save(buf, format="PNG", optimize=True)
+        candidates.append(buf.getvalue())
+    if resized:
+        buf = BytesIO()
+        im.save(buf, format="PNG", optimize=True)
+        candidates.append(buf.getvalue())
+    if not candidates:
+        return data
+    best = min(candidates, key=len)
+    # 縮小した場合は常に採用（表示品質は同等で描画/保存が軽くなる）、そうでなければ小さくなる時だけ
+    return best if resized or len(best) < len(data) else data
+
+
+class ImageOptimizer:
+    """出力形式毎の目標 DPI と画素数上限の設定。"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        dpi: Dict[str, int] | None = None,
+        max_pixels: int = 50_000_000,
+        lossy: bool = False,
+        jpeg_quality: int = 85,
+        palette: bool = False,
+    ):
+        self.enabled = enabled
+        self.dpi = dpi or {"pptx": 150, "pdf": 200}
+        self.max_pixels = int(max_pixels)
+        self.lossy = lossy
+        self.jpeg_quality = int(jpeg_quality)
+        self.palette = palette
+
+    @classmethod
+    def from_env(cls) -> "ImageOptimizer":
+        return cls(
+            enabled=_env_bool("EXPORT_IMAGE_OPTIMIZE", True),
+            dpi={
+                "pptx": int(os.getenv("EXPORT_IMAGE_DPI_PPTX", "150")),
+                "pdf": int(os.getenv("EXPORT_IMAGE_DPI_PDF", "200")),
+            },
+            max_pixels=int(os.getenv("EXPORT_IMAGE_MAX_PIXELS", "50000000")),
+            lossy=_env_bool("EXPORT_IMAGE_LOSSY", False),
+            jpeg_quality=int(os.getenv("EXPORT_IMAGE_JPEG_QUALITY", "85")),
+            palette=_env_bool("EXPORT_IMAGE_PALETTE", False),
+        )
+
+    def options_for(self, fmt: str, box_w_in: float, box_h_in: float) -> Dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        return {
+            "box_w_in": box_w_in,
+            "box_h_in": box_h_in,
+            "dpi": self.dpi.get(fmt, 150),
+            "max_pixels": self.max_pixels,
+            "lossy": self.lossy,
+            "jpeg_quality": self.jpeg_quality,
+            "palette": self.palette,
+        }
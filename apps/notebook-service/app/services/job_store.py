@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Tuple
+
+from ..schemas_export import ExportJob
+
+
+class JobStore(ABC):
+    """エクスポートジョブの状態とメタデータ（ダウンロード名生成用）の保存先。
+
+    ジョブは最終更新から ttl_seconds 経過すると期限切れになり、get では見えなくなる
+    （実体の削除は purge_expired でまとめて行う）。ttl_seconds=0 で無期限。
+    バッチ（POST /export/batch）はジョブとは別の記録として、作成から ttl_seconds の間保存する。
+    """
+
+    # create この回数毎に期限切れを掃除する
+    PURGE_EVERY = 256
+    # 別名（重複排除キー）の付け替えを許す状態
+    DEAD_STATUSES = ("failed", "expired")
+
+    def __init__(self, ttl_seconds: float = 86400):
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._creates = 0
+
+    def _maybe_purge(self) -> None:
+        self._creates += 1
+        if self._creates % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def _expires_at(self, now: float) -> float:
+        return now + self.ttl_seconds if self.ttl_seconds else float("inf")
+
+    @abstractmethod
+    def create(self, job: ExportJob, meta: Dict[str, Any] | None = None) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> ExportJob | None:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields: Any) -> ExportJob | None:
+        """フィールドを原子的に更新し、更新後のジョブを返す（存在しない/期限切れなら None）。"""
+
+    @abstractmethod
+    def get_meta(self, job_id: str) -> Dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def set_meta(self, job_id: str, meta: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def list_by_status(self, status: str, limit: int = 100) -> List[ExportJob]:
+        ...
+
+    @abstractmethod
+    def claim(self, alias: str, job_id: str) -> str:
+        """別名（リクエストハッシュ / Idempotency-Key）をジョブに結び付ける。
+
+        既に有効なジョブ（期限内で failed/expired 以外）に結び付いていればそのジョブ ID を、
+        そうでなければ job_id に結び付けて job_id を返す。判定と更新は原子的に行う。
+        """
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """ジョブと、ジョブに結び付いた別名を削除する。"""
+
+    @abstractmethod
+    def create_batch(self, batch_id: str, job_ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def get_batch(self, batch_id: str) -> List[str] | None:
+        """バッチのジョブ ID の列（存在しない/期限切れなら None）。"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """期限切れのジョブとバッチを削除し、削除した件数を返す。"""
+
+    def close(self) -> None:  # noqa: B027 - 既定では解放するものがない
+        pass
+
+    @classmethod
+    def from_env(cls, out_dir: str) -> "JobStore":
+        ttl = float(os.getenv("JOB_TTL_SECONDS", "86400"))
+        backend = os.getenv("JOB_STORE", "memory").strip().lower()
+        if backend == "sqlite":
+            path = os.getenv("JOB_STORE_PATH", os.path.join(out_dir, ".jobs.sqlite3"))
+            return SqliteJobStore(path, ttl)
+        if backend != "memory":
+            raise ValueError(f"unknown JOB_STORE: {backend}")
+        return MemoryJobStore(ttl)
+
+
+class MemoryJobStore(JobStore):
+    """プロセス内の辞書による実装（uvicorn のワーカー間では共有されない）。"""
+
+    def __init__(self, ttl_seconds: float = 86400):
+        super().__init__(ttl_seconds)
+        self._lock = threading.RLock()
+        # job_id -> [ExportJob, meta, expires_at]
+        self._jobs: Dict[str, List[Any]] = {}
+        # status -> job_id の索引
+        self._by_status: Dict[str, set] = {}
+        # 別名 -> job_id と、その逆引き
+        self._aliases: Dict[str, str] = {}
+        self._job_aliases: Dict[str, set] = {}
+        # batch_id -> (job_ids, expires_at)
+        self._batches: Dict[str, Tuple[List[str], float]] = {}
+
+    def _live(self, job_id: str, now: float) -> List[Any] | None:
+        rec = self._jobs.get(job_id)
+        if rec is None or rec[2] <= now:
+            return None
+        return rec
+
+    def _index(self, job_id: str, old: str | None, new: str) -> None:
+        if old is not None and old != new:
+            self._by_status.get(old, set()).discard(job_id)
+        self._by_status.setdefault(new, set()).add(job_id)
+
+    def create(self, job: ExportJob, meta: Dict[str, Any] | None = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._jobs[job.jobId] = [job.model_copy(), dict(meta or {}), self._expires_at(now)]
+            self._index(job.jobId, None, job.status)
+            self._maybe_purge()
+
+    def get(self, job_id: str) -> ExportJob | None:
+        # 更新途中の状態を返さないよう、ロック下でスナップショットを返す
+        with self._lock:
+            rec = self._live(job_id, time.time())
+            return rec[0].model_copy() if rec else None
+
+    def update(self, job_id: str, **fields: Any) -> ExportJob | None:
+        now = time.time()
+        with self._lock:
+            rec = self._live(job_id, now)
+            if rec is None:
+                return None
+            job: ExportJob = rec[0]
+            old = job.status
+            for k, v in fields.items():
+                setattr(job, k, v)
+            self._index(job_id, old, job.status)
+            rec[2] = self._expires_at(now)
+            return job.model_copy()
+
+    def get_meta(self, job_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            rec = self._live(job_id, time.time())
+            return dict(rec[1]) if rec else None
+
+    def set_meta(self, job_id: str, meta: Dict[str, Any]) -> None:
+        with self._lock:
+            rec = self._live(job_id, time.time())
+            if rec is not None:
+                rec[1] = dict(meta)
+
+    def list_by_status(self, status: str, limit: int = 100) -> List[ExportJob]:
+        now = time.time()
+        with self._lock:
+            out = []
+            for job_id in list(self._by_status.get(status, ())):
+                rec = self._live(job_id, now)
+                if rec is not None:
+                    out.append(rec[0].model_copy())
+                    if len(out) >= limit:
+                        break
+            return out
+
+    def claim(self, alias: str, job_id: str) -> str:
+        with self._lock:
+            cur = self._aliases.get(alias)
+            if cur is not None and cur != job_id:
+                rec = self._live(cur, time.time())
+                if rec is not None and rec[0].status not in self.DEAD_STATUSES:
+                    return cur
+                self._job_aliases.get(cur, set()).discard(alias)
+            self._aliases[alias] = job_id
+            self._job_aliases.setdefault(job_id, set()).add(alias)
+            return job_id
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            rec = self._jobs.pop(job_id, None)
+            if rec is not None:
+                self._by_status.get(rec[0].status, set()).discard(job_id)
+            for alias in self._job_aliases.pop(job_id, ()):
+                if self._aliases.get(alias) == job_id:
+                    del self._aliases[alias]
+
+    def create_batch(self, batch_id: str, job_ids: List[str]) -> None:
+        with self._lock:
+            self._batches[batch_id] = (list(job_ids), self._expires_at(time.time()))
+
+    def get_batch(self, batch_id: str) -> List[str] | None:
+        with self._lock:
+            rec = self._batches.get(batch_id)
+            if rec is None or rec[1] <= time.time():
+                return None
+            return list(rec[0])
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [k for k, rec in self._jobs.items() if rec[2] <= now]
+            for job_id in expired:
+                self.delete(job_id)
+            batches = [k for k, rec in self._batches.items() if rec[1] <= now]
+            for batch_id in batches:
+                del self._batches[batch_id]
+            return len(expired) + len(batches)
+
+
+class SqliteJobStore(JobStore):
+    """SQLite による実装。同じファイルを指す複数の uvicorn ワーカー/プロセス間で共有できる。
+
+    WAL モードで読み取りは書き込みをブロックしない。更新は BEGIN IMMEDIATE の
+    トランザクション内で読み出し→書き戻しを行うため、並行更新でも欠落しない。
+    接続はスレッド毎に持ち、close ですべてのスレッドの接続を閉じる。
+    """
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            data TEXT NOT NULL,
+            meta TEXT NOT NULL DEFAULT '{}',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            expires_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_expires ON export_jobs(expires_at)",
+        """
+        CREATE TABLE IF NOT EXISTS export_job_aliases (
+            alias TEXT PRIMARY KEY,
+            job_id TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_export_job_aliases_job ON export_job_aliases(job_id)",
+        """
+        CREATE TABLE IF NOT EXISTS export_batches (
+            batch_id TEXT PRIMARY KEY,
+            job_ids TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL
+        )
+        """,
+    )
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, timeout: float = 30.0):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        # close で閉じるため、全スレッドの接続を保持する
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            for stmt in self._SCHEMA:
+                conn.execute(stmt)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: トランザクションは明示的に BEGIN する
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def _expires_col(self, now: float) -> float | None:
+        return now + self.ttl_seconds if self.ttl_seconds else None
+
+    @staticmethod
+    def _row_job(row: Tuple[Any, ...]) -> ExportJob:
+        return ExportJob.model_validate_json(row[0])
+
+    def create(self, job: ExportJob, meta: Dict[str, Any] | None = None) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO export_jobs"
+            " (job_id, status, data, meta, created_at, updated_at, expires_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.jobId, job.status, job.model_dump_json(), json.dumps(meta or {}),
+                now, now, self._expires_col(now),
+            ),
+        )
+        self._maybe_purge()
+
+    def get(self, job_id: str) -> ExportJob | None:
+        row = self._conn().execute(
+            "SELECT data FROM export_jobs"
+            " WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        return self._row_job(row) if row else None
+
+    def update(self, job_id: str, **fields: Any) -> ExportJob | None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM export_jobs"
+                " WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job = self._row_job(row)
+            for k, v in fields.items():
+                setattr(job, k, v)
+            conn.execute(
+                "UPDATE export_jobs SET status = ?, data = ?, updated_at = ?, expires_at = ?"
+                " WHERE job_id = ?",
+                (job.status, job.model_dump_json(), now, self._expires_col(now), job_id),
+            )
+            conn.execute("COMMIT")
+            return job
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_meta(self, job_id: str) -> Dict[str, Any] | None:
+        row = self._conn().execute(
+            "SELECT meta FROM export_jobs"
+            " WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, job_id: str, meta: Dict[str, Any]) -> None:
+        self._conn().execute(
+            "UPDATE export_jobs SET meta = ? WHERE job_id = ?", (json.dumps(meta), job_id)
+        )
+
+    def list_by_status(self, status: str, limit: int = 100) -> List[ExportJob]:
+        rows = self._conn().execute(
+            "SELECT data FROM export_jobs"
+            " WHERE status = ? AND (expires_at IS NULL OR expires_at > ?)"
+            " ORDER BY updated_at LIMIT ?",
+            (status, time.time(), int(limit)),
+        ).fetchall()
+        return [self._row_job(r) for r in rows]
+
+    def claim(self, alias: str, job_id: str) -> str:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT a.job_id, j.status FROM export_job_aliases a"
+                " JOIN export_jobs j ON j.job_id = a.job_id"
+                " WHERE a.alias = ? AND (j.expires_at IS NULL OR j.expires_at > ?)",
+                (alias, now),
+            ).fetchone()
+            if row is not None and row[0] != job_id and row[1] not in self.DEAD_STATUSES:
+                conn.execute("COMMIT")
+                return row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO export_job_aliases (alias, job_id) VALUES (?, ?)",
+                (alias, job_id),
+            )
+            conn.execute("COMMIT")
+            return job_id
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, job_id: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM export_job_aliases WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM export_jobs WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def create_batch(self, batch_id: str, job_ids: List[str]) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO export_batches (batch_id, job_ids, created_at, expires_at)"
+            " VALUES (?, ?, ?, ?)",
+            (batch_id, json.dumps(list(job_ids)), now, self._expires_col(now)),
+        )
+
+    def get_batch(self, batch_id: str) -> List[str] | None:
+        row = self._conn().execute(
+            "SELECT job_ids FROM export_batches"
+            " WHERE batch_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (batch_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM export_job_aliases WHERE job_id IN"
+                " (SELECT job_id FROM export_jobs"
+                " WHERE expires_at IS NOT NULL AND expires_at <= ?)",
+                (now,),
+            )
+            cur = conn.execute(
+                "DELETE FROM export_jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            )
+            batches = conn.execute(
+                "DELETE FROM export_batches WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (now,),
+            )
+            conn.execute("COMMIT")
+            return cur.rowcount + batches.rowcount
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        # 閉じた後に使われた場合は、そのスレッドで接続し直す
+        self._local = threading.local()
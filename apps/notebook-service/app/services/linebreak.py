@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Tuple
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# 行頭に置かない文字（直前と分割しない）
+NO_BREAK_BEFORE = set(
+    "、。，．・：；？！ー‐〜～…‥」』）］｝〉》】〕〙〗゛゜"
+    "ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ々"
+)
+# 行末に置かない文字（直後と分割しない）
+NO_BREAK_AFTER = set("「『（［｛〈《【〔〘〖")
+# CJK の直後に空白なしで続く欧文の閉じ記号
+LATIN_CLOSE = set(",.:;?!)]}%")
+
+_CJK_RANGES = (
+    (0x2E80, 0x2FFF),  # CJK 部首
+    (0x3000, 0x303F),  # CJK 記号と句読点
+    (0x3040, 0x30FF),  # ひらがな・カタカナ
+    (0x3100, 0x31FF),
+    (0x3400, 0x4DBF),  # CJK 統合漢字拡張 A
+    (0x4E00, 0x9FFF),  # CJK 統合漢字
+    (0xAC00, 0xD7AF),  # ハングル
+    (0xF900, 0xFAFF),
+    (0xFF00, 0xFFEF),  # 全角英数・半角カナ
+)
+
+_CJK_CLASS = "".join(f"\\u{lo:04x}-\\u{hi:04x}" for lo, hi in _CJK_RANGES) + re.escape(
+    "".join(sorted(NO_BREAK_BEFORE | NO_BREAK_AFTER))
+)
+# 空白の連続 / CJK（と禁則記号）1 文字 / それ以外の連続
+_TOKEN_RE = re.compile(f" +|[{_CJK_CLASS}]|[^ {_CJK_CLASS}]+")
+
+# (フォント名, サイズ) 毎の幅キャッシュ。1 文字とトークン（単語）の幅を持つ
+_widths: Dict[Tuple[str, float], Dict[str, float]] = {}
+_MAX_ENTRIES = 100_000
+
+
+def _table(font_name: str, font_size: float) -> Dict[str, float]:
+    key = (font_name, float(font_size))
+    table = _widths.get(key)
+    if table is None:
+        table = _widths.setdefault(key, {})
+    return table
+
+
+def _measure(table: Dict[str, float], text: str, font_name: str, font_size: float) -> float:
+    w = table.get(text)
+    if w is not None:
+        return w
+    total = 0.0
+    for ch in text:
+        cw = table.get(ch)
+        if cw is None:
+            cw = stringWidth(ch, font_name, font_size)
+            table[ch] = cw
+        total += cw
+    if len(table) < _MAX_ENTRIES:
+        table[text] = total
+    return total
+
+
+def text_width(text: str, font_name: str, font_size: float) -> float:
+    """文字幅の合計（reportlab の stringWidth と同じくカーニングなし）。
+
+    文字/単語毎の幅はメモ化する。
+    """
+    return _measure(_table(font_name, font_size), text, font_name, font_size)
+
+
+def _tokens(line: str) -> List[Tuple[str, bool]]:
+    """改行可能位置で区切ったトークン列。(テキスト, 直前に空白があるか)。
+
+    欧文は空白区切りの単語単位、CJK は 1 文字単位（禁則文字は前後のトークンに連結）。
+    連続する空白は 1 つにまとめ、行頭の空白は捨てる（従来の折り返しと同じ挙動）。
+    """
+    tokens: List[Tuple[str, bool]] = []
+    space = False
+    for m in _TOKEN_RE.finditer(line):
+        tok = m.group()
+        if tok[0] == " ":
+            space = True
+            continue
+        if tokens and not space:
+            prev, sp = tokens[-1]
+            # 行頭禁則・行末禁則・CJK 直後の欧文閉じ記号は直前のトークンと分割しない
+            if tok[0] in NO_BREAK_BEFORE or prev[-1] in NO_BREAK_AFTER or tok[0] in LATIN_CLOSE:
+                tokens[-1] = (prev + tok, sp)
+                continue
+        tokens.append((tok, space))
+        space = False
+    return tokens
+
+
+def wrap_text(
+    text: str, max_width: float, font_name: str = "Helvetica", font_size: float = 12
+) -> List[str]:
+    """貪欲法で折り返した行のリストを返す。
+
+    幅はトークン毎に 1 回だけ測り、行幅は加算で求める（試行文字列を毎回測り直さない）。
+    1 トークンが max_width を超える場合はそのまま 1 行に置く。
+    """
+    lines: List[str] = []
+    table = _table(font_name, font_size)
+    space_w = _measure(table, " ", font_name, font_size)
+    for raw_line in str(text or "").splitlines() or [""]:
+        cur: List[str] = []
+        cur_w = 0.0
+        for tok, space in _tokens(raw_line):
+            w = _measure(table, tok, font_name, font_size)
+            add = w + (space_w if space and cur else 0.0)
+            if not cur or cur_w + add <= max_width:
+                if space and cur:
+                    cur.append(" ")
+                cur.append(tok)
+                cur_w += add
+                continue
+            lines.append("".join(cur))
+            cur, cur_w = [tok], w
+        lines.append("".join(cur))
+    return lines
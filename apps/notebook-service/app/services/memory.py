@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict, List, MutableMapping
+
+from .metrics import rss_bytes
+from .spill import SpillStore
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """ジョブがメモリの上限（RSS / バイト数）を超えた。ジョブを失敗させ、ワーカーは落とさない。"""
+
+
+# RSS を測る最小間隔（秒）。/proc の読み込みを項目毎には行わない
+SAMPLE_INTERVAL = 0.02
+
+
+def _mib(n: int) -> str:
+    return f"{n / (1 << 20):.1f} MiB"
+
+
+class JobMemory:
+    """1 ジョブ分のメモリ使用量（RSS のピーク、扱った画像のバイト数）の計測と上限の確認。
+
+    RSS はプロセス全体の値（スレッド実行では同時に実行中のジョブの分も含む）で、
+    sample を呼んだ時点（項目/ページ毎の進捗の更新時、SAMPLE_INTERVAL 毎に間引く）に測る。
+    bounded なら中間データを SpillStore に置く（spill_store）。
+    """
+
+    def __init__(
+        self,
+        bounded: bool = False,
+        max_rss_bytes: int = 0,
+        max_job_bytes: int = 0,
+        spill_memory_bytes: int = 8 << 20,
+        spill_dir: str | None = None,
+        window: int = 8,
+    ):
+        self.bounded = bounded
+        self.max_rss_bytes = max(0, int(max_rss_bytes))
+        self.max_job_bytes = max(0, int(max_job_bytes))
+        self.spill_memory_bytes = spill_memory_bytes
+        self.spill_dir = spill_dir
+        # メモリ節約モードで同時に展開しておく画像の数（ワーカープールに渡す単位）
+        self.window = max(1, int(window))
+        self.start_rss = rss_bytes()
+        self.peak_rss = self.start_rss
+        self.job_bytes = 0
+        self._stores: List[SpillStore] = []
+        self._sampled_at = 0.0
+
+    def sample(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._sampled_at < SAMPLE_INTERVAL:
+            return
+        self._sampled_at = now
+        rss = rss_bytes()
+        if rss is None:
+            return
+        if self.peak_rss is None or rss > self.peak_rss:
+            self.peak_rss = rss
+        if self.max_rss_bytes and rss > self.max_rss_bytes:
+            raise MemoryBudgetExceeded(
+                f"memory budget exceeded: RSS {_mib(rss)} > {_mib(self.max_rss_bytes)}"
+            )
+
+    def add_bytes(self, n: int) -> None:
+        """ジョブが展開/生成した画像のバイト数を加える（退避したかどうかに関わらず数える）。"""
+        self.job_bytes += n
+        if self.max_job_bytes and self.job_bytes > self.max_job_bytes:
+            raise MemoryBudgetExceeded(
+                f"memory budget exceeded: {_mib(self.job_bytes)} of images"
+                f" > {_mib(self.max_job_bytes)}"
+            )
+
+    def spill_store(self) -> MutableMapping[Any, bytes]:
+        """中間データの置き場所。bounded でなければ通常の dict。"""
+        if not self.bounded:
+            return {}
+        store = SpillStore(self.spill_memory_bytes, self.spill_dir, prefix="export-spill-")
+        self._stores.append(store)
+        return store
+
+    def close(self) -> None:
+        for store in self._stores:
+            store.close()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "bounded": self.bounded,
+            "startRssBytes": self.start_rss,
+            "peakRssBytes": self.peak_rss,
+            "jobBytes": self.job_bytes,
+            "spilledBytes": sum(s.spilled_bytes for s in self._stores),
+        }
+
+
+class MemoryPolicy:
+    """エクスポートのメモリ節約モードと上限の設定。
+
+    mode: "auto"（項目数が min_items 以上のレポートだけ）/ "on" / "off"。
+    メモリ節約モードでは、可視出力は描画し終えたら手放し、ラスタライズ済み/エンコード済みの画像と
+    PPTX に埋め込む画像は SpillStore（一定量を超えたら一時ファイル）に置く。
+    max_rss_bytes / max_job_bytes（0 は無制限）はモードに関わらず適用し、超えたジョブは失敗させる。
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        min_items: int = 500,
+        max_rss_bytes: int = 0,
+        max_job_bytes: int = 0,
+        spill_memory_bytes: int = 8 << 20,
+        spill_dir: str | None = None,
+        window: int = 8,
+    ):
+        if mode not in ("auto", "on", "off"):
+            raise ValueError(f"unknown memory mode: {mode}")
+        self.mode = mode
+        self.min_items = max(0, int(min_items))
+        self.max_rss_bytes = max(0, int(max_rss_bytes))
+        self.max_job_bytes = max(0, int(max_job_bytes))
+        self.spill_memory_bytes = max(0, int(spill_memory_bytes))
+        self.spill_dir = spill_dir
+        self.window = max(1, int(window))
+
+    @classmethod
+    def from_env(cls) -> "MemoryPolicy":
+        mode = os.getenv("EXPORT_MEMORY_BOUNDED", "auto").strip().lower()
+        aliases = {"1": "on", "true": "on", "yes": "on", "0": "off", "false": "off", "no": "off"}
+        mode = aliases.get(mode, mode)
+        return cls(
+            mode,
+            int(os.getenv("EXPORT_MEMORY_BOUNDED_MIN_ITEMS", "500")),
+            int(os.getenv("EXPORT_MAX_RSS_BYTES", "0")),
+            int(os.getenv("EXPORT_MAX_JOB_BYTES", "0")),
+            int(os.getenv("EXPORT_SPILL_MEMORY_BYTES", str(8 << 20))),
+            os.getenv("EXPORT_SPILL_DIR") or None,
+            int(os.getenv("EXPORT_SPILL_WINDOW", "8")),
+        )
+
+    def bounded_for(self, items: int) -> bool:
+        if self.mode == "auto":
+            return items >= self.min_items
+        return self.mode == "on"
+
+    def tracker(self, items: int) -> JobMemory:
+        return JobMemory(
+            self.bounded_for(items),
+            self.max_rss_bytes,
+            self.max_job_bytes,
+            self.spill_memory_bytes,
+            self.spill_dir,
+            self.window,
+        )
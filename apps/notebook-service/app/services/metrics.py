@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Prometheus テキスト形式（0.0.4）で出力する最小限のメトリクス。prometheus_client には依存しない。
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# collect コールバックの戻り値: (ラベル値の dict, 値) の列
+Samples = Iterable[Tuple[Dict[str, Any], float]]
+
+_local = threading.local()
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _labels(pairs: Sequence[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _record(kind: str, name: str, labels: Dict[str, Any], value: float) -> None:
+    # capture は入れ子にできる（内側で記録した値は外側にも入る）
+    for samples in getattr(_local, "stack", ()):
+        samples.append((kind, name, dict(labels), value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Callable[[], Samples] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # スクレイプ時に値を求めるコールバック（キャッシュの統計など、他で数えている値）
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _lines(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            pairs = list(zip(self.labelnames, key, strict=True))
+            lines.append(f"{self.name}{_labels(pairs)} {_fmt(value)}")
+        if self.collect is not None:
+            for labels, value in self.collect():
+                if value is None:
+                    continue
+                pairs = [(n, labels[n]) for n in self.labelnames]
+                lines.append(f"{self.name}{_labels(pairs)} {_fmt(value)}")
+        return lines
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        body = self._lines()
+        return head + "".join(line + "\n" for line in body)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        _record("c", self.name, labels, amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            rec = self._values.get(key)
+            if rec is None:
+                rec = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                rec[0][i] += 1
+            rec[1] += value
+            rec[2] += 1
+        _record("h", self.name, labels, value)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _lines(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            pairs = list(zip(self.labelnames, key, strict=True))
+            acc = 0
+            for bound, n in zip(self.buckets, counts, strict=True):
+                acc += n
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _fmt(bound))])} {acc}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name: str) -> _Metric | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(m.render() for m in metrics)
+
+
+REGISTRY = Registry()
+
+# パイプラインの段階毎の所要時間。stage: parse / validate / rasterize / layout / serialize、
+# detail: 解析モード、MIME タイプ、出力形式など
+STAGE_SECONDS: Histogram = REGISTRY.register(  # type: ignore[assignment]
+    Histogram(
+        "notebook_stage_duration_seconds",
+        "Duration of notebook parse/export pipeline stages.",
+        ("stage", "detail"),
+    )
+)
+# 受信したノートブック/リクエストと、生成した成果物のバイト数
+BYTES: Counter = REGISTRY.register(  # type: ignore[assignment]
+    Counter("notebook_bytes_total", "Bytes received and produced.", ("direction", "kind"))
+)
+
+
+@contextmanager
+def capture() -> Iterator[List[tuple]]:
+    """このスレッドで記録したカウンタ/ヒストグラムの観測値を集める。
+
+    プロセスプールのワーカーで集めたものを親プロセスに返し、replay で親のレジストリに反映する。
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    samples: List[tuple] = []
+    stack.append(samples)
+    try:
+        yield samples
+    finally:
+        # 同一スレッド内では入れ子なので、最後に積んだものを外す（空リスト同士は == で区別できない）
+        stack.pop()
+
+
+def replay(samples: Iterable[tuple], registry: Registry = REGISTRY) -> None:
+    for kind, name, labels, value in samples:
+        metric = registry.get(name)
+        if kind == "c" and isinstance(metric, Counter):
+            metric.inc(value, **labels)
+        elif kind == "h" and isinstance(metric, Histogram):
+            metric.observe(value, **labels)
+
+
+def stage_timings(samples: Iterable[tuple]) -> Dict[str, float]:
+    """capture で集めた STAGE_SECONDS の観測値を "stage:detail" 毎の合計秒数にまとめる。"""
+    timings: Dict[str, float] = {}
+    for kind, name, labels, value in samples:
+        if kind == "h" and name == STAGE_SECONDS.name:
+            key = f"{labels['stage']}:{labels['detail']}"
+            timings[key] = timings.get(key, 0.0) + value
+    return {k: round(v, 6) for k, v in timings.items()}
+
+
+def rss_bytes(pid: int | None = None) -> int | None:
+    """プロセスの常駐メモリ（Linux の /proc を読む。取得できなければ None）。"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
@@ -1,12 +1,41 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-import json
+
 import base64
+import json
+import logging
+import os
+import random
 import uuid
+from typing import IO, Any, Dict, Iterator, List, Literal
+
 import nbformat
 from nbformat import NotebookNode
-from ..schemas import ParsedCell, NBOutput
 
+from ..schemas import NBOutput, ParsedCell
+from .blob_store import LocalBlobStore
+from .metrics import STAGE_SECONDS
+
+# orjson があれば高速パスの JSON デコードに使う
+try:  # pragma: no cover - import 可否は環境依存
+    import orjson as _orjson  # type: ignore
+except Exception:  # pragma: no cover
+    _orjson = None
+
+# ijson は任意依存。無い環境ではストリーミング解析を json.load にフォールバックする。
+try:  # pragma: no cover - import 可否は環境依存
+    import ijson as _ijson  # type: ignore
+except Exception:  # pragma: no cover
+    _ijson = None
+
+
+logger = logging.getLogger(__name__)
+
+ParseMode = Literal["fast", "strict"]
+
+# fast: JSON を直接走査（nbformat の検証なし）/ strict: nbformat.reads で検証・正規化してから走査
+PARSE_MODE: str = os.getenv("PARSE_MODE", "fast")
+# fast モードで nbformat の検証を行うリクエストの割合（0.0〜1.0、結果はログのみ）
+PARSE_VALIDATE_SAMPLE_RATE = float(os.getenv("PARSE_VALIDATE_SAMPLE_RATE", "0"))
 
 SUPPORTED_MIMES = {
     "text/plain",
@@ -16,12 +45,50 @@ SUPPORTED_MIMES = {
 }
 
 
-def _to_nb_outputs(cell: NotebookNode) -> List[NBOutput]:
+def _join(value: Any) -> Any:
+    # 生の JSON では複数行文字列が行のリストで保存される（nbformat の rejoin_lines 相当）
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return "".join(value)
+    return value
+
+
+def _dumps(value: Any) -> bytes:
+    if _orjson is not None:
+        return _orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _offload(mime: str, value: Any, blobs: LocalBlobStore | None) -> Any:
+    """大きな画像/図の出力を Blob ストアへ退避し {"$ref": sha256} に置き換える。
+
+    PNG はデコード後のバイト列、SVG は UTF-8、Plotly は JSON を保存する。
+    """
+    if blobs is None:
+        return value
+    if mime == "image/png" and isinstance(value, str):
+        if len(value) < blobs.ref_min_bytes:
+            return value
+        try:
+            raw = base64.b64decode(value)
+        except Exception:
+            return value
+    elif mime == "image/svg+xml" and isinstance(value, str):
+        raw = value.encode("utf-8")
+    elif mime == "application/vnd.plotly.v1+json" and isinstance(value, dict):
+        raw = _dumps(value)
+    else:
+        return value
+    if len(raw) < blobs.ref_min_bytes:
+        return value
+    return {"$ref": blobs.put(raw)}
+
+
+def _to_nb_outputs(cell: NotebookNode, blobs: LocalBlobStore | None = None) -> List[NBOutput]:
     outs: List[NBOutput] = []
     for out in cell.get("outputs", []) or []:
         output_type = out.get("output_type") or "stream"
         if output_type == "stream":
-            text = out.get("text")
+            text = _join(out.get("text"))
             if text:
                 outs.append(NBOutput(output_type="stream", text=text))
             continue
@@ -33,23 +100,80 @@ def _to_nb_outputs(cell: NotebookNode) -> List[NBOutput]:
                     continue
                 if mime == "image/png" and isinstance(value, (bytes, bytearray)):
                     b64 = base64.b64encode(value).decode("ascii")
-                    payload[mime] = b64
+                    payload[mime] = _offload(mime, b64, blobs)
+                elif mime == "application/vnd.plotly.v1+json":
+                    payload[mime] = _offload(mime, value, blobs)
                 else:
-                    payload[mime] = value
+                    payload[mime] = _offload(mime, _join(value), blobs)
             if payload:
                 outs.append(NBOutput(output_type=output_type, data=payload))
         else:
-            text = out.get("text")
+            text = _join(out.get("text"))
             if text:
                 outs.append(NBOutput(output_type="stream", text=text))
     return outs
 
 
-def parse_ipynb_bytes(content: bytes, notebook_name: str) -> List[ParsedCell]:
+def _loads(content: bytes) -> Any:
+    if _orjson is not None:
+        return _orjson.loads(content)
+    return json.loads(content.decode("utf-8"))
+
+
+def _sample_validate(data: dict, notebook_name: str) -> None:
+    if PARSE_VALIDATE_SAMPLE_RATE <= 0 or random.random() >= PARSE_VALIDATE_SAMPLE_RATE:
+        return
+    try:
+        with STAGE_SECONDS.time(stage="validate", detail="sample"):
+            nbformat.validate(data)
+    except Exception as e:
+        logger.warning("notebook %s failed nbformat validation: %s", notebook_name, e)
+
+
+def _parse_fast(
+    content: bytes, notebook_name: str, blobs: LocalBlobStore | None = None
+) -> List[ParsedCell] | None:
+    """nbformat を通さずに v4 ノートブックを直接走査する。v4 以外（要変換）は None を返す。"""
+    data = _loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("notebook must be a JSON object")
+    if data.get("nbformat", 4) != 4:
+        return None
+    _sample_validate(data, notebook_name)
+    cells: List[ParsedCell] = []
+    for idx, cell in enumerate(data.get("cells") or []):
+        if not isinstance(cell, dict):
+            continue
+        parsed = _to_parsed_cell(idx, cell, notebook_name, blobs)
+        if parsed is not None:
+            cells.append(parsed)
+    return cells
+
+
+def parse_ipynb_bytes(
+    content: bytes,
+    notebook_name: str,
+    mode: ParseMode | None = None,
+    blobs: LocalBlobStore | None = None,
+) -> List[ParsedCell]:
+    # blobs を渡すと大きな出力は Blob ストアへ退避され {"$ref": sha256} で返る
+    mode = mode or PARSE_MODE
+    with STAGE_SECONDS.time(stage="parse", detail=mode):
+        return _parse_ipynb_bytes(content, notebook_name, mode, blobs)
+
+
+def _parse_ipynb_bytes(
+    content: bytes, notebook_name: str, mode: str, blobs: LocalBlobStore | None
+) -> List[ParsedCell]:
+    if mode == "fast":
+        fast = _parse_fast(content, notebook_name, blobs)
+        if fast is not None:
+            return fast
     # nbformatの厳密なバリデーションに失敗する素朴なノートブック（テスト生成など）にも対応するため、
     # 失敗時は素直なJSONパースにフォールバックする。
     try:
-        nb = nbformat.reads(content.decode("utf-8"), as_version=4)
+        with STAGE_SECONDS.time(stage="validate", detail="strict"):
+            nb = nbformat.reads(content.decode("utf-8"), as_version=4)
     except Exception:
         data = json.loads(content.decode("utf-8"))
         class _NB:  # 最低限の属性だけを持つ擬似オブジェクト
@@ -58,14 +182,50 @@ def parse_ipynb_bytes(content: bytes, notebook_name: str) -> List[ParsedCell]:
         nb = _NB(data)
     cells: List[ParsedCell] = []
     for idx, cell in enumerate(nb.cells):
-        # nbformat.NotebookNode / dict の両対応
-        cell_type = getattr(cell, "cell_type", None) if not isinstance(cell, dict) else cell.get("cell_type")
-        if cell_type not in ("markdown", "code"):
-            continue
-        source = (cell.get("source", "") if isinstance(cell, dict) else getattr(cell, "source", ""))
-        outputs = _to_nb_outputs(cell) if cell_type == "code" else []
-        origin = {"notebookName": notebook_name, "cellIndex": idx}
-        cells.append(
-            ParsedCell(id=uuid.uuid4().hex, index=idx, cell_type=cell_type, source=source, outputs=outputs, origin=origin)
-        )
+        parsed = _to_parsed_cell(idx, cell, notebook_name, blobs)
+        if parsed is not None:
+            cells.append(parsed)
     return cells
+
+
+def _to_parsed_cell(
+    idx: int, cell: Any, notebook_name: str, blobs: LocalBlobStore | None = None
+) -> ParsedCell | None:
+    # nbformat.NotebookNode / dict の両対応
+    if isinstance(cell, dict):
+        cell_type = cell.get("cell_type")
+    else:
+        cell_type = getattr(cell, "cell_type", None)
+    if cell_type not in ("markdown", "code"):
+        return None
+    source = (cell.get("source", "") if isinstance(cell, dict) else getattr(cell, "source", ""))
+    outputs = _to_nb_outputs(cell, blobs) if cell_type == "code" else []
+    origin = {"notebookName": notebook_name, "cellIndex": idx}
+    return ParsedCell(
+        id=uuid.uuid4().hex,
+        index=idx,
+        cell_type=cell_type,
+        source=_join(source),
+        outputs=outputs,
+        origin=origin,
+    )
+
+
+def iter_ipynb_cells(
+    fp: IO[bytes], notebook_name: str, blobs: LocalBlobStore | None = None
+) -> Iterator[ParsedCell]:
+    """ファイルオブジェクトからセルを 1 つずつ読み出して返す（ストリーミング解析）。
+
+    ノートブック全体を読み込まず cells 配列の要素を逐次パースするため、メモリ使用量は
+    最大のセル 1 つ分に抑えられる。nbformat による検証は行わない。
+    """
+    if _ijson is not None:
+        cells: Any = _ijson.items(fp, "cells.item", use_float=True)
+    else:
+        cells = json.load(fp).get("cells", [])
+    for idx, cell in enumerate(cells):
+        if not isinstance(cell, dict):
+            continue
+        parsed = _to_parsed_cell(idx, cell, notebook_name, blobs)
+        if parsed is not None:
+            yield parsed
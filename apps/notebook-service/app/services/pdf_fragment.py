@@ -0,0 +1,205 @@
+"""項目 1 件分の PDF 描画命令（フラグメント）の記録と再生。
+
+エンコード済みの画像を XObject として直接登録するには reportlab の非公開属性
+（Canvas._doc / _code / _formsinuse, PDFImageXObject._filters）が必要になる。
+動作を確認したバージョン（TESTED_VERSIONS）で必要な属性がある場合だけそれを使い、
+それ以外は公開 API の drawImage に切り替える（画像を復号して毎回ダイジェストを求めるので遅いが、
+XObject の共有と結果は同じ）。
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import zlib
+from io import BytesIO
+from typing import Any, Callable, Dict, List
+
+import orjson
+import reportlab
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
+from reportlab.pdfgen import canvas as pdfcanvas
+
+logger = logging.getLogger(__name__)
+
+TESTED_VERSIONS = ("4.", "5.")
+_PRIVATE_CANVAS_API = ("_doc", "_code", "_formsinuse")
+_PRIVATE_DOC_API = ("idToObject", "getXObjectName", "Reference", "addForm")
+
+
+def _fast_path_supported() -> bool:
+    version = getattr(reportlab, "Version", "")
+    if not version.startswith(TESTED_VERSIONS):
+        logger.warning(
+            "reportlab %s is untested; drawing images with the public drawImage API", version
+        )
+        return False
+    c = pdfcanvas.Canvas(BytesIO())
+    doc = getattr(c, "_doc", None)
+    missing = [name for name in _PRIVATE_CANVAS_API if not hasattr(c, name)]
+    missing += [name for name in _PRIVATE_DOC_API if not hasattr(doc, name)]
+    if not hasattr(PDFImageXObject("probe"), "_filters"):
+        missing.append("PDFImageXObject._filters")
+    if missing:
+        logger.warning(
+            "reportlab %s lacks %s; drawing images with the public drawImage API", version, missing
+        )
+        return False
+    return True
+
+
+# エンコード済みの画像をそのまま XObject にできるか（False なら公開 API で描画する）
+FAST_PATH = _fast_path_supported()
+
+
+class PdfRecorder:
+    """Canvas の代わりに渡し、項目 1 件分の描画命令をページ毎に記録する。
+
+    本文の描画で使う setFont / drawString と画像配置だけを持つ。記録結果（fragment）は JSON 化でき、
+    replay_fragment で実際の Canvas に再生する。画像は内容アドレス（sha256）で参照する。
+    """
+
+    def __init__(self) -> None:
+        self._fontname = "Helvetica"
+        self._fontsize = 12.0
+        self.pages: List[List[list]] = [[]]
+        self.images: Dict[str, bytes] = {}
+
+    def setFont(self, name: str, size: float) -> None:
+        self._fontname, self._fontsize = name, size
+        self.pages[-1].append(["F", name, size])
+
+    def drawString(self, x: float, y: float, text: str) -> None:
+        self.pages[-1].append(["T", x, y, text])
+
+    def image(self, data: bytes, x: float, y: float, w: float, h: float) -> None:
+        sha = hashlib.sha256(data).hexdigest()
+        self.images[sha] = data
+        self.pages[-1].append(["I", sha, x, y, w, h])
+
+    def new_page(self) -> None:
+        self.pages.append([])
+        # ページを跨いでもフォントは引き継ぐ
+        # （Canvas は showPage 後に既定フォントへ戻るため明示する）
+        self.pages[-1].append(["F", self._fontname, self._fontsize])
+
+    def fragment(self) -> Dict[str, Any]:
+        return {"pages": self.pages, "media": sorted(self.images)}
+
+
+def encode_pdf_image(data: bytes) -> bytes:
+    """PNG/JPEG を PDF の画像 XObject 用にエンコードする（ヘッダ JSON + 改行 + ストリーム列）。
+
+    JPEG はそのまま DCTDecode で、それ以外は画素列を zlib 圧縮する
+    （reportlab 既定の ASCII85 は使わない）。
+    アルファチャンネルはソフトマスクとして別ストリームにする。
+    """
+    with Image.open(BytesIO(data)) as im:
+        w, h = im.size
+        if im.format == "JPEG" and im.mode in ("RGB", "L"):
+            cs = "DeviceRGB" if im.mode == "RGB" else "DeviceGray"
+            streams = [data]
+            filters = ["DCTDecode"]
+        else:
+            alpha = None
+            if im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info):
+                rgba = im.convert("RGBA")
+                alpha = rgba.getchannel("A")
+                if alpha.getextrema()[0] == 255:
+                    alpha = None
+                base = rgba.convert("RGB")
+            elif im.mode in ("L", "1"):
+                base = im.convert("L")
+            else:
+                base = im.convert("RGB")
+            cs = "DeviceGray" if base.mode == "L" else "DeviceRGB"
+            streams = [zlib.compress(base.tobytes())]
+            if alpha is not None:
+                streams.append(zlib.compress(alpha.tobytes()))
+            filters = ["FlateDecode"]
+    header = {"w": w, "h": h, "cs": cs, "f": filters, "n": [len(s) for s in streams]}
+    return orjson.dumps(header) + b"\n" + b"".join(streams)
+
+
+def _xobject(
+    name: str, w: int, h: int, cs: str, filters: List[str], stream: bytes
+) -> PDFImageXObject:
+    obj = PDFImageXObject(name)
+    obj.width, obj.height = w, h
+    obj.bitsPerComponent = 8
+    obj.colorSpace = cs
+    obj._filters = tuple(filters)
+    obj.streamContent = stream
+    obj.mask = None
+    return obj
+
+
+def decode_pdf_image(encoded: bytes) -> Image.Image:
+    """encode_pdf_image の結果を画像に戻す（公開 API で描画する場合に使う）。"""
+    head, _, body = encoded.partition(b"\n")
+    header = orjson.loads(head)
+    sizes = header["n"]
+    if header["f"] == ["DCTDecode"]:
+        return Image.open(BytesIO(body))
+    size = (header["w"], header["h"])
+    mode = "L" if header["cs"] == "DeviceGray" else "RGB"
+    im = Image.frombytes(mode, size, zlib.decompress(body[: sizes[0]]))
+    if len(sizes) > 1:
+        im = im.convert("RGBA")
+        im.putalpha(Image.frombytes("L", size, zlib.decompress(body[sizes[0]:])))
+    return im
+
+
+def draw_pdf_image(
+    c: pdfcanvas.Canvas, sha: str, encoded: bytes, x: float, y: float, w: float, h: float
+) -> None:
+    """encode_pdf_image の結果を配置する。同じ画像は文書内で 1 つの XObject を共有する。"""
+    if not FAST_PATH:
+        c.drawImage(ImageReader(decode_pdf_image(encoded)), x, y, w, h, mask="auto")
+        return
+    doc = c._doc
+    name = f"img{sha[:32]}"
+    reg = doc.getXObjectName(name)
+    if doc.idToObject.get(reg) is None:
+        head, _, body = encoded.partition(b"\n")
+        header = orjson.loads(head)
+        sizes = header["n"]
+        obj = _xobject(name, header["w"], header["h"], header["cs"], header["f"], body[: sizes[0]])
+        if len(sizes) > 1:
+            smask = _xobject(
+                f"{name}a", header["w"], header["h"], "DeviceGray", ["FlateDecode"], body[sizes[0]:]
+            )
+            smask._decode = [0, 1]
+            obj.smask = doc.Reference(smask, doc.getXObjectName(smask.name))
+        doc.Reference(obj, reg)
+        doc.addForm(name, obj)
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.translate(x, y)
+    c.scale(w, h)
+    c._code.append(f"/{reg} Do")
+    c.restoreState()
+    c._formsinuse.append(name)
+
+
+def replay_fragment(
+    c: pdfcanvas.Canvas,
+    fragment: Dict[str, Any],
+    media: Dict[str, bytes],
+    new_page_cb: Callable[[], None],
+) -> None:
+    """記録した描画命令を Canvas に再生する。2 ページ目以降の前で new_page_cb を呼ぶ。"""
+    for i, ops in enumerate(fragment["pages"]):
+        if i:
+            new_page_cb()
+        for op in ops:
+            kind = op[0]
+            if kind == "T":
+                c.drawString(op[1], op[2], op[3])
+            elif kind == "F":
+                c.setFont(op[1], op[2])
+            elif kind == "I":
+                encoded = media.get(op[1])
+                if encoded is not None:
+                    draw_pdf_image(c, op[1], encoded, op[2], op[3], op[4], op[5])
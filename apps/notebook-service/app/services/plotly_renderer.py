@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import plotly.io as pio
+
+
+class RenderError(RuntimeError):
+    pass
+
+
+class RenderTimeout(RenderError):
+    pass
+
+
+def _worker_main(conn) -> None:  # pragma: no cover - 子プロセス内で実行
+    # 起動時に一度描画して Kaleido(Chromium) を温めておく
+    try:
+        pio.to_image({"data": [], "layout": {}}, format="png")
+    except Exception:
+        pass
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            return
+        fig, fmt, opts = msg
+        try:
+            conn.send((True, pio.to_image(fig, format=fmt, **opts)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Slot:
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self.proc = None
+        self.conn = None
+        self.jobs = 0
+
+    def ensure(self) -> None:
+        if self.proc is not None and self.proc.is_alive():
+            return
+        self.close()
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        proc.start()
+        child.close()
+        self.proc, self.conn, self.jobs = proc, parent, 0
+
+    def close(self, kill: bool = False) -> None:
+        if self.conn is not None:
+            try:
+                if not kill:
+                    self.conn.send(None)
+            except OSError:
+                pass
+            self.conn.close()
+        if self.proc is not None:
+            if kill:
+                self.proc.kill()
+            self.proc.join(timeout=5)
+        self.proc, self.conn = None, None
+
+
+class PlotlyRenderer:
+    """Plotly 図を PNG 化する描画器。
+
+    size > 0 の場合は Kaleido を常駐させた子プロセスを size 個保持し、図毎にタイムアウトを
+    適用する（タイムアウトしたプロセスは破棄して作り直す）。size == 0 の場合は
+    呼び出し元プロセスで pio.to_image を呼ぶ。タイムアウトは同じく適用するが、止まった描画は
+    中断できない（スレッドを残して RenderTimeout にする）ので、本番では size >= 1 を使う。
+    """
+
+    def __init__(self, size: int = 0, timeout: float = 60.0, max_jobs_per_process: int = 0):
+        self.size = max(0, int(size))
+        self.timeout = float(timeout)
+        self.max_jobs_per_process = max(0, int(max_jobs_per_process))
+        self._ctx = multiprocessing.get_context("spawn")
+        self._free: "queue.Queue[_Slot]" = queue.Queue()
+        self._slots = [_Slot(self._ctx) for _ in range(self.size)]
+        for slot in self._slots:
+            self._free.put(slot)
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, size: int | None = None) -> "PlotlyRenderer":
+        """環境変数から作る。size を指定すると PLOTLY_RENDERER_POOL_SIZE より優先する。"""
+        if size is None:
+            size = int(os.getenv("PLOTLY_RENDERER_POOL_SIZE", "2"))
+        timeout = float(os.getenv("PLOTLY_RENDER_TIMEOUT", "60"))
+        max_jobs = int(os.getenv("PLOTLY_RENDERER_MAX_JOBS", "0"))
+        return cls(size, timeout, max_jobs)
+
+    def start(self) -> None:
+        """子プロセスを先に起動して温める（未起動でも初回描画時に起動する）。"""
+        with self._start_lock:
+            for slot in self._slots:
+                slot.ensure()
+
+    def render(self, fig: Any, format: str = "png", **opts: Any) -> bytes:
+        if self.size == 0:
+            return self._render_inline(fig, format, opts)
+        slot = self._free.get()
+        try:
+            slot.ensure()
+            slot.conn.send((fig, format, opts))
+            if not slot.conn.poll(self.timeout):
+                slot.close(kill=True)
+                raise RenderTimeout(f"plotly render timed out after {self.timeout}s")
+            ok, value = slot.conn.recv()
+            slot.jobs += 1
+            if self.max_jobs_per_process and slot.jobs >= self.max_jobs_per_process:
+                slot.close()
+            if not ok:
+                raise RenderError(value)
+            return value
+        except (EOFError, OSError) as e:
+            slot.close(kill=True)
+            raise RenderError(f"plotly renderer process died: {e}") from e
+        finally:
+            self._free.put(slot)
+
+    def _render_inline(self, fig: Any, format: str, opts: Dict[str, Any]) -> bytes:
+        result: Dict[str, Any] = {}
+
+        def run() -> None:
+            try:
+                result["value"] = pio.to_image(fig, format=format, **opts)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=run, name="plotly-render", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise RenderTimeout(f"plotly render timed out after {self.timeout}s")
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    def render_batch(self, figs: List[Any], format: str = "png", **opts: Any) -> List[bytes | None]:
+        """複数の図を並列に描画する。失敗/タイムアウトした図は None。"""
+
+        def _one(fig: Any) -> bytes | None:
+            try:
+                return self.render(fig, format=format, **opts)
+            except Exception:
+                return None
+
+        if self.size <= 1 or len(figs) <= 1:
+            return [_one(f) for f in figs]
+        with ThreadPoolExecutor(max_workers=min(self.size, len(figs))) as ex:
+            return list(ex.map(_one, figs))
+
+    def pids(self) -> List[int]:
+        """常駐している描画プロセスの PID。"""
+        return [slot.proc.pid for slot in self._slots if slot.proc is not None and slot.proc.pid]
+
+    def shutdown(self) -> None:
+        for slot in self._slots:
+            slot.close()
@@ -0,0 +1,118 @@
+"""python-pptx の非公開 API を使う処理のアダプター。
+
+共有の画像パートを配置するには python-pptx の非公開メソッドが必要になる。
+動作を確認したバージョン（TESTED_VERSIONS）で必要な属性がある場合だけそれを使い、
+それ以外は公開 API（add_picture。画像毎にパッケージを走査するので遅いが結果は同じ）に切り替える。
+図形ツリーは非公開の shapes._spTree ではなく、公開の slide.element から辿る。
+ImagePart のコンストラクタは引数の順序がバージョンで異なるので、シグネチャを見て並べる。
+画像パートの名前は package.next_image_partname（呼ぶ度に全パートを走査する）ではなく、
+プレゼンテーション毎の連番（ImageParts）で付ける。
+"""
+from __future__ import annotations
+
+import inspect
+import logging
+import re
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+import pptx
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.parts.image import Image as PptxImage
+from pptx.parts.image import ImagePart
+from pptx.shapes.shapetree import SlideShapes
+
+logger = logging.getLogger(__name__)
+
+TESTED_VERSIONS = ("0.6.", "1.0.")
+_PRIVATE_SHAPES_API = ("_add_pic_from_image_part", "_recalculate_extents")
+
+
+def _fast_path_supported() -> bool:
+    version = getattr(pptx, "__version__", "")
+    if not version.startswith(TESTED_VERSIONS):
+        logger.warning("python-pptx %s is untested; using the public add_picture API", version)
+        return False
+    missing = [name for name in _PRIVATE_SHAPES_API if not hasattr(SlideShapes, name)]
+    if missing:
+        logger.warning(
+            "python-pptx %s lacks %s; using the public add_picture API", version, missing
+        )
+        return False
+    return True
+
+
+# 共有の画像パートをそのまま配置できるか（False なら公開 API で配置する）
+FAST_PATH = _fast_path_supported()
+
+
+def _blob_before_package() -> bool:
+    params = list(inspect.signature(ImagePart.__init__).parameters)
+    return params.index("blob") < params.index("package")
+
+
+# 0.6: (partname, content_type, blob, package, filename) / 1.0: (..., package, blob, filename)
+_BLOB_BEFORE_PACKAGE = _blob_before_package()
+
+
+def image_part_args(
+    partname: Any, content_type: str, package: Any, blob: bytes | None, filename: str | None
+) -> Tuple[Any, ...]:
+    """ImagePart（とサブクラス）のコンストラクタに渡す位置引数を、このバージョンの順序で返す。"""
+    if _BLOB_BEFORE_PACKAGE:
+        return partname, content_type, blob, package, filename
+    return partname, content_type, package, blob, filename
+
+
+def new_image_part(package: Any, partname: Any, image: PptxImage) -> ImagePart:
+    """ImagePart.new と同じパートを、名前を指定して作る。"""
+    return ImagePart(
+        *image_part_args(partname, image.content_type, package, image.blob, image.filename)
+    )
+
+
+_IMAGE_PARTNAME = re.compile(r"^/ppt/media/image(\d+)\.")
+
+
+class ImageParts(Dict[str, ImagePart]):
+    """プレゼンテーションで共有する画像パートの索引（キーは画像の内容のハッシュ）。
+
+    新しいパートの名前は、テンプレートにある画像の番号を最初に 1 回だけ調べ、以降は連番で付ける
+    （package.next_image_partname は呼ぶ度に全パートを走査するので、画像数の 2 乗に比例する）。
+    公開 API で配置する場合（FAST_PATH でない）は add_picture もパートを追加するので、
+    番号がぶつからないよう従来どおり走査する。
+    """
+
+    def __init__(self, package: Any):
+        super().__init__()
+        self.package = package
+        self._next: int | None = None
+
+    def next_partname(self, ext: str) -> Any:
+        if not FAST_PATH:
+            return self.package.next_image_partname(ext)
+        if self._next is None:
+            used = [
+                int(m.group(1))
+                for part in self.package.iter_parts()
+                if (m := _IMAGE_PARTNAME.match(str(part.partname)))
+            ]
+            self._next = max(used, default=0) + 1
+        idx, self._next = self._next, self._next + 1
+        return PackURI(f"/ppt/media/image{idx}.{ext}")
+
+
+def shape_tree(slide: Any) -> Any:
+    """スライドの図形ツリー（p:spTree 要素）。"""
+    return slide.element.cSld.spTree
+
+
+def add_picture_part(slide: Any, part: ImagePart, left: int, top: int, width: int) -> None:
+    """画像パート part をスライドに配置する（高さは縦横比から求める）。"""
+    if FAST_PATH:
+        rId = slide.part.relate_to(part, RT.IMAGE)
+        slide.shapes._add_pic_from_image_part(part, rId, left, top, width, None)
+        slide.shapes._recalculate_extents()
+        return
+    slide.shapes.add_picture(BytesIO(part.blob), left, top, width=width)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import base64
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable
+
+from PIL import Image
+
+# CairoSVG はシステム依存ライブラリ (cairo) が必要になるため、
+# 実行環境によっては import に失敗することがある。テストや軽量環境では
+# フォールバック（簡易PNG生成）で代替する。
+try:  # pragma: no cover - import 可否は環境依存
+    import cairosvg as _cairosvg  # type: ignore
+except Exception:  # pragma: no cover
+    _cairosvg = None
+
+
+def decode_png(b64: Any) -> bytes:
+    return base64.b64decode(b64)
+
+
+def svg_to_png(raw: bytes) -> bytes:
+    """SVG を PNG 化する（プロセスプールから呼べるようモジュール関数にしている）。"""
+    if _cairosvg:
+        return _cairosvg.svg2png(bytestring=raw)
+    # フォールバック: 単色の小さなPNGプレースホルダーを生成
+    color = (11, 191, 255, 255)  # #0bf 的な色
+    img = Image.new("RGBA", (100, 50), color)
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def svg_renderer_name() -> str:
+    return "cairosvg" if _cairosvg else "placeholder"
+
+
+class VisualPool:
+    """レイアウト前の可視出力ラスタライズ（SVG→PNG など）を並列実行するワーカープール。
+
+    thread: 同一プロセス内のスレッド（既定）。process: CPU コア数に応じてスケールさせたい場合。
+    workers == 0 の場合は呼び出し元スレッドで順に実行する。
+    """
+
+    def __init__(self, workers: int = 0, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"unknown visual pool kind: {kind}")
+        self.workers = max(0, int(workers))
+        self.kind = kind
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "VisualPool":
+        default = str(min(4, os.cpu_count() or 1))
+        return cls(
+            int(os.getenv("VISUAL_PRERENDER_WORKERS", default)),
+            os.getenv("VISUAL_PRERENDER_EXECUTOR", "thread"),
+        )
+
+    def _get(self) -> Executor | None:
+        if self.workers == 0:
+            return None
+        with self._lock:
+            if self._executor is not None:
+                return self._executor
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="visual"
+                )
+            return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        ex = self._get()
+        if ex is not None:
+            return ex.submit(fn, *args)
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, MutableMapping
+
+from pptx.parts.image import Image as PptxImage
+from pptx.parts.image import ImagePart
+
+from .pptx_compat import image_part_args
+
+
+class SpillStore(MutableMapping[Any, bytes]):
+    """バイト列の dict。メモリ上の合計が max_memory_bytes を超える分は一時ファイルに退避する。
+
+    エクスポート中の中間データ（ラスタライズ済みの可視出力、エンコード済み画像）を保持する。
+    キャッシュではないので追い出しはせず、close（または with の終了）で一時ファイルごと消す。
+    """
+
+    def __init__(
+        self, max_memory_bytes: int = 8 << 20, spill_dir: str | None = None, prefix: str = "spill-"
+    ):
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.spill_dir = spill_dir
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._mem: Dict[Any, bytes] = {}
+        self._mem_bytes = 0
+        # キー -> 退避先のファイルパス
+        self._files: Dict[Any, str] = {}
+        self._dir: str | None = None
+        self._seq = 0
+        # 退避したバイト数の累計（ジョブのメモリ情報に出す）
+        self.spilled_bytes = 0
+
+    def _path(self) -> str:
+        if self._dir is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix=self.prefix, dir=self.spill_dir)
+        self._seq += 1
+        return os.path.join(self._dir, f"{self._seq}.bin")
+
+    def __setitem__(self, key: Any, value: bytes) -> None:
+        value = bytes(value)
+        with self._lock:
+            self._discard(key)
+            if self._mem_bytes + len(value) <= self.max_memory_bytes:
+                self._mem[key] = value
+                self._mem_bytes += len(value)
+                return
+            path = self._path()
+        with open(path, "wb") as f:
+            f.write(value)
+        with self._lock:
+            self._discard(key)
+            self._files[key] = path
+            self.spilled_bytes += len(value)
+
+    def __getitem__(self, key: Any) -> bytes:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                return data
+            path = self._files[key]
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _discard(self, key: Any) -> bool:
+        data = self._mem.pop(key, None)
+        if data is not None:
+            self._mem_bytes -= len(data)
+            return True
+        path = self._files.pop(key, None)
+        if path is None:
+            return False
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return True
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock:
+            if not self._discard(key):
+                raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._mem or key in self._files
+
+    def __iter__(self) -> Iterator[Any]:
+        with self._lock:
+            keys = list(self._mem) + list(self._files)
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return len(self._mem) + len(self._files)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._mem_bytes
+
+    def close(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._files.clear()
+            self._mem_bytes = 0
+            path, self._dir = self._dir, None
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def __enter__(self) -> "SpillStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# SpilledImagePart の中身の SpillStore でのキー
+_PART_SEQ = itertools.count()
+
+
+class SpilledImagePart(ImagePart):
+    """画像の中身を SpillStore に置く ImagePart。
+
+    python-pptx はスライドを保存するまで画像を保持するので、その間は中身を SpillStore に置く。
+    画像の中身は _blob 属性で扱われるので、その読み書きを SpillStore に向ける。
+    """
+
+    def __init__(
+        self,
+        store: MutableMapping[Any, bytes],
+        partname: Any,
+        content_type: str,
+        package: Any,
+        blob: bytes,
+        filename: str | None = None,
+    ):
+        self._spill = store
+        self._spill_key = ("pptx-image", next(_PART_SEQ))
+        # 親クラスには中身を渡さず（一時ファイルに 2 回書かないように）、最後に 1 回だけ置く
+        super().__init__(*image_part_args(partname, content_type, package, None, filename))
+        self._blob = blob
+
+    @property  # type: ignore[override]
+    def _blob(self) -> bytes:
+        return self._spill[self._spill_key]
+
+    @_blob.setter
+    def _blob(self, value: bytes | None) -> None:
+        if value is not None:
+            self._spill[self._spill_key] = value
+
+    @classmethod
+    def from_image(
+        cls, package: Any, partname: Any, image: PptxImage, store: MutableMapping[Any, bytes]
+    ) -> "SpilledImagePart":
+        """ImagePart.new と同じく image から名前 partname のパートを作り、中身は store に置く。"""
+        return cls(store, partname, image.content_type, package, image.blob, image.filename)
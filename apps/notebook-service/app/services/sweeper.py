@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from .blob_store import LocalBlobStore
+from .job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+# {job_id}.pptx / {job_id}.pdf と、プロファイル {job_id}.prof（job_id は uuid4 の hex）
+_ARTIFACT_RE = re.compile(r"^([0-9a-f]{32})\.(pptx|pdf|prof)$")
+# 書き込み途中で残った一時ファイル
+_TMP_RE = re.compile(r"^tmp-.*|.*\.tmp$")
+
+
+class ExportSweeper:
+    """EXPORT_OUT_DIR の成果物を定期的に削除するスイーパー。
+
+    - max_age_seconds: 最終アクセス（ダウンロード時に atime を更新）からの保持期間
+    - max_bytes: 成果物の合計サイズ上限。超えた分は最終アクセスの古い順に削除
+    - tmp_grace_seconds: これより古い一時ファイル（tmp-* / *.tmp）を削除
+    削除した成果物のジョブはジョブストア上で status="expired" にする。
+    サブディレクトリ（.visual-cache など）とドットファイルは対象外。ただしバッチのキャッシュ層
+    （.batch-cache/{batch_id}。バッチの終了時に消える）で tmp_grace_seconds より長く
+    更新のないもの（親プロセスの異常終了で残ったもの）は削除する。
+    blob_store があれば、同じ周期でその保持期間/容量上限も適用する（LocalBlobStore.sweep）。
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        job_store: JobStore | None = None,
+        max_age_seconds: float = 7 * 86400,
+        max_bytes: int = 0,
+        tmp_grace_seconds: float = 3600,
+        interval_seconds: float = 300,
+        blob_store: LocalBlobStore | None = None,
+    ):
+        self.out_dir = out_dir
+        self.job_store = job_store
+        self.blob_store = blob_store
+        self.max_age_seconds = max(0.0, float(max_age_seconds))
+        self.max_bytes = max(0, int(max_bytes))
+        self.tmp_grace_seconds = max(0.0, float(tmp_grace_seconds))
+        self.interval_seconds = max(0.0, float(interval_seconds))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_run_seconds": 0.0,
+            "deleted_files": 0,
+            "deleted_bytes": 0,
+            "deleted_tmp_files": 0,
+            "deleted_batch_caches": 0,
+            "expired_jobs": 0,
+            "errors": 0,
+            "files": 0,
+            "bytes": 0,
+            "deleted_blobs": 0,
+            "deleted_blob_bytes": 0,
+            "blob_files": 0,
+            "blob_bytes": 0,
+        }
+
+    @classmethod
+    def from_env(
+        cls,
+        out_dir: str,
+        job_store: JobStore | None = None,
+        blob_store: LocalBlobStore | None = None,
+    ) -> "ExportSweeper":
+        return cls(
+            out_dir,
+            job_store,
+            max_age_seconds=float(os.getenv("EXPORT_RETENTION_SECONDS", str(7 * 86400))),
+            max_bytes=int(os.getenv("EXPORT_MAX_BYTES", "0")),
+            tmp_grace_seconds=float(os.getenv("EXPORT_TMP_GRACE_SECONDS", "3600")),
+            interval_seconds=float(os.getenv("EXPORT_SWEEP_INTERVAL_SECONDS", "300")),
+            blob_store=blob_store,
+        )
+
+    @staticmethod
+    def touch(path: str) -> None:
+        """ダウンロード時に呼び、LRU 用の最終アクセス時刻を更新する（mtime は変えない）。"""
+        try:
+            st = os.stat(path)
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str, str]], List[Tuple[float, str]]]:
+        artifacts: List[Tuple[float, int, str, str]] = []
+        tmps: List[Tuple[float, str]] = []
+        try:
+            entries = list(os.scandir(self.out_dir))
+        except FileNotFoundError:
+            return artifacts, tmps
+        for e in entries:
+            if e.name.startswith(".") or not e.is_file(follow_symlinks=False):
+                continue
+            try:
+                st = e.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            m = _ARTIFACT_RE.match(e.name)
+            if m:
+                # プロファイルだけが消えてもジョブは期限切れにしない
+                job_id = m.group(1) if m.group(2) != "prof" else ""
+                artifacts.append((max(st.st_atime, st.st_mtime), st.st_size, e.path, job_id))
+            elif _TMP_RE.match(e.name):
+                tmps.append((st.st_mtime, e.path))
+        return artifacts, tmps
+
+    def _sweep_batch_caches(self, now: float) -> int:
+        root = os.path.join(self.out_dir, ".batch-cache")
+        try:
+            entries = [e for e in os.scandir(root) if e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for e in entries:
+            # 書き込みは下位のディレクトリ（visuals / fragments）に入るので、その更新時刻も見る
+            try:
+                mtimes = [e.stat().st_mtime]
+                mtimes += [c.stat().st_mtime for c in os.scandir(e.path)]
+            except FileNotFoundError:
+                continue
+            if now - max(mtimes) >= self.tmp_grace_seconds:
+                shutil.rmtree(e.path, ignore_errors=True)
+                deleted += 1
+        return deleted
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            # 他のワーカーのスイーパーが先に削除した
+            return False
+        except OSError:
+            logger.warning("failed to remove %s", path, exc_info=True)
+            with self._lock:
+                self._stats["errors"] += 1
+            return False
+
+    def _expire_job(self, job_id: str) -> bool:
+        if self.job_store is None:
+            return False
+        job = self.job_store.update(
+            job_id, status="expired", downloadUrl=None, error="export artifact expired"
+        )
+        return job is not None
+
+    def sweep(self) -> Dict[str, Any]:
+        """1 回分の掃除を行い、統計を返す。"""
+        started = time.time()
+        artifacts, tmps = self._scan()
+        deleted_files = deleted_bytes = deleted_tmp = expired = 0
+
+        for mtime, path in tmps:
+            if started - mtime >= self.tmp_grace_seconds and self._remove(path):
+                deleted_tmp += 1
+        deleted_batches = self._sweep_batch_caches(started)
+
+        victims: List[Tuple[float, int, str, str]] = []
+        keep: List[Tuple[float, int, str, str]] = []
+        for a in artifacts:
+            if self.max_age_seconds and started - a[0] >= self.max_age_seconds:
+                victims.append(a)
+            else:
+                keep.append(a)
+        total = sum(a[1] for a in keep)
+        if self.max_bytes and total > self.max_bytes:
+            keep.sort(key=lambda a: a[0])  # 最終アクセスの古い順
+            while keep and total > self.max_bytes:
+                a = keep.pop(0)
+                victims.append(a)
+                total -= a[1]
+
+        for _, size, path, job_id in victims:
+            if self._remove(path):
+                deleted_files += 1
+                deleted_bytes += size
+                if job_id and self._expire_job(job_id):
+                    expired += 1
+        if self.job_store is not None:
+            try:
+                self.job_store.purge_expired()
+            except Exception:
+                logger.warning("failed to purge expired jobs", exc_info=True)
+        blobs: Dict[str, int] | None = None
+        if self.blob_store is not None:
+            try:
+                blobs = self.blob_store.sweep()
+            except Exception:
+                logger.warning("failed to sweep blob store", exc_info=True)
+                with self._lock:
+                    self._stats["errors"] += 1
+
+        with self._lock:
+            s = self._stats
+            s["runs"] += 1
+            s["last_run_at"] = started
+            s["last_run_seconds"] = round(time.time() - started, 6)
+            s["deleted_files"] += deleted_files
+            s["deleted_bytes"] += deleted_bytes
+            s["deleted_tmp_files"] += deleted_tmp
+            s["deleted_batch_caches"] += deleted_batches
+            s["expired_jobs"] += expired
+            s["files"] = len(keep)
+            s["bytes"] = total
+            if blobs is not None:
+                s["deleted_blobs"] += blobs["deleted_files"]
+                s["deleted_blob_bytes"] += blobs["deleted_bytes"]
+                s["blob_files"] = blobs["files"]
+                s["blob_bytes"] = blobs["bytes"]
+            return dict(s)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, max_age_seconds=self.max_age_seconds, max_bytes=self.max_bytes)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("export sweep failed")
+                with self._lock:
+                    self._stats["errors"] += 1
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """バックグラウンドスレッドで定期実行する（interval_seconds=0 なら何もしない）。"""
+        if not self.interval_seconds or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="export-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from pptx import Presentation
+
+_DEFAULT_KEY: Tuple[str, int, int] = ("<default>", 0, 0)
+
+
+class _Entry:
+    def __init__(self, prs: Any, size: int):
+        self.prs = prs
+        self.size = size
+        self.lock = threading.Lock()
+
+
+class TemplateCache:
+    """解析済み PPTX テンプレートのキャッシュ（キー: パス, mtime, サイズ）。
+
+    テンプレートの展開/XML 解析はキャッシュ時の 1 回だけ行い、エクスポート毎には解析済みの
+    Presentation を deepcopy して返す（解析より数倍速く、元のテンプレートは変更されない）。
+    エントリ数とファイルサイズ合計の上限を超えると LRU で追い出す。
+    """
+
+    def __init__(self, max_entries: int = 16, max_bytes: int = 256 << 20):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, int], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "TemplateCache":
+        return cls(
+            int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "16")),
+            int(os.getenv("TEMPLATE_CACHE_MAX_BYTES", str(256 << 20))),
+        )
+
+    def key(self, path: str | None) -> Tuple[str, int, int]:
+        """キャッシュキー（絶対パス, mtime_ns, サイズ）。既定テンプレートは固定のキー。"""
+        if not path:
+            return _DEFAULT_KEY
+        st = os.stat(path)  # 存在しない場合は FileNotFoundError
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def _entry(self, path: str | None) -> _Entry:
+        key = self.key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        prs = Presentation(path) if path else Presentation()
+        entry = _Entry(prs, key[2])
+        with self._lock:
+            if self.max_entries and entry.size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old.size
+                self._entries[key] = entry
+                self._bytes += entry.size
+                while self._entries and (
+                    len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+                ):
+                    _, ev = self._entries.popitem(last=False)
+                    self._bytes -= ev.size
+        return entry
+
+    def load(self, path: str | None) -> Any:
+        """エクスポート用に、独立して変更できる Presentation を返す。"""
+        entry = self._entry(path)
+        with entry.lock:
+            return copy.deepcopy(entry.prs)
+
+    def preflight(self, path: str) -> Dict[str, Any]:
+        """テンプレートを検証し、キャッシュに載せる。エクスポートで使うレイアウトの有無も確認する。"""
+        entry = self._entry(path)
+        prs = entry.prs
+        layouts = len(prs.slide_layouts)
+        errors = []
+        if layouts < 6:
+            errors.append(f"template must have at least 6 slide layouts (has {layouts})")
+        elif not any(ph.placeholder_format.idx == 0 for ph in prs.slide_layouts[0].placeholders):
+            errors.append("slide layout 0 has no title placeholder")
+        return {"valid": not errors, "layouts": layouts, "errors": errors}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
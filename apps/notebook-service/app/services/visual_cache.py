@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict
+
+
+def visual_key(kind: str, payload: Any, params: Dict[str, Any] | None = None) -> str:
+    """可視化出力の内容アドレス（sha256）。payload は dict(JSON) / str / bytes を受け付ける。"""
+    h = hashlib.sha256()
+    h.update(kind.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(params or {}, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    h.update(b"\0")
+    if isinstance(payload, (bytes, bytearray)):
+        h.update(payload)
+    elif isinstance(payload, str):
+        h.update(payload.encode("utf-8"))
+    else:
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        h.update(body.encode("utf-8"))
+    return h.hexdigest()
+
+
+class VisualCache:
+    """ラスタライズ済み画像(PNG)のキャッシュ。メモリ層とディスク層を持ち、どちらもサイズ上限の LRU。
+
+    ディスク層は複数プロセス（process モードのワーカー）で共有される前提で、
+    書き込みは一時ファイル経由の置き換え、参照時に mtime を更新して LRU 順とする。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | None,
+        max_memory_bytes: int = 64 << 20,
+        max_disk_bytes: int = 512 << 20,
+        suffix: str = ".png",
+    ):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir and self.max_disk_bytes:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @classmethod
+    def from_env(cls, out_dir: str) -> "VisualCache":
+        cache_dir = os.getenv("VISUAL_CACHE_DIR") or os.path.join(out_dir, ".visual-cache")
+        mem = int(os.getenv("VISUAL_CACHE_MEMORY_BYTES", str(64 << 20)))
+        disk = int(os.getenv("VISUAL_CACHE_DISK_BYTES", str(512 << 20)))
+        return cls(cache_dir, mem, disk)
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):  # type: ignore[arg-type]
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))  # type: ignore[arg-type]
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[: -len(self.suffix)], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")  # type: ignore[arg-type]
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits_memory += 1
+                return data
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits_disk += 1
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._mem),
+                "memory_bytes": self._mem_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = data
+        self._mem_bytes += len(data)
+        while self._mem_bytes > self.max_memory_bytes and self._mem:
+            _, ev = self._mem.popitem(last=False)
+            self._mem_bytes -= len(ev)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if not self.cache_dir or not self.max_disk_bytes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            return None
+        with self._lock:
+            if key not in self._disk:
+                self._disk_bytes += len(data)
+            self._disk[key] = len(data)
+            self._disk.move_to_end(key)
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.cache_dir or not self.max_disk_bytes or len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
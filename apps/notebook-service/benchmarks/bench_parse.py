@@ -0,0 +1,83 @@
+"""parse_ipynb_bytes の strict(nbformat) / fast(orjson) パスの比較ベンチマーク。
+
+    cd apps/notebook-service
+    python benchmarks/bench_parse.py --cells 400 --png-kb 64 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.parser import parse_ipynb_bytes  # noqa: E402
+
+
+def make_notebook(cells: int, png_kb: int) -> bytes:
+    png = base64.b64encode(os.urandom(png_kb * 1024)).decode("ascii")
+    nb_cells = []
+    for i in range(cells):
+        if i % 2 == 0:
+            nb_cells.append({
+                "id": f"c{i}",
+                "cell_type": "markdown",
+                "metadata": {},
+                "source": [f"# Section {i}\n", "text " * 40],
+            })
+        else:
+            nb_cells.append({
+                "id": f"c{i}",
+                "cell_type": "code",
+                "execution_count": i,
+                "metadata": {},
+                "source": [f"plot({i})\n"],
+                "outputs": [
+                    {
+                        "output_type": "stream",
+                        "name": "stdout",
+                        "text": [f"line {j}\n" for j in range(20)],
+                    },
+                    {
+                        "output_type": "display_data",
+                        "metadata": {},
+                        "data": {"image/png": png, "text/plain": ["<Figure>"]},
+                    },
+                ],
+            })
+    nb = {"cells": nb_cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}
+    return json.dumps(nb).encode("utf-8")
+
+
+def bench(content: bytes, mode: str, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        parse_ipynb_bytes(content, "bench.ipynb", mode)  # type: ignore[arg-type]
+        times.append(time.perf_counter() - t0)
+    return {"mode": mode, "min_s": min(times), "median_s": statistics.median(times)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cells", type=int, default=400)
+    ap.add_argument("--png-kb", type=int, default=64)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    content = make_notebook(args.cells, args.png_kb)
+    strict = bench(content, "strict", args.repeat)
+    fast = bench(content, "fast", args.repeat)
+    print(json.dumps({
+        "notebook_bytes": len(content),
+        "cells": args.cells,
+        "results": [strict, fast],
+        "speedup": strict["median_s"] / fast["median_s"] if fast["median_s"] else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""PDF 本文の折り返しの比較ベンチマーク。
+
+旧: 試行文字列を毎回 stringWidth で測る / 新: linebreak.wrap_text。
+
+旧方式は空白でしか折り返さないため、日本語は文字単位に改めた旧方式（legacy_char）とも比較する。
+
+    cd apps/notebook-service
+    python benchmarks/bench_wrap.py --paragraphs 200 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfbase import pdfmetrics  # noqa: E402
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont  # noqa: E402
+from reportlab.pdfbase.pdfmetrics import stringWidth  # noqa: E402
+
+from app.services.linebreak import wrap_text  # noqa: E402
+
+EN = (
+    "The quick brown fox jumps over the lazy dog "
+    "while the exporter wraps long paragraphs of report text. "
+)
+JA = (
+    "本レポートでは、ノートブックの実行結果を PDF に書き出す際の折り返し処理の性能を測定します。"
+    "日本語の文章には空白がないため、文字単位で改行位置を探す必要があります。"
+)
+
+
+def legacy_wrap(text: str, max_width: float, font_name: str, font_size: float) -> list[str]:
+    lines: list[str] = []
+    for raw_line in str(text or "").splitlines() or [""]:
+        cur = ""
+        for w in raw_line.split(" "):
+            trial = (cur + (" " if cur else "") + w).strip()
+            if stringWidth(trial, font_name, font_size) <= max_width:
+                cur = trial
+            else:
+                if cur:
+                    lines.append(cur)
+                cur = w
+        lines.append(cur)
+    return lines
+
+
+def legacy_char_wrap(text: str, max_width: float, font_name: str, font_size: float) -> list[str]:
+    """旧方式のまま CJK を文字単位で折り返した場合（試行文字列を毎回測る）。"""
+    lines: list[str] = []
+    for raw_line in str(text or "").splitlines() or [""]:
+        cur = ""
+        for ch in raw_line:
+            trial = cur + ch
+            if stringWidth(trial, font_name, font_size) <= max_width:
+                cur = trial
+            else:
+                lines.append(cur)
+                cur = ch
+        lines.append(cur)
+    return lines
+
+
+def bench(fn, text: str, font: str, repeat: int) -> dict:
+    times = []
+    lines = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        lines = len(fn(text, 480.0, font, 11))
+        times.append(time.perf_counter() - t0)
+    return {"median_ms": round(statistics.median(times) * 1000, 2), "lines": lines}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--paragraphs", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    pdfmetrics.registerFont(UnicodeCIDFont("HeiseiKakuGo-W5"))
+    cases = {
+        "english": ("\n".join(EN * 8 for _ in range(args.paragraphs)), "Helvetica"),
+        "japanese": ("\n".join(JA * 4 for _ in range(args.paragraphs)), "HeiseiKakuGo-W5"),
+    }
+    result = {}
+    for name, (text, font) in cases.items():
+        result[name] = {
+            "chars": len(text),
+            "legacy": bench(legacy_wrap, text, font, args.repeat),
+            "linebreak": bench(wrap_text, text, font, args.repeat),
+        }
+        if name == "japanese":
+            result[name]["legacy_char"] = bench(legacy_char_wrap, text, font, args.repeat)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""/parse・/export・状態ポーリングを混ぜた負荷試験（ローカルの uvicorn に対して実行）。
+
+指定した同時実行数で、重み付きの割合（--mix）に従ってリクエストを送り続け、
+エンドポイント毎のスループット、p50/p95/p99 レイテンシ、エラー率と、サーバーのピーク RSS を
+JSON で出力する。
+入力は synth.py で生成する（--preset は suite.py と同じ）。
+
+    cd apps/notebook-service
+    python benchmarks/loadtest.py --workers 2 --concurrency 16 --duration 30
+    python benchmarks/loadtest.py --env EXPORT_EXECUTOR=process --env EXPORT_MAX_WORKERS=4 \
+        --mix parse=1,export=1,poll=4
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --server-pid 12345
+
+--url を省略すると uvicorn を一時ディレクトリ（出力先・blob）で起動し、終了時に停止する。
+RSS はサーバーのプロセスツリー（uvicorn のワーカー、エクスポート/Plotly のワーカープロセスを
+含む）の合計。--url で既存のサーバーを使う場合は --server-pid を指定しない限り /metrics の
+notebook_process_rss_bytes を使う
+（uvicorn のワーカーが複数なら、応答したワーカーの分のみ）。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import PRESETS  # noqa: E402
+from synth import make_notebook, make_report  # noqa: E402
+
+from app.services.metrics import rss_bytes  # noqa: E402
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPS = ("parse", "export", "poll")
+TITLE_PLACEHOLDER = "__LOADTEST_TITLE__"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"parse=5,export=2,poll=3" -> 重みの dict。"""
+    mix: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPS:
+            raise ValueError(
+                f"unknown operation in --mix: {name} (expected one of {', '.join(OPS)})"
+            )
+        mix[name] = float(weight or 1)
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("--mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float | None:
+    """最近傍順位法のパーセンタイル（sorted_values は昇順）。"""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children() -> Dict[int, List[int]]:
+    tree: Dict[int, List[int]] = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # comm に空白や括弧が入り得るので、最後の ")" の後ろを読む
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        tree.setdefault(int(fields[1]), []).append(int(name))
+    return tree
+
+
+def tree_rss(root: int) -> Tuple[int, int] | None:
+    """(プロセスツリーの RSS 合計, プロセス数)。/proc が読めなければ None。"""
+    if rss_bytes(root) is None:
+        return None
+    tree = _children()
+    total, count, stack = 0, 0, [root]
+    while stack:
+        pid = stack.pop()
+        rss = rss_bytes(pid)
+        if rss is not None:
+            total += rss
+            count += 1
+        stack.extend(tree.get(pid, ()))
+    return total, count
+
+
+def _metrics_rss(text: str) -> int | None:
+    total = None
+    for line in text.splitlines():
+        if line.startswith("notebook_process_rss_bytes{"):
+            total = (total or 0) + int(float(line.rsplit(" ", 1)[1]))
+    return total
+
+
+class Server:
+    """負荷試験用に uvicorn を別プロセスで起動する。"""
+
+    def __init__(self, workers: int, env: Dict[str, str], port: int | None = None):
+        self.workers = workers
+        self.port = port or _free_port()
+        self.tmp = tempfile.mkdtemp(prefix="nb-loadtest-")
+        self.env = {
+            **os.environ,
+            "EXPORT_OUT_DIR": os.path.join(self.tmp, "exports"),
+            "BLOB_STORE_DIR": os.path.join(self.tmp, "blobs"),
+            # ワーカー間でジョブの状態を共有しないとポーリングが 404 になる
+            **({"JOB_STORE": "sqlite"} if workers > 1 else {}),
+            **env,
+        }
+        self.proc: subprocess.Popen | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 60.0) -> None:
+        os.makedirs(self.env["EXPORT_OUT_DIR"], exist_ok=True)
+        cmd = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning",
+        ]
+        self.proc = subprocess.Popen(cmd, cwd=SERVICE_DIR, env=self.env)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("uvicorn did not become healthy in time")
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class LoadTest:
+    def __init__(
+        self,
+        url: str,
+        mix: Dict[str, float],
+        concurrency: int,
+        duration: float,
+        max_requests: int,
+        preset: str,
+        export_format: str,
+        unique_exports: bool,
+        seed: int,
+        server_pid: int | None,
+        rss_interval: float,
+        timeout: float,
+    ):
+        self.url = url.rstrip("/")
+        self.ops = [op for op in OPS if mix.get(op, 0) > 0]
+        self.weights = [mix[op] for op in self.ops]
+        self.concurrency = max(1, concurrency)
+        self.duration = duration
+        self.max_requests = max_requests
+        self.export_format = export_format
+        self.unique_exports = unique_exports
+        self.rng = random.Random(seed)
+        self.server_pid = server_pid
+        self.rss_interval = rss_interval
+        self.timeout = timeout
+
+        cfg = PRESETS[preset]["synth"]
+        self.notebook = make_notebook(cfg)
+        report = make_report(cfg, export_format)
+        report["title"] = TITLE_PLACEHOLDER
+        # 本文は 1 回だけ JSON 化し、タイトルだけ差し替える（重複排除に当たらないように）
+        self.export_body = json.dumps(report, ensure_ascii=False).encode("utf-8")
+
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPS}
+        self.statuses: Dict[str, Dict[str, int]] = {op: {} for op in OPS}
+        self.errors: Dict[str, int] = {op: 0 for op in OPS}
+        # 投入したエクスポート: jobId -> 投入時刻。
+        # 完了をポーリングで観測したら完了までの時間を記録する
+        self.pending: Dict[str, float] = {}
+        self.completed: List[float] = []
+        self.failed_jobs = 0
+        self.sent = 0
+        self.peak_rss: int | None = None
+        self.peak_processes = 0
+        self.rss_source = "proc" if server_pid else "metrics"
+
+    def _next_op(self) -> str:
+        op = self.rng.choices(self.ops, self.weights)[0]
+        if op == "poll" and not self.pending:
+            # ポーリング対象がまだない場合はエクスポートを投入する（mix にあれば）
+            return "export" if "export" in self.ops else op
+        return op
+
+    def _record(self, op: str, elapsed: float, status: str, ok: bool) -> None:
+        self.latencies[op].append(elapsed)
+        self.statuses[op][status] = self.statuses[op].get(status, 0) + 1
+        if not ok:
+            self.errors[op] += 1
+
+    async def _request(self, client: httpx.AsyncClient, op: str) -> None:
+        t0 = time.perf_counter()
+        try:
+            if op == "parse":
+                resp = await client.post(
+                    "/parse", files={"file": ("loadtest.ipynb", self.notebook, "application/json")}
+                )
+            elif op == "export":
+                title = f"Load test {self.sent}" if self.unique_exports else "Load test"
+                body = self.export_body.replace(TITLE_PLACEHOLDER.encode(), title.encode())
+                resp = await client.post(
+                    "/export", content=body, headers={"Content-Type": "application/json"}
+                )
+                if resp.status_code == 200:
+                    job = resp.json()
+                    if job["status"] in ("completed", "failed"):
+                        self._finish(job, t0)
+                    else:
+                        self.pending.setdefault(job["jobId"], t0)
+            else:
+                job_id = self.rng.choice(list(self.pending))
+                resp = await client.get(f"/export-jobs/{job_id}")
+                if resp.status_code == 200:
+                    self._finish(resp.json())
+        except httpx.HTTPError as e:
+            self._record(op, time.perf_counter() - t0, type(e).__name__, False)
+            return
+        self._record(op, time.perf_counter() - t0, str(resp.status_code), resp.status_code < 400)
+
+    def _finish(self, job: Dict[str, Any], submitted: float | None = None) -> None:
+        if job["status"] not in ("completed", "failed"):
+            return
+        started = self.pending.pop(job["jobId"], submitted)
+        if started is None:
+            return
+        if job["status"] == "completed":
+            self.completed.append(time.perf_counter() - started)
+        else:
+            self.failed_jobs += 1
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float) -> None:
+        while time.perf_counter() < deadline and (
+            not self.max_requests or self.sent < self.max_requests
+        ):
+            op = self._next_op()
+            if op == "poll" and not self.pending:
+                # ポーリングするジョブが無い（mix が poll のみ）。送っていないので数えずに待つ
+                await asyncio.sleep(0.01)
+                continue
+            self.sent += 1
+            await self._request(client, op)
+
+    async def _sample_rss(self, client: httpx.AsyncClient, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            rss, procs = None, 0
+            if self.server_pid:
+                sample = tree_rss(self.server_pid)
+                if sample is not None:
+                    rss, procs = sample
+            else:
+                try:
+                    resp = await client.get("/metrics")
+                    rss = _metrics_rss(resp.text)
+                except httpx.HTTPError:
+                    pass
+            if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+                self.peak_rss = rss
+                self.peak_processes = procs
+            try:
+                await asyncio.wait_for(stop.wait(), self.rss_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, drain: float) -> Dict[str, Any]:
+        connections = self.concurrency + 1
+        limits = httpx.Limits(
+            max_connections=connections, max_keepalive_connections=connections
+        )
+        async with httpx.AsyncClient(
+            base_url=self.url, limits=limits, timeout=self.timeout
+        ) as client:
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(self._sample_rss(client, stop))
+            started = time.perf_counter()
+            deadline = started + self.duration
+            await asyncio.gather(*(self._worker(client, deadline) for _ in range(self.concurrency)))
+            elapsed = time.perf_counter() - started
+            # 投入済みのエクスポートの完了を待つ
+            # （完了までの時間を測るため。スループットには含めない）
+            drain_deadline = time.perf_counter() + drain
+            while self.pending and time.perf_counter() < drain_deadline:
+                for job_id in list(self.pending):
+                    try:
+                        resp = await client.get(f"/export-jobs/{job_id}")
+                    except httpx.HTTPError:
+                        continue
+                    if resp.status_code == 200:
+                        self._finish(resp.json())
+                await asyncio.sleep(0.2)
+            stop.set()
+            await sampler
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints: Dict[str, Any] = {}
+        total = errors = 0
+        for op in OPS:
+            lat = sorted(self.latencies[op])
+            if not lat:
+                continue
+            total += len(lat)
+            errors += self.errors[op]
+            endpoints[op] = {
+                "requests": len(lat),
+                "throughput_rps": round(len(lat) / elapsed, 2),
+                "errors": self.errors[op],
+                "error_rate": round(self.errors[op] / len(lat), 4),
+                "status": dict(sorted(self.statuses[op].items())),
+                "latency_ms": {
+                    "p50": _ms(percentile(lat, 50)),
+                    "p95": _ms(percentile(lat, 95)),
+                    "p99": _ms(percentile(lat, 99)),
+                    "max": _ms(lat[-1]),
+                    "mean": _ms(sum(lat) / len(lat)),
+                },
+            }
+        done = sorted(self.completed)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else None,
+            "endpoints": endpoints,
+            "exports": {
+                "completed": len(done),
+                "failed": self.failed_jobs,
+                "unfinished": len(self.pending),
+                # 投入からポーリングで完了を観測するまで（ポーリング間隔の分だけ長めに出る）
+                "time_to_complete_ms": {
+                    "p50": _ms(percentile(done, 50)),
+                    "p95": _ms(percentile(done, 95)),
+                    "p99": _ms(percentile(done, 99)),
+                },
+            },
+            "server": {
+                "peak_rss_bytes": self.peak_rss,
+                "peak_rss_mb": round(self.peak_rss / (1 << 20), 1) if self.peak_rss else None,
+                "processes_at_peak": self.peak_processes or None,
+                "rss_source": self.rss_source,
+            },
+        }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="既存のサーバー（省略すると uvicorn を起動する）")
+    ap.add_argument(
+        "--server-pid", type=int, help="--url のサーバーの PID（プロセスツリーの RSS を測る）"
+    )
+    ap.add_argument("--workers", type=int, default=1, help="起動する uvicorn のワーカー数")
+    ap.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE", help="起動するサーバーの環境変数"
+    )
+    ap.add_argument(
+        "--mix", default="parse=4,export=2,poll=4", help="操作の重み（parse / export / poll）"
+    )
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=20.0, help="送信を続ける秒数")
+    ap.add_argument(
+        "--requests", type=int, default=0, help="送信するリクエスト数の上限（0 = 無制限）"
+    )
+    ap.add_argument(
+        "--drain", type=float, default=60.0, help="終了後に未完了のエクスポートを待つ秒数"
+    )
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    ap.add_argument("--format", choices=("pdf", "pptx"), default="pdf")
+    ap.add_argument(
+        "--same-export", action="store_true", help="同じエクスポートを送る（重複排除に当たる）"
+    )
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--rss-interval", type=float, default=0.2)
+    ap.add_argument("--timeout", type=float, default=120.0, help="リクエスト毎のタイムアウト秒数")
+    ap.add_argument("--out", help="結果の JSON の出力先（既定は標準出力）")
+    args = ap.parse_args()
+
+    env: Dict[str, str] = {}
+    for kv in args.env:
+        key, sep, value = kv.partition("=")
+        if not sep:
+            ap.error(f"--env expects KEY=VALUE: {kv}")
+        env[key] = value
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        ap.error(str(e))
+
+    server = None if args.url else Server(args.workers, env)
+    try:
+        if server is not None:
+            server.start()
+        test = LoadTest(
+            args.url or server.url,  # type: ignore[union-attr]
+            mix,
+            args.concurrency,
+            args.duration,
+            args.requests,
+            args.preset,
+            args.format,
+            not args.same_export,
+            args.seed,
+            args.server_pid or (server.proc.pid if server and server.proc else None),
+            args.rss_interval,
+            args.timeout,
+        )
+        result = asyncio.run(test.run(args.drain))
+    finally:
+        if server is not None:
+            server.stop()
+
+    result = {
+        "config": {
+            "url": args.url,
+            "workers": None if args.url else args.workers,
+            "env": env,
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "requests": args.requests,
+            "preset": args.preset,
+            "format": args.format,
+            "uniqueExports": not args.same_export,
+        },
+        **result,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""再現可能なベンチマークスイート（解析・PPTX/PDF 生成・折り返し）。
+
+入力は synth.py で決定的に生成し、キャッシュは毎回空の状態（コールドスタート）で測る。
+結果は環境情報（Python、SVG/Plotly のレンダラー有無、設定）と一緒に JSON で出力し、
+--baseline を指定すると最小値（--stat で変更可）をベースラインと比較して、閾値を超えて
+遅くなったケースがあれば終了コード 1 を返す。最小値は他のプロセスの影響（ノイズ）を受けにくいので
+既定にしている。cairosvg/kaleido が無い環境で測った SVG/Plotly の描画は meta.notCovered と
+生成ケースの notCovered に記録する（プレースホルダーの時間なので本番の描画の退行は検知できない）。
+
+    cd apps/notebook-service
+    python benchmarks/suite.py --preset small --out /tmp/bench.json
+    python benchmarks/suite.py --preset small --update-baseline benchmarks/baseline.json
+    python benchmarks/suite.py --preset small --baseline benchmarks/baseline.json
+
+ベースラインは実行環境に依存するのでリポジトリには含めない
+（benchmarks/baseline.json は .gitignore）。比較する環境（CI と同じ Python、
+cairosvg/kaleido を入れた状態）で --update-baseline で取り、同じマシン・同じプリセットで
+比較すること（環境や設定が異なる場合は警告を出す）。
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.pdfbase import pdfmetrics  # noqa: E402
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont  # noqa: E402
+from synth import SynthConfig, make_notebook, make_report, make_text  # noqa: E402
+
+from app.schemas_export import ExportRequest  # noqa: E402
+from app.services.engine import ExportEngine  # noqa: E402
+from app.services.exporter import Exporter  # noqa: E402
+from app.services.fragment_cache import FragmentCache  # noqa: E402
+from app.services.job_store import MemoryJobStore  # noqa: E402
+from app.services.linebreak import wrap_text  # noqa: E402
+from app.services.parser import parse_ipynb_bytes  # noqa: E402
+from app.services.plotly_renderer import PlotlyRenderer  # noqa: E402
+from app.services.prerender import svg_renderer_name  # noqa: E402
+from app.services.visual_cache import VisualCache  # noqa: E402
+
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "small": {
+        "synth": SynthConfig(markdown=20, png=5, svg=3, plotly=2, japanese=10),
+        "wrap_paragraphs": 100,
+    },
+    "medium": {"synth": SynthConfig(), "wrap_paragraphs": 400},
+    "large": {
+        "synth": SynthConfig(
+            markdown=150, png=40, png_size=(1200, 800), svg=20, plotly=20, japanese=80
+        ),
+        "wrap_paragraphs": 1500,
+    },
+}
+DEFAULT_THRESHOLD = 0.25
+# ケース毎の既定の閾値。1 回が数ミリ秒の短いケースはノイズが大きいので緩める
+CASE_THRESHOLDS: Dict[str, float] = {
+    "parse_fast": 0.5,
+    "parse_strict": 0.5,
+    "wrap_en": 0.4,
+    "wrap_ja": 0.4,
+}
+
+
+def _kaleido_available() -> bool:
+    """Plotly の図を実際に画像にできるか（kaleido が無い/plotly と合わない場合は図が省かれる）。"""
+    try:
+        PlotlyRenderer(0, timeout=60).render({"data": []})
+    except Exception:
+        return False
+    return True
+
+
+def not_covered(env: Dict[str, Any]) -> List[str]:
+    """実際の描画を測れていない段階。
+
+    cairosvg が無いと SVG はプレースホルダーの PNG に、kaleido が無いと Plotly の図は描画されずに
+    省かれるので、その段階の時間（と生成ケースの合計）は本番の描画の費用を含まない。
+    """
+    stages = []
+    if env.get("svgRenderer") != "cairosvg":
+        stages.append("rasterize:image/svg+xml")
+    if not env.get("kaleido"):
+        stages.append("rasterize:application/vnd.plotly.v1+json")
+    return stages
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "svgRenderer": svg_renderer_name(),
+        "kaleido": _kaleido_available(),
+    }
+
+
+def _measure(fn: Callable[[], Any], repeat: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    times: List[float] = []
+    extra: Any = None
+    for _ in range(repeat):
+        # 前の実行のゴミの回収を計測に含めない
+        gc.collect()
+        t0 = time.perf_counter()
+        extra = fn()
+        times.append(time.perf_counter() - t0)
+    result: Dict[str, Any] = {
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "mean_s": round(statistics.fmean(times), 6),
+        "repeat": repeat,
+    }
+    if isinstance(extra, dict):
+        result.update(extra)
+    return result
+
+
+def _export_case(payload: Dict[str, Any]) -> Callable[[], Dict[str, Any]]:
+    req = ExportRequest.model_validate(payload)
+
+    def run() -> Dict[str, Any]:
+        # 毎回新しい出力先・空のキャッシュで測る（前回の実行結果を再利用させない）
+        out_dir = tempfile.mkdtemp(prefix="nb-bench-")
+        try:
+            exp = Exporter(
+                out_dir,
+                engine=ExportEngine("inline"),
+                visual_cache=VisualCache(None, max_memory_bytes=0, max_disk_bytes=0),
+                plotly_renderer=PlotlyRenderer(0),
+                fragment_cache=FragmentCache(None),
+                job_store=MemoryJobStore(),
+                dedup=False,
+            )
+            job = exp.submit_request(req)
+            if job.status != "completed":
+                raise RuntimeError(f"export failed: {job.error}")
+            path = os.path.join(out_dir, os.path.basename(job.downloadUrl or ""))
+            return {"bytes": os.path.getsize(path), "timings": job.timings or {}}
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    return run
+
+
+def build_cases(preset: str) -> Dict[str, Callable[[], Any]]:
+    cfg: SynthConfig = PRESETS[preset]["synth"]
+    paragraphs: int = PRESETS[preset]["wrap_paragraphs"]
+    nb = make_notebook(cfg)
+    pdfmetrics.registerFont(UnicodeCIDFont("HeiseiKakuGo-W5"))
+    text_en = make_text(cfg, "en", paragraphs)
+    text_ja = make_text(cfg, "ja", paragraphs)
+    return {
+        "parse_fast": lambda: (
+            parse_ipynb_bytes(nb, "bench.ipynb", "fast"), {"bytes": len(nb)}
+        )[1],
+        "parse_strict": lambda: (
+            parse_ipynb_bytes(nb, "bench.ipynb", "strict"), {"bytes": len(nb)}
+        )[1],
+        "export_pptx": _export_case(make_report(cfg, "pptx")),
+        "export_pdf_col1": _export_case(make_report(cfg, "pdf", columns=1)),
+        "export_pdf_col2": _export_case(make_report(cfg, "pdf", columns=2)),
+        "wrap_en": lambda: {"lines": len(wrap_text(text_en, 480.0, "Helvetica", 11))},
+        "wrap_ja": lambda: {"lines": len(wrap_text(text_ja, 480.0, "HeiseiKakuGo-W5", 11))},
+    }
+
+
+def run_suite(
+    preset: str, repeat: int, warmup: int, only: List[str] | None = None
+) -> Dict[str, Any]:
+    cfg: SynthConfig = PRESETS[preset]["synth"]
+    cases = build_cases(preset)
+    env = environment()
+    missing = not_covered(env)
+    results: Dict[str, Any] = {}
+    for name, fn in cases.items():
+        if only and name not in only:
+            continue
+        results[name] = _measure(fn, repeat, warmup)
+        if missing and name.startswith("export_"):
+            results[name]["notCovered"] = missing
+    result = {
+        "meta": {
+            **env,
+            "notCovered": missing,
+            "preset": preset,
+            "config": {**cfg.to_dict(), "wrap_paragraphs": PRESETS[preset]["wrap_paragraphs"]},
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    # ベースライン（JSON から読んだもの）と比較できるように、タプルなどを JSON の型に揃える
+    return json.loads(json.dumps(result))
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, stat: str = "min_s"
+) -> tuple[List[str], List[str]]:
+    """(警告, 退行) のメッセージを返す。
+
+    閾値は CASE_THRESHOLDS とベースラインの "thresholds" でケース毎に上書きできる。
+    """
+    warnings: List[str] = []
+    regressions: List[str] = []
+    cur_meta, base_meta = current.get("meta", {}), baseline.get("meta", {})
+    keys = (
+        "python", "implementation", "machine", "cpus", "svgRenderer", "kaleido", "preset", "config"
+    )
+    for key in keys:
+        if cur_meta.get(key) != base_meta.get(key):
+            warnings.append(
+                f"meta.{key} differs: baseline={base_meta.get(key)!r} current={cur_meta.get(key)!r}"
+            )
+    per_case = {**CASE_THRESHOLDS, **(baseline.get("thresholds") or {})}
+    for name, base in (baseline.get("results") or {}).items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        limit = float(per_case.get(name, threshold))
+        ratio = cur[stat] / base[stat] if base.get(stat) else 1.0
+        cur["vs_baseline"] = round(ratio, 3)
+        if ratio > 1.0 + limit:
+            regressions.append(
+                f"{name}: {stat} {cur[stat]:.4f}s vs baseline {base[stat]:.4f}s "
+                f"(+{(ratio - 1) * 100:.0f}% > {limit * 100:.0f}%)"
+            )
+    return warnings, regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--case", action="append", help="実行するケース（複数指定可、既定は全て）")
+    ap.add_argument("--out", help="結果の JSON の出力先（既定は標準出力）")
+    ap.add_argument("--baseline", help="比較するベースラインの JSON")
+    ap.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="許容する増加率（0.25 = 25%%）"
+    )
+    ap.add_argument(
+        "--stat", choices=("min_s", "median_s", "mean_s"), default="min_s", help="比較に使う値"
+    )
+    ap.add_argument("--update-baseline", metavar="PATH", help="結果をベースラインとして保存する")
+    args = ap.parse_args()
+
+    result = run_suite(args.preset, args.repeat, args.warmup, args.case)
+    warnings = [
+        f"{stage} is not covered (no real renderer)" for stage in result["meta"]["notCovered"]
+    ]
+    regressions: List[str] = []
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            ap.error(
+                f"baseline {args.baseline} not found; "
+                "record one on this machine with --update-baseline first"
+            )
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        differs, regressions = compare(result, baseline, args.threshold, args.stat)
+        warnings += differs
+    for msg in warnings:
+        print(f"warning: {msg}", file=sys.stderr)
+    for msg in regressions:
+        print(f"regression: {msg}", file=sys.stderr)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.update_baseline:
+        # 既存のベースラインのケース毎の閾値は引き継ぐ
+        thresholds: Dict[str, Any] = {}
+        if os.path.exists(args.update_baseline):
+            with open(args.update_baseline, encoding="utf-8") as f:
+                thresholds = json.load(f).get("thresholds") or {}
+        with open(args.update_baseline, "w", encoding="utf-8") as f:
+            json.dump({**result, "thresholds": thresholds}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
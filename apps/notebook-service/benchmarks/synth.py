@@ -0,0 +1,180 @@
+"""ベンチマーク用の合成ノートブック / エクスポートリクエストの生成器。
+
+同じ設定とシードからは常に同じバイト列を生成する（結果をベースラインと比較できるように）。
+
+    from synth import SynthConfig, make_notebook, make_report
+    nb_bytes = make_notebook(SynthConfig(markdown=100, png=20, png_size=(800, 600)))
+"""
+from __future__ import annotations
+
+import base64
+import json
+import random
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import Any, Dict, List, Tuple
+
+from PIL import Image
+
+JA_SENTENCES = [
+    "本レポートでは、ノートブックの実行結果を集計し、主要な指標の推移をまとめます。",
+    "売上は前年同期比で増加しており、特に第三四半期の伸びが顕著でした。",
+    "データの欠損値は前処理の段階で補完し、外れ値は四分位範囲に基づいて除外しています。",
+    "「モデルの精度」については、交差検証の平均値（標準偏差を含む）を示します。",
+    "次のグラフは、地域別・製品カテゴリ別の構成比を表しています。",
+]
+EN_WORDS = (
+    "the quick brown fox jumps over lazy dog while exporter wraps long paragraphs of report text "
+    "revenue growth quarter region model accuracy validation baseline metric"
+).split()
+
+
+@dataclass(frozen=True)
+class SynthConfig:
+    """生成するセル/項目の数。各可視出力は 1 つのコードセル（notebook_code 項目）になる。"""
+
+    markdown: int = 40
+    png: int = 10
+    png_size: Tuple[int, int] = (640, 480)
+    svg: int = 5
+    plotly: int = 5
+    japanese: int = 20
+    # 段落 1 つあたりの文の数（英語の段落は語数 = paragraph * 12）
+    paragraph: int = 6
+    seed: int = 1234
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _png(rng: random.Random, size: Tuple[int, int]) -> bytes:
+    # 乱数のブロック模様（実際のグラフ程度に圧縮が効く）
+    w, h = size
+    small = Image.new("RGB", (max(1, w // 16), max(1, h // 16)))
+    small.putdata([
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(small.width * small.height)
+    ])
+    buf = BytesIO()
+    small.resize((w, h), Image.NEAREST).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _svg(rng: random.Random, i: int) -> str:
+    bars = "".join(
+        f'<rect x="{20 + k * 30}" y="{200 - v}" width="20" height="{v}" '
+        f'fill="#{rng.randrange(0xFFFFFF):06x}"/>'
+        for k, v in enumerate(rng.randrange(10, 180) for _ in range(12))
+    )
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="400" height="220">'
+        f'<text x="10" y="15">Figure {i}</text>{bars}</svg>'
+    )
+
+
+def _plotly(rng: random.Random, i: int) -> Dict[str, Any]:
+    xs = list(range(50))
+    return {
+        "data": [
+            {
+                "type": "scatter",
+                "mode": "lines",
+                "name": f"series {s}",
+                "x": xs,
+                "y": [round(rng.gauss(0, 1), 4) for _ in xs],
+            }
+            for s in range(3)
+        ],
+        "layout": {"title": {"text": f"Plotly {i}"}, "width": 640, "height": 400},
+    }
+
+
+def _english(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(EN_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _japanese(rng: random.Random, sentences: int) -> str:
+    return "".join(rng.choice(JA_SENTENCES) for _ in range(sentences))
+
+
+def _cells(cfg: SynthConfig) -> List[Tuple[str, Any]]:
+    """(種類, 内容) の列。種類: markdown / japanese / png / svg / plotly。"""
+    rng = random.Random(cfg.seed)
+    cells: List[Tuple[str, Any]] = []
+    for i in range(cfg.markdown):
+        cells.append(("markdown", f"## Section {i}\n\n{_english(rng, cfg.paragraph * 12)}"))
+    for i in range(cfg.japanese):
+        cells.append(("japanese", f"## 分析 {i}\n\n{_japanese(rng, cfg.paragraph)}"))
+    pngs = [_png(rng, cfg.png_size) for _ in range(min(cfg.png, 4))]
+    for i in range(cfg.png):
+        # 画像の生成コストを抑えるため 4 種類を使い回し、末尾を変えて内容は別物にする
+        cells.append(("png", pngs[i % len(pngs)] + i.to_bytes(4, "big")))
+    for i in range(cfg.svg):
+        cells.append(("svg", _svg(rng, i)))
+    for i in range(cfg.plotly):
+        cells.append(("plotly", _plotly(rng, i)))
+    # 種類が偏らないように混ぜる
+    rng.shuffle(cells)
+    return cells
+
+
+def _outputs(kind: str, value: Any) -> List[Dict[str, Any]]:
+    if kind == "png":
+        data = {"image/png": base64.b64encode(value).decode("ascii"), "text/plain": "<Figure>"}
+    elif kind == "svg":
+        data = {"image/svg+xml": value, "text/plain": "<SVG>"}
+    else:
+        data = {"application/vnd.plotly.v1+json": value, "text/plain": "<Plotly>"}
+    return [{"output_type": "display_data", "metadata": {}, "data": data}]
+
+
+def make_notebook(cfg: SynthConfig) -> bytes:
+    """nbformat v4 の .ipynb（バイト列）。"""
+    nb_cells = []
+    for i, (kind, value) in enumerate(_cells(cfg)):
+        if kind in ("markdown", "japanese"):
+            source = value.splitlines(True)
+            nb_cells.append(
+                {"id": f"c{i}", "cell_type": "markdown", "metadata": {}, "source": source}
+            )
+        else:
+            nb_cells.append({
+                "id": f"c{i}",
+                "cell_type": "code",
+                "execution_count": i,
+                "metadata": {},
+                "source": [f"show_{kind}({i})\n"],
+                "outputs": _outputs(kind, value),
+            })
+    nb = {"cells": nb_cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}
+    return json.dumps(nb, ensure_ascii=False).encode("utf-8")
+
+
+def make_report(cfg: SynthConfig, fmt: str = "pdf", columns: int = 1) -> Dict[str, Any]:
+    """/export に送る ExportRequest の dict。"""
+    content: List[Dict[str, Any]] = []
+    for i, (kind, value) in enumerate(_cells(cfg)):
+        origin = {"notebookName": "synthetic.ipynb", "cellIndex": i}
+        if kind in ("markdown", "japanese"):
+            content.append({"type": "notebook_markdown", "source": value, "origin": origin})
+        else:
+            content.append({
+                "type": "notebook_code",
+                "source": f"show_{kind}({i})",
+                "outputs": _outputs(kind, value),
+                "origin": origin,
+            })
+    return {
+        "title": "Synthetic benchmark report",
+        "format": fmt,
+        "metadata": {"projectId": "bench", "author": "bench", "pdfStyle": {"columns": columns}},
+        "content": content,
+    }
+
+
+def make_text(cfg: SynthConfig, language: str, paragraphs: int) -> str:
+    """折り返しベンチマーク用の本文。"""
+    rng = random.Random(cfg.seed)
+    if language == "ja":
+        return "\n".join(_japanese(rng, cfg.paragraph) for _ in range(paragraphs))
+    return "\n".join(_english(rng, cfg.paragraph * 12) for _ in range(paragraphs))
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# 既存テストはレスポンス直後の完了状態を検証するため、同期実行エンジンを使う
+os.environ.setdefault("EXPORT_EXECUTOR", "inline")
+# Plotly の描画は呼び出し元プロセスで行う（monkeypatch を効かせるため）
+os.environ.setdefault("PLOTLY_RENDERER_POOL_SIZE", "0")
+# /parse?refs=true の退避先はテスト実行毎の一時ディレクトリにする
+os.environ.setdefault("BLOB_STORE_DIR", tempfile.mkdtemp(prefix="blobs-"))
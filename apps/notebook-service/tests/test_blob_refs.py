@@ -0,0 +1,96 @@
+import base64
+import io
+import json
+import os
+
+from fastapi.testclient import TestClient
+from PIL import Image
+from pptx import Presentation
+
+from app.main import app, blob_store
+
+client = TestClient(app)
+
+
+def noisy_png(size=(200, 200)) -> bytes:
+    buf = io.BytesIO()
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def display(data: dict) -> dict:
+    return {"output_type": "display_data", "metadata": {}, "data": data}
+
+
+def make_notebook(png: bytes) -> bytes:
+    big_fig = {"data": [{"y": list(range(20000))}], "layout": {}}
+    nb = {
+        "cells": [
+            {
+                "cell_type": "code",
+                "execution_count": 1,
+                "metadata": {},
+                "source": "plot()",
+                "outputs": [
+                    display({
+                        "image/png": base64.b64encode(png).decode("ascii"),
+                        "text/plain": "<Figure>",
+                    }),
+                    display({"application/vnd.plotly.v1+json": big_fig}),
+                    display({"image/png": "iVBORw0KGgo="}),
+                ],
+            }
+        ],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+    return json.dumps(nb).encode("utf-8")
+
+
+def test_parse_returns_refs_for_large_outputs_and_serves_blobs():
+    png = noisy_png()
+    files = {"file": ("big.ipynb", io.BytesIO(make_notebook(png)), "application/json")}
+    res = client.post("/parse?refs=true", files=files)
+    assert res.status_code == 200
+    outputs = res.json()["cells"][0]["outputs"]
+    png_ref = outputs[0]["data"]["image/png"]["$ref"]
+    fig_ref = outputs[1]["data"]["application/vnd.plotly.v1+json"]["$ref"]
+    assert outputs[0]["data"]["text/plain"] == "<Figure>"
+    assert outputs[2]["data"]["image/png"] == "iVBORw0KGgo="  # 小さい出力はインライン
+
+    blob = client.get(f"/blobs/{png_ref}")
+    assert blob.status_code == 200
+    assert blob.content == png
+    assert blob.headers["content-type"] == "image/png"
+    assert json.loads(client.get(f"/blobs/{fig_ref}").content)["data"][0]["y"][:3] == [0, 1, 2]
+    assert client.get("/blobs/" + "0" * 64).status_code == 404
+    assert client.get("/blobs/not-a-sha").status_code == 404
+
+
+def test_parse_without_refs_inlines_everything():
+    files = {"file": ("big.ipynb", io.BytesIO(make_notebook(noisy_png())), "application/json")}
+    res = client.post("/parse", files=files)
+    data = res.json()["cells"][0]["outputs"][0]["data"]
+    assert isinstance(data["image/png"], str)
+
+
+def test_export_resolves_refs():
+    png = noisy_png((120, 80))
+    sha = blob_store.put(png)
+    payload = {
+        "title": "Ref Report",
+        "content": [
+            {
+                "type": "notebook_code",
+                "source": "plot()",
+                "outputs": [{"output_type": "display_data", "data": {"image/png": {"$ref": sha}}}],
+            },
+        ],
+    }
+    job = client.post("/export", json=payload).json()
+    assert job["status"] == "completed"
+    prs = Presentation(io.BytesIO(client.get(job["downloadUrl"]).content))
+    pictures = [sh for slide in prs.slides for sh in slide.shapes if sh.shape_type == 13]
+    assert len(pictures) == 1
+    assert pictures[0].image.blob == png
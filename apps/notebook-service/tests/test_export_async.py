@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from app.schemas_export import ExportRequest
+from app.services.engine import ExportEngine
+from app.services.exporter import Exporter
+
+
+def wait_for(exporter: Exporter, job_id: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = exporter.get_job(job_id)
+        if job and job.status in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_submit_returns_queued_and_completes_in_background(tmp_path):
+    exp = Exporter(str(tmp_path), engine=ExportEngine("thread", max_workers=1))
+    gate = threading.Event()
+    original = exp.render
+
+    def slow_render(job_id, req):
+        gate.wait(5)
+        return original(job_id, req)
+
+    exp.render = slow_render  # type: ignore[method-assign]
+    try:
+        job = exp.create_job()
+        queued = exp.submit(job.jobId, ExportRequest(title="Async", content=[]))
+        assert queued.status in ("queued", "processing")
+        gate.set()
+        done = wait_for(exp, job.jobId)
+        assert done.status == "completed"
+        assert done.downloadUrl == f"/exports/{job.jobId}.pptx"
+        assert (tmp_path / f"{job.jobId}.pptx").exists()
+    finally:
+        exp.engine.shutdown()
+
+
+def test_background_failure_marks_job_failed(tmp_path):
+    exp = Exporter(str(tmp_path), engine=ExportEngine("thread", max_workers=2))
+    try:
+        job = exp.create_job()
+        req = ExportRequest(title="Broken", content=[], templatePath=str(tmp_path / "missing.pptx"))
+        exp.submit(job.jobId, req)
+        done = wait_for(exp, job.jobId)
+        assert done.status == "failed"
+        assert (done.error or "").startswith("failed:")
+    finally:
+        exp.engine.shutdown()
+
+
+def test_failing_completion_callback_marks_job_failed(tmp_path):
+    exp = Exporter(str(tmp_path), engine=ExportEngine("inline"))
+    original = exp.update_job
+
+    def update_job(job_id, **fields):
+        if fields.get("status") == "completed":
+            raise OSError("job store unavailable")
+        original(job_id, **fields)
+
+    exp.update_job = update_job  # type: ignore[method-assign]
+    job = exp.create_job()
+    exp.submit(job.jobId, ExportRequest(title="Store down", content=[]))
+    done = exp.get_job(job.jobId)
+    assert done.status == "failed"
+    assert "job store unavailable" in (done.error or "")
+
+
+def test_process_engine_recycles_workers(tmp_path):
+    engine = ExportEngine("process", max_workers=1, max_jobs_per_worker=1)
+    exp = Exporter(str(tmp_path), engine=engine)
+    try:
+        ids = []
+        for i in range(2):
+            job = exp.create_job()
+            exp.submit(job.jobId, ExportRequest(title=f"Proc {i}", content=[], format="pdf"))
+            ids.append(job.jobId)
+        for job_id in ids:
+            assert wait_for(exp, job_id, timeout=120).status == "completed"
+            assert (tmp_path / f"{job_id}.pdf").exists()
+
+        # 1 ジョブ毎にワーカーが作り直されるので、続けて実行したジョブの PID は異なる
+        pids = []
+        for _ in range(2):
+            fut = engine.submit(os.getpid, (), lambda: None, pids.append, lambda e: None)
+            fut.result(timeout=120)
+        assert len(pids) == 2
+        assert pids[0] != pids[1] and os.getpid() not in pids
+    finally:
+        exp.engine.shutdown()
+
+
+def test_process_engine_replaces_pool_after_worker_dies(tmp_path):
+    engine = ExportEngine("process", max_workers=1)
+    exp = Exporter(str(tmp_path), engine=engine)
+    try:
+        errors = []
+        # ワーカーを落とすジョブは再実行でも落ちるので失敗になる
+        fut = engine.submit(os._exit, (1,), lambda: None, lambda r: None, errors.append)
+        fut.result(timeout=120)
+        assert len(errors) == 1 and isinstance(errors[0], BrokenProcessPool)
+
+        # プールは作り直され、続くジョブは完了する
+        job = exp.create_job()
+        exp.submit(job.jobId, ExportRequest(title="After crash", content=[], format="pdf"))
+        assert wait_for(exp, job.jobId, timeout=120).status == "completed"
+    finally:
+        exp.engine.shutdown()
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.schemas_export import ExportRequest
+from app.services.engine import ExportEngine
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.job_store import MemoryJobStore
+from app.services.visual_cache import VisualCache
+
+client = TestClient(app)
+
+
+def png_bytes() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (4, 4), (0, 128, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _plotly_item(y):
+    fig = {"data": [{"type": "scatter", "y": y}], "layout": {}}
+    outputs = [{"data": {"application/vnd.plotly.v1+json": fig}}]
+    return {"type": "notebook_code", "source": "fig", "outputs": outputs}
+
+
+def test_batch_renders_shared_figures_once(tmp_path, monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    calls = []
+
+    def fake_to_image(fig, format="png"):
+        calls.append(fig)
+        return png_bytes()
+
+    monkeypatch.setattr(renderer_mod.pio, "to_image", fake_to_image)
+    # 可視出力のキャッシュを使わなくても、バッチ内の共通の図は 1 回だけ描画する
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_memory_bytes=0, max_disk_bytes=0),
+        fragment_cache=FragmentCache(None),
+        job_store=MemoryJobStore(),
+    )
+    reqs = [
+        ExportRequest(
+            title=f"Project {i}", format=fmt, content=[_plotly_item([1, 2, 3]), _plotly_item([i])]
+        )
+        for i, fmt in enumerate(["pdf", "pdf", "pptx"])
+    ]
+    batch = exp.submit_batch(reqs)
+    assert batch.status == "completed"
+    assert batch.counts == {"completed": 3}
+    assert len({j.jobId for j in batch.jobs}) == 3
+    for job in batch.jobs:
+        assert os.path.exists(os.path.join(str(tmp_path), os.path.basename(job.downloadUrl)))
+    # 共通の図はバッチ内で 1 回、個別の図は 1 回ずつ
+    assert len(calls) == 1 + 3
+
+
+def test_batch_endpoint_reports_per_job_status():
+    payload = {
+        "requests": [
+            {
+                "title": "batch-ok",
+                "format": "pdf",
+                "content": [{"type": "text_box", "content": "hi"}],
+            },
+            {"title": "batch-bad", "format": "pptx", "templatePath": "/nonexistent/template.pptx"},
+        ]
+    }
+    r = client.post("/export/batch", json=payload)
+    assert r.status_code == 200
+    batch = r.json()
+    assert batch["status"] == "partial"
+    assert [j["status"] for j in batch["jobs"]] == ["completed", "failed"]
+    again = client.get(f"/export-batches/{batch['batchId']}").json()
+    assert again["counts"] == {"completed": 1, "failed": 1}
+    ok = client.get(f"/export-jobs/{batch['jobs'][0]['jobId']}").json()
+    assert ok["status"] == "completed"
+    assert client.get("/export-batches/missing").status_code == 404
+    # バッチはジョブではない
+    assert client.get(f"/export-jobs/{batch['batchId']}").status_code == 404
+    assert client.get(f"/export-jobs/{batch['batchId']}/events").status_code == 404
+    assert client.post("/export/batch", json={"requests": []}).status_code == 422
+
+
+def _wait(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_batch_jobs_run_and_finish_independently(tmp_path, monkeypatch):
+    # 各リクエストは別々のジョブとして並行に実行され、終わったものから completed になる
+    engine = ExportEngine("thread", max_workers=2)
+    exp = Exporter(str(tmp_path), engine=engine, job_store=MemoryJobStore())
+    gate = threading.Event()
+    render = exp._render
+
+    def slow(job_id, req, *args):
+        if req.title == "slow":
+            assert gate.wait(30)
+        return render(job_id, req, *args)
+
+    monkeypatch.setattr(exp, "_render", slow)
+    content = [{"type": "text_box", "content": "x"}]
+    try:
+        batch = exp.submit_batch([
+            ExportRequest(title=title, format="pdf", content=content) for title in ("slow", "fast")
+        ])
+        slow_id, fast_id = (j.jobId for j in batch.jobs)
+        _wait(lambda: exp.get_job(fast_id).status == "completed")
+        assert exp.get_job(slow_id).status == "processing"
+        assert exp.get_batch(batch.batchId).status == "processing"
+        gate.set()
+        _wait(lambda: exp.get_batch(batch.batchId).status == "completed")
+    finally:
+        gate.set()
+        engine.shutdown()
+    # バッチはジョブストアのジョブとしては見えない
+    assert exp.get_job(batch.batchId) is None
+
+
+def test_batch_cache_is_shared_across_worker_processes_and_removed(tmp_path):
+    engine = ExportEngine("process", max_workers=2)
+    exp = Exporter(str(tmp_path), engine=engine, job_store=MemoryJobStore())
+    content = [{"type": "text_box", "content": "x"}]
+    try:
+        batch = exp.submit_batch([
+            ExportRequest(title=f"Project {i}", format="pdf", content=content) for i in range(3)
+        ])
+        _wait(lambda: exp.get_batch(batch.batchId).status == "completed", timeout=120)
+    finally:
+        engine.shutdown()
+    assert exp.get_batch(batch.batchId).counts == {"completed": 3}
+    # すべてのジョブが終わればバッチのキャッシュ層は消える
+    assert not os.listdir(tmp_path / ".batch-cache")
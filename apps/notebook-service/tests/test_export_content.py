@@ -0,0 +1,107 @@
+import base64
+import io
+import pickle
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from app.schemas_export import ExportRequest
+from app.services import content as content_mod
+from app.services.content import ContentItem, compile_content
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.image_opt import ImageOptimizer
+from app.services.memory import MemoryPolicy
+from app.services.visual_cache import VisualCache
+
+
+def test_compile_precomputes_heading_body_and_visual():
+    items = compile_content([
+        {
+            "type": "notebook_markdown",
+            "source": "intro\n## Results\nbody",
+            "origin": {"notebookName": "a.ipynb", "cellIndex": 3},
+        },
+        {"type": "text_box", "content": "<h1>Summary</h1><p>text</p>"},
+        {"type": "text_box", "content": "<p>first line</p>"},
+        {"type": "notebook_code", "source": "plot()", "outputs": [
+            {"output_type": "stream", "text": "x"},
+            {"data": {"text/plain": "t", "image/svg+xml": "<svg/>", "image/png": "AAAA"}},
+        ]},
+        {"type": "chart", "value": 1},
+    ])
+    md, h1, plain, code, other = items
+    assert (md.heading, md.body, md.origin) == (("Results", 2), "intro\nbody", "a.ipynb#cell-3")
+    assert (h1.heading, h1.body) == (("Summary", 1), "Summarytext")
+    assert (plain.heading, plain.body) == (("first line", 2), "first line")
+    assert code.visual == ("image/png", "AAAA") and code.heading is None and code.body == "plot()"
+    assert other.kind == "other" and other.text == str({"type": "chart", "value": 1})
+    # 変換済みの項目はそのまま、プロセスプールにも渡せる
+    assert compile_content(items) == items
+    assert pickle.loads(pickle.dumps(items)) == items
+    assert not hasattr(md, "__dict__")
+
+
+def test_pdf_export_parses_each_item_once(tmp_path, monkeypatch):
+    calls = []
+    original = content_mod._markdown_heading
+
+    def counting(src):
+        calls.append(src)
+        return original(src)
+
+    monkeypatch.setattr(content_mod, "_markdown_heading", counting)
+    laid_out = []
+    exp = Exporter(str(tmp_path))
+    layout = exp._layout_pdf_item
+    monkeypatch.setattr(
+        exp,
+        "_layout_pdf_item",
+        lambda c, item, *a: (laid_out.append(item), layout(c, item, *a))[1],
+    )
+    content = [
+        {"type": "notebook_markdown", "source": f"# Section {i}\n\nbody {i}"} for i in range(5)
+    ]
+    exp.render("job", ExportRequest(title="Once", format="pdf", content=content))
+    # 見出しの抽出はレイアウト・しおり・目次で共有し、項目毎に 1 回だけ
+    assert len(calls) == len(content)
+    assert all(isinstance(item, ContentItem) for item in laid_out)
+
+
+@pytest.mark.parametrize("bounded", [False, True])
+def test_corrupt_first_visual_falls_back_to_a_later_output(tmp_path, bounded):
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), (0, 128, 255)).save(buf, format="PNG")
+    valid = buf.getvalue()
+    valid_b64 = base64.b64encode(valid).decode("ascii")
+    item = {
+        "type": "notebook_code",
+        "source": "plot()",
+        "outputs": [
+            {"output_type": "display_data", "data": {"image/png": "A"}},
+            {"output_type": "stream", "text": "log"},
+            {"output_type": "display_data", "data": {"image/png": valid_b64}},
+        ],
+    }
+    (compiled,) = compile_content([item])
+    assert compiled.visual == ("image/png", "A")
+    assert [mime for mime, _ in compiled.fallbacks] == ["image/png"]
+
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        fragment_cache=FragmentCache(None),
+        image_optimizer=ImageOptimizer(enabled=False),
+        memory_policy=MemoryPolicy("on" if bounded else "off"),
+    )
+    path, _ = exp.render("job", ExportRequest(title="Fallback", content=[item]))
+    # 先頭の PNG が壊れていても、後続の出力の画像を使う
+    pics = [
+        shape.image.blob
+        for slide in Presentation(path).slides
+        for shape in slide.shapes
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE
+    ]
+    assert pics == [valid]
@@ -0,0 +1,50 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app, exporter
+
+client = TestClient(app)
+
+
+def _payload(title: str):
+    return {
+        "title": title,
+        "format": "pdf",
+        "content": [{"type": "text_box", "text": "hello"}],
+    }
+
+
+def test_identical_requests_share_one_job():
+    before = dict(exporter.dedup_stats)
+    r1 = client.post("/export", json=_payload("dedup-same"))
+    r2 = client.post("/export", json=_payload("dedup-same"))
+    assert r1.status_code == 200 and r2.status_code == 200
+    assert r1.json()["jobId"] == r2.json()["jobId"]
+    stats = client.get("/export-stats").json()["dedup"]
+    assert stats["requests"] - before["requests"] == 2
+    assert stats["hits_completed"] - before["hits_completed"] == 1
+
+
+def test_different_requests_get_different_jobs():
+    r1 = client.post("/export", json=_payload("dedup-a"))
+    r2 = client.post("/export", json=_payload("dedup-b"))
+    assert r1.json()["jobId"] != r2.json()["jobId"]
+
+
+def test_missing_artifact_is_rebuilt():
+    job1 = client.post("/export", json=_payload("dedup-rebuild")).json()
+    os.remove(os.path.join(exporter.out_dir, os.path.basename(job1["downloadUrl"])))
+    job2 = client.post("/export", json=_payload("dedup-rebuild")).json()
+    assert job2["jobId"] != job1["jobId"]
+    assert job2["status"] == "completed"
+    assert client.get(f"/export-jobs/{job1['jobId']}").json()["status"] == "expired"
+
+
+def test_idempotency_key_replays_and_rejects_other_body():
+    headers = {"Idempotency-Key": "dedup-key-1"}
+    r1 = client.post("/export", json=_payload("dedup-key"), headers=headers)
+    r2 = client.post("/export", json=_payload("dedup-key"), headers=headers)
+    assert r1.json()["jobId"] == r2.json()["jobId"]
+    r3 = client.post("/export", json=_payload("dedup-key-other"), headers=headers)
+    assert r3.status_code == 422
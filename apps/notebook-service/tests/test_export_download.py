@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.downloads import RangeNotSatisfiable, parse_range
+
+client = TestClient(app)
+
+
+def _export_pdf(title: str) -> str:
+    content = [{"type": "text_box", "content": "range test"}]
+    payload = {"title": title, "format": "pdf", "content": content}
+    return client.post("/export", json=payload).json()["downloadUrl"]
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=95-200", 100) == (95, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_download_validators_and_conditional_get():
+    url = _export_pdf("download-etag")
+    full = client.get(url)
+    assert full.status_code == 200
+    etag = full.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert full.headers["accept-ranges"] == "bytes"
+    assert "must-revalidate" in full.headers["cache-control"]
+    assert full.headers["content-disposition"].endswith('.pdf"')
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+    r = client.get(url, headers={"If-Modified-Since": full.headers["last-modified"]})
+    assert r.status_code == 304
+    r = client.get(url, headers={"If-None-Match": '"other"'})
+    assert r.status_code == 200 and r.content == full.content
+
+
+def test_download_range_and_if_range():
+    url = _export_pdf("download-range")
+    full = client.get(url)
+    size = len(full.content)
+    r = client.get(url, headers={"Range": "bytes=0-99"})
+    assert r.status_code == 206
+    assert r.content == full.content[:100]
+    assert r.headers["content-range"] == f"bytes 0-99/{size}"
+    r = client.get(url, headers={"Range": "bytes=100-", "If-Range": full.headers["etag"]})
+    assert r.status_code == 206 and r.content == full.content[100:]
+    # 成果物が変わっていれば全体を返す
+    r = client.get(url, headers={"Range": "bytes=100-", "If-Range": '"stale"'})
+    assert r.status_code == 200 and r.content == full.content
+    r = client.get(url, headers={"Range": f"bytes={size}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{size}"
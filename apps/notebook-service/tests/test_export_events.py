@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.schemas_export import ExportRequest
+from app.services.engine import ExportEngine
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.job_store import MemoryJobStore
+
+client = TestClient(app)
+
+
+def _events(text: str):
+    out = []
+    for block in text.strip().split("\n\n"):
+        lines = [line for line in block.splitlines() if not line.startswith(":")]
+        fields = dict(line.split(": ", 1) for line in lines)
+        if fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def _payload(title):
+    items = [{"type": "text_box", "content": f"paragraph {i} " * 40} for i in range(5)]
+    return {"title": title, "format": "pdf", "content": items}
+
+
+def test_completed_job_reports_progress_and_final_state():
+    job = client.post("/export", json=_payload("events-done")).json()
+    progress = client.get(f"/export-jobs/{job['jobId']}").json()["progress"]
+    assert progress["stage"] == "done"
+    assert progress["items"] == progress["itemsTotal"] == 5
+    assert progress["pages"] >= 8
+    assert progress["bytes"] > 0
+
+    r = client.get(f"/export-jobs/{job['jobId']}/events")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert events == [("state", client.get(f"/export-jobs/{job['jobId']}").json())]
+    assert client.get("/export-jobs/missing/events").status_code == 404
+
+
+def test_progress_is_written_while_running(tmp_path):
+    exp = Exporter(
+        str(tmp_path),
+        engine=ExportEngine("thread", 1),
+        job_store=MemoryJobStore(),
+        fragment_cache=FragmentCache(None),
+    )
+    seen = []
+    orig = exp.job_store.update
+
+    def record(job_id, **fields):
+        if "progress" in fields:
+            seen.append(dict(fields["progress"]))
+        return orig(job_id, **fields)
+
+    exp.job_store.update = record
+    gate = threading.Event()
+    orig_prepare = exp._prepare
+    exp._prepare = lambda reqs, *args: (gate.wait(5), orig_prepare(reqs, *args))[1]
+    job = exp.submit_request(ExportRequest(**_payload("events-running")))
+    for _ in range(50):
+        if exp.get_job(job.jobId).progress is not None:
+            break
+        time.sleep(0.02)
+    # 準備（_prepare）で止めているので、進捗は prepare のまま
+    assert exp.get_job(job.jobId).status == "processing"
+    assert exp.get_job(job.jobId).progress == {"stage": "prepare"}
+    gate.set()
+    for _ in range(250):
+        if exp.get_job(job.jobId).status == "completed":
+            break
+        time.sleep(0.02)
+    exp.engine.shutdown()
+    stages = [p["stage"] for p in seen]
+    assert stages[0] == "prepare" and stages[-1] == "done"
+    assert stages.index("layout") < stages.index("write") < stages.index("done")
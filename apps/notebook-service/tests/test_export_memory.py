@@ -0,0 +1,179 @@
+import base64
+import io
+import os
+import zipfile
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.parts.image import Image as PptxImage
+from pptx.parts.image import ImagePart
+from PyPDF2 import PdfReader
+
+from app.schemas_export import ExportRequest
+from app.services.engine import ExportEngine
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.image_opt import optimize_image
+from app.services.job_store import MemoryJobStore
+from app.services.memory import MemoryBudgetExceeded, MemoryPolicy
+from app.services.prerender import VisualPool
+from app.services.spill import SpilledImagePart, SpillStore
+from app.services.visual_cache import VisualCache
+
+
+def png_b64(color, size=(40, 30)) -> str:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def image_item(b64: str) -> dict:
+    output = {"output_type": "display_data", "data": {"image/png": b64}}
+    return {"type": "notebook_code", "source": "show()", "outputs": [output]}
+
+
+def svg_item(i: int) -> dict:
+    svg = f'<svg xmlns="http://www.w3.org/2000/svg" width="40" height="30"><text>{i}</text></svg>'
+    return {
+        "type": "notebook_code", "source": "svg()", "outputs": [{"data": {"image/svg+xml": svg}}]
+    }
+
+
+def _content():
+    items = []
+    for i in range(12):
+        items.append({"type": "notebook_markdown", "source": f"# Section {i}\n\nbody {i}"})
+        items.append(image_item(png_b64((i * 20, 0, 255 - i * 20))))
+        items.append(svg_item(i % 3))
+    return items
+
+
+def _exporter(tmp_path, policy: MemoryPolicy, **kwargs) -> Exporter:
+    return Exporter(
+        str(tmp_path / "out"),
+        visual_cache=VisualCache(None, max_memory_bytes=0, max_disk_bytes=0),
+        fragment_cache=FragmentCache(None),
+        job_store=MemoryJobStore(),
+        memory_policy=policy,
+        **kwargs,
+    )
+
+
+def test_spill_store_keeps_values_beyond_memory_limit_on_disk(tmp_path):
+    store = SpillStore(max_memory_bytes=10, spill_dir=str(tmp_path))
+    store["a"] = b"12345"
+    store["b"] = b"x" * 100
+    assert store.memory_bytes == 5
+    assert store.spilled_bytes == 100
+    assert store["b"] == b"x" * 100 and store.get("missing") is None
+    assert sorted(store) == ["a", "b"] and len(store) == 2
+    store["b"] = b"short"
+    assert store["b"] == b"short" and store.memory_bytes == 10
+    del store["a"]
+    assert "a" not in store
+    store.close()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("fmt", ["pptx", "pdf"])
+def test_bounded_export_matches_default_and_cleans_up(tmp_path, fmt):
+    spill_dir = tmp_path / "spill"
+    content = _content()
+    default = _exporter(tmp_path / "a", MemoryPolicy("off"))
+    path_a, _ = default.render("job", ExportRequest(title="Big", format=fmt, content=content))
+    # メモリ上に置ける量を 0 にして、中間データを全て一時ファイルに退避させる
+    bounded = _exporter(
+        tmp_path / "b", MemoryPolicy("on", spill_memory_bytes=0, spill_dir=str(spill_dir), window=2)
+    )
+    job = bounded.create_job()
+    path_b, _ = bounded.render(job.jobId, ExportRequest(title="Big", format=fmt, content=content))
+
+    memory = bounded.get_job(job.jobId).memory
+    assert memory["bounded"] is True
+    assert memory["spilledBytes"] > 0 and memory["jobBytes"] > 0
+    assert memory["peakRssBytes"] >= memory["startRssBytes"] > 0
+    assert os.listdir(spill_dir) == []
+
+    if fmt == "pptx":
+        with zipfile.ZipFile(path_a) as za, zipfile.ZipFile(path_b) as zb:
+            media_a = sorted(za.read(n) for n in za.namelist() if n.startswith("ppt/media/"))
+            media_b = sorted(zb.read(n) for n in zb.namelist() if n.startswith("ppt/media/"))
+        assert media_b == media_a and len(media_b) >= 12
+    else:
+        assert len(PdfReader(path_b).pages) == len(PdfReader(path_a).pages)
+
+
+def test_auto_mode_bounds_only_large_reports():
+    policy = MemoryPolicy("auto", min_items=10)
+    assert not policy.tracker(9).bounded
+    assert policy.tracker(10).bounded
+
+
+def test_job_over_byte_budget_fails_without_stopping_the_worker(tmp_path):
+    exp = _exporter(tmp_path, MemoryPolicy("off", max_job_bytes=200), engine=ExportEngine("inline"))
+    big = ExportRequest(title="Too big", content=[image_item(png_b64((9, 9, 9), (400, 300)))] * 3)
+    job = exp.submit_request(big)
+    job = exp.get_job(job.jobId)
+    assert job.status == "failed"
+    assert "memory budget exceeded" in job.error
+    assert job.memory["jobBytes"] > 200
+    assert not os.path.exists(os.path.join(exp.out_dir, f"{job.jobId}.pptx"))
+
+    small = exp.submit_request(
+        ExportRequest(title="Small", content=[{"type": "text_box", "content": "ok"}])
+    )
+    assert exp.get_job(small.jobId).status == "completed"
+
+
+def test_rss_budget_stops_the_job(tmp_path):
+    exp = _exporter(tmp_path, MemoryPolicy("on", max_rss_bytes=1))
+    with pytest.raises(MemoryBudgetExceeded):
+        exp.render("job", ExportRequest(title="RSS", format="pdf", content=_content()))
+    assert not os.path.exists(os.path.join(exp.out_dir, "job.pdf"))
+
+
+def test_bounded_export_optimizes_each_distinct_image(tmp_path):
+    # 画像毎に最適化の結果が対応すること（重複排除のキーが SpillStore から読んだ bytes の id だと、
+    # 解放された bytes の id が次の画像で再利用され、別の画像の結果が埋め込まれる）
+    raws = []
+    for i in range(8):
+        img = Image.new("RGB", (1600, 1200), (i * 30, 255 - i * 30, (i * 70) % 256))
+        img.putpixel((i, i), (255, 255, 255))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        raws.append(buf.getvalue())
+    content = [image_item(base64.b64encode(raw).decode("ascii")) for raw in raws]
+    # 最適化を呼び出し元で順に実行し、読んだ bytes がすぐに解放されるようにする
+    exp = _exporter(
+        tmp_path, MemoryPolicy("on", spill_memory_bytes=0, window=3), visual_pool=VisualPool(0)
+    )
+    req = ExportRequest(title="Distinct", format="pptx", content=content)
+    path, _ = exp.render("job", req)
+
+    opts = exp.image_optimizer.options_for("pptx", *exp._visual_box(req))
+    expected = [optimize_image(raw, opts) for raw in raws]
+    # どの画像も縮小される（最適化の結果が元の画像と区別できる）
+    assert all(e != r for e, r in zip(expected, raws, strict=True))
+    embedded = [
+        shape.image.blob
+        for slide in Presentation(path).slides
+        for shape in slide.shapes
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE
+    ]
+    assert embedded == expected
+
+
+def test_spilled_image_part_keeps_its_blob_in_the_store(tmp_path):
+    raw = base64.b64decode(png_b64((1, 2, 3)))
+    prs = Presentation()
+    with SpillStore(max_memory_bytes=0, spill_dir=str(tmp_path)) as store:
+        package = prs.part.package
+        part = SpilledImagePart.from_image(
+            package, package.next_image_partname("png"), PptxImage.from_blob(raw), store
+        )
+        assert isinstance(part, ImagePart) and part.content_type == "image/png"
+        assert part.blob == raw and "_blob" not in part.__dict__
+        # 中身は一時ファイルに 1 回だけ書く
+        assert len(store) == 1 and store.spilled_bytes == len(raw)
@@ -0,0 +1,57 @@
+import io
+
+from PyPDF2 import PdfReader
+
+from app.schemas_export import ExportRequest
+from app.services.exporter import Exporter
+
+# 1x1 の PNG
+PNG_B64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+def test_pdf_renders_content_once_and_fills_toc(tmp_path, monkeypatch):
+    exp = Exporter(str(tmp_path))
+    calls = []
+    original = exp._draw_image_fit
+
+    def counting(c, img_bytes, *args, **kwargs):
+        calls.append(img_bytes)
+        return original(c, img_bytes, *args, **kwargs)
+
+    monkeypatch.setattr(exp, "_draw_image_fit", counting)
+    req = ExportRequest(
+        title="Single Pass",
+        format="pdf",
+        content=[
+            {"type": "notebook_markdown", "source": "# Intro\ntext"},
+            {
+                "type": "notebook_code",
+                "source": "plot()",
+                "outputs": [{"output_type": "display_data", "data": {"image/png": PNG_B64}}],
+            },
+            {"type": "notebook_markdown", "source": "# Method\ntext"},
+        ],
+    )
+    path, _ = exp.render("job", req)
+    assert len(calls) == 1
+
+    reader = PdfReader(io.BytesIO(open(path, "rb").read()))
+    toc_text = reader.pages[1].extract_text()
+    pages = [p.extract_text() for p in reader.pages]
+    intro_page = next(i for i, t in enumerate(pages) if "Intro" in t and i > 1) + 1
+    method_page = next(i for i, t in enumerate(pages) if "Method" in t and i > 1) + 1
+    assert f"Intro ....... {intro_page}" in toc_text
+    assert f"Method ....... {method_page}" in toc_text
+
+
+def test_pdf_toc_spanning_multiple_pages_keeps_page_numbers(tmp_path):
+    exp = Exporter(str(tmp_path))
+    content = [{"type": "notebook_markdown", "source": f"# Heading {i}\nbody"} for i in range(80)]
+    path, _ = exp.render("job-many", ExportRequest(title="Many", format="pdf", content=content))
+    reader = PdfReader(io.BytesIO(open(path, "rb").read()))
+    pages = [p.extract_text() for p in reader.pages]
+    toc = "\n".join(pages[1:4])
+    last_page = next(i for i, t in enumerate(pages) if "Heading 79" in t and "......." not in t) + 1
+    assert f"Heading 79 ....... {last_page}" in toc
@@ -0,0 +1,71 @@
+import io
+
+from fastapi.testclient import TestClient
+from PyPDF2 import PdfReader
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _text_runs(metadata):
+    """metadata で PDF を出力し、(ページ, x, y, フォントサイズ, 文字列) の一覧を返す。"""
+    payload = {
+        "title": "Style Report",
+        "format": "pdf",
+        "metadata": metadata,
+        "content": [
+            {"type": "notebook_markdown", "source": "# Heading\n" + ("Lorem ipsum " * 400)},
+        ],
+    }
+    res = client.post("/export", json=payload)
+    assert res.status_code == 200
+    dl = client.get(res.json()["downloadUrl"])
+    assert dl.status_code == 200
+    runs = []
+    for i, page in enumerate(PdfReader(io.BytesIO(dl.content)).pages):
+        def visit(text, cm, tm, font, size, i=i):
+            if text.strip():
+                runs.append((i, round(cm[4] + tm[4]), round(cm[5] + tm[5]), size, text.strip()))
+        page.extract_text(visitor_text=visit)
+    return runs
+
+
+def _run(runs, prefix):
+    return next(r for r in runs if r[4].startswith(prefix))
+
+
+def test_pdf_style_defaults_when_unset_or_empty():
+    # pdfStyle が無い/null/空でも既定のレイアウト（余白 1 インチ、1 段組み）で出力する
+    default = _text_runs({})
+    assert _run(default, "Style Report")[1:4] == (72, 759, 24.0)
+    assert {r[1] for r in default if r[0] >= 2} == {72}
+    for metadata in ({"pdfStyle": None}, {"pdfStyle": {}}):
+        runs = _text_runs(metadata)
+        assert _run(runs, "Style Report")[1:4] == (72, 759, 24.0)
+        assert len({r[0] for r in runs}) == len({r[0] for r in default})
+
+
+def test_pdf_style_changes_layout():
+    # 段組み: 本文の 2 段目が右半分から始まる（左余白 72 + 段幅 (451 - 16) / 2 + 段間 16）
+    runs = _text_runs({"pdfStyle": {"columns": 2, "columnGap": 16}})
+    assert {r[1] for r in runs if r[0] >= 2} == {72, 306}
+    # 余白: 表題・本文とも左余白の位置から描き、表題は上余白の 3/4 だけ下げる
+    default_title = _run(_text_runs({}), "Style Report")
+    runs = _text_runs({"pdfStyle": {"marginLeft": 144, "marginTop": 144}})
+    title = _run(runs, "Style Report")
+    assert title[1] == 144 and default_title[2] - title[2] == (144 - 72) * 0.75
+    assert {r[1] for r in runs if r[0] >= 2} == {144}
+    # 文字サイズと行送り
+    style = {"titleFontSize": 30, "bodyFontSize": 9, "bodyLeading": 28}
+    runs = _text_runs({"author": "alice", "pdfStyle": style})
+    assert _run(runs, "Style Report")[3] == 30.0
+    author, generated = _run(runs, "Author:"), _run(runs, "Generated:")
+    assert author[3] == generated[3] == 9.0
+    assert author[2] - generated[2] == 28
+
+
+def test_pdf_title_page_shows_project_name():
+    runs = _text_runs({"projectId": "p1", "projectName": "Apollo"})
+    lines = [r[4] for r in runs if r[0] == 0]
+    assert "Project: p1" in lines and "ProjectName: Apollo" in lines
@@ -1,18 +1,20 @@
+import io
+
 from fastapi.testclient import TestClient
-from app.main import app
 
+from app.main import app
 
 client = TestClient(app)
 
 
-def test_export_plotly_failure(monkeypatch):
+def test_export_plotly_failure_uses_placeholder(monkeypatch):
     # Force plotly image export to fail
-    import app.services.exporter as exporter_mod
+    import app.services.plotly_renderer as renderer_mod
 
     def boom(*args, **kwargs):
         raise RuntimeError("kaleido failed")
 
-    monkeypatch.setattr(exporter_mod.pio, "to_image", boom)
+    monkeypatch.setattr(renderer_mod.pio, "to_image", boom)
 
     payload = {
         "title": "Plotly Report",
@@ -33,5 +35,10 @@ def test_export_plotly_failure(monkeypatch):
     res = client.post("/export", json=payload)
     assert res.status_code == 200
     job = res.json()
-    assert job["status"] == "failed"
-    assert "kaleido failed" in (job.get("error") or "")
+    # 描画に失敗した図はプレースホルダー画像で置き換え、エクスポート自体は完了させる
+    assert job["status"] == "completed"
+    from pptx import Presentation
+    dl = client.get(job["downloadUrl"])
+    prs = Presentation(io.BytesIO(dl.content))
+    pictures = [sh for slide in prs.slides for sh in slide.shapes if sh.shape_type == 13]
+    assert len(pictures) == 1
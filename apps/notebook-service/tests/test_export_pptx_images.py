@@ -0,0 +1,77 @@
+import base64
+import io
+import os
+import zipfile
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.package import Package as PptxPackage
+
+from app.schemas_export import ExportRequest
+from app.services import pptx_compat
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.visual_cache import VisualCache
+
+
+def png_b64(color) -> str:
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def image_item(b64: str) -> dict:
+    outputs = [{"output_type": "display_data", "data": {"image/png": b64}}]
+    return {"type": "notebook_code", "source": "show()", "outputs": outputs}
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_identical_images_share_one_part_and_no_temp_files(tmp_path, monkeypatch, fast_path):
+    if not fast_path:
+        # python-pptx の非公開 API が使えない場合は公開 API で同じ結果になる
+        monkeypatch.setattr(pptx_compat, "FAST_PATH", False)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        fragment_cache=FragmentCache(None),
+    )
+    logo = png_b64((255, 0, 0))
+    blue = png_b64((0, 0, 255))
+    content = [image_item(logo), image_item(blue), image_item(logo), image_item(logo)]
+    path, _ = exp.render("job", ExportRequest(title="Logos", content=content))
+
+    assert sorted(os.listdir(tmp_path)) == ["job.pptx"]
+    with zipfile.ZipFile(path) as z:
+        media = [n for n in z.namelist() if n.startswith("ppt/media/")]
+    assert len(media) == 2
+
+    prs = Presentation(path)
+    pics = [sh for slide in prs.slides for sh in slide.shapes if sh.shape_type == 13]
+    assert len(pics) == 4
+    assert pics[0].image.sha1 == pics[2].image.sha1 == pics[3].image.sha1
+    assert pics[0].width == pics[1].width
+
+
+def test_new_image_parts_are_named_without_rescanning_the_package(tmp_path, monkeypatch):
+    calls = []
+    original = PptxPackage.next_image_partname
+
+    def counting(self, ext):
+        calls.append(ext)
+        return original(self, ext)
+
+    # next_image_partname は呼ぶ度に全パートを走査する（画像数の 2 乗に比例する）
+    monkeypatch.setattr(PptxPackage, "next_image_partname", counting)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        fragment_cache=FragmentCache(None),
+    )
+    content = [image_item(png_b64((i, 0, 0))) for i in range(20)]
+    path, _ = exp.render("job", ExportRequest(title="Many", content=content))
+
+    assert calls == []
+    with zipfile.ZipFile(path) as z:
+        media = sorted(n for n in z.namelist() if n.startswith("ppt/media/"))
+    assert media == sorted(f"ppt/media/image{i}.png" for i in range(1, 21))
@@ -0,0 +1,71 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.main import app
+from app.services import exporter as exporter_mod
+
+client = TestClient(app)
+
+
+def _payload(title, **extra):
+    content = [{"type": "text_box", "content": "profile me"}]
+    return {"title": title, "format": "pdf", "content": content, **extra}
+
+
+def test_every_job_reports_stage_timings():
+    job = client.post("/export", json=_payload("timings")).json()
+    timings = client.get(f"/export-jobs/{job['jobId']}").json()["timings"]
+    assert {"layout:pdf", "serialize:pdf", "total"} <= set(timings)
+    assert timings["total"] >= timings["serialize:pdf"] > 0
+    assert job["profileUrl"] is None
+
+
+def test_profile_flag_is_rejected_by_default():
+    r = client.post("/export", json=_payload("flag-default", profile=True))
+    assert r.status_code == 403
+
+
+def test_profile_flag_stores_downloadable_profile(monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_PROFILE_ALLOW_REQUEST", True)
+    job = client.post("/export", json=_payload("profiled", profile=True)).json()
+    assert job["status"] == "completed"
+    assert job["profileUrl"] == f"/exports/{job['jobId']}.prof"
+    r = client.get(job["profileUrl"])
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/octet-stream"
+    assert r.headers["content-disposition"].endswith('.prof"')
+    text = client.get(job["profileUrl"], params={"format": "text"}).text
+    assert "cumulative" in text and "_run_pdf" in text
+
+
+def test_admin_header_requires_token(monkeypatch):
+    r = client.post("/export", json=_payload("header-denied"), headers={"X-Export-Profile": "nope"})
+    assert r.status_code == 403
+    monkeypatch.setattr(main, "EXPORT_PROFILE_TOKEN", "s3cret")
+    headers = {"X-Export-Profile": "s3cret"}
+    job = client.post("/export", json=_payload("header-ok"), headers=headers).json()
+    assert job["profileUrl"]
+    assert client.post("/export", json=_payload("flag-denied", profile=True)).status_code == 403
+
+
+def test_profiled_jobs_run_one_at_a_time(monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_PROFILE_ALLOW_REQUEST", True)
+    job = client.post("/export", json=_payload("profiled-lock", profile=True)).json()
+    assert job["profileUrl"]
+    # 計測が終わればロックは解放されている
+    assert exporter_mod._PROFILE_LOCK.acquire(blocking=False)
+    exporter_mod._PROFILE_LOCK.release()
+    entered = threading.Event()
+    with exporter_mod._PROFILE_LOCK:
+        t = threading.Thread(
+            target=lambda: (
+                client.post("/export", json=_payload("profiled-wait", profile=True)),
+                entered.set(),
+            )
+        )
+        t.start()
+        assert not entered.wait(0.5)
+    t.join(30)
+    assert entered.is_set()
@@ -0,0 +1,108 @@
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app, exporter, sweeper
+from app.schemas_export import ExportJob
+from app.services.blob_store import LocalBlobStore
+from app.services.job_store import MemoryJobStore
+from app.services.sweeper import ExportSweeper
+
+
+def _write(path, size, age):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def test_sweep_age_quota_and_tmp(tmp_path):
+    store = MemoryJobStore()
+    ids = [f"{i:032x}" for i in range(4)]
+    for i in ids:
+        store.create(ExportJob(jobId=i, status="completed", downloadUrl=f"/exports/{i}.pdf"))
+    _write(tmp_path / f"{ids[0]}.pdf", 100, age=10 * 86400)  # 期限切れ
+    _write(tmp_path / f"{ids[1]}.pptx", 100, age=300)  # 容量超過で LRU 削除
+    _write(tmp_path / f"{ids[2]}.pdf", 100, age=200)
+    _write(tmp_path / f"{ids[3]}.pdf", 100, age=100)
+    _write(tmp_path / "tmp-abc.png", 10, age=7200)
+    _write(tmp_path / "fresh.tmp", 10, age=0)
+    os.makedirs(tmp_path / ".visual-cache")
+    _write(tmp_path / ".visual-cache" / "old.png", 10, age=30 * 86400)
+
+    sw = ExportSweeper(
+        str(tmp_path), store, max_age_seconds=7 * 86400, max_bytes=250, tmp_grace_seconds=3600
+    )
+    stats = sw.sweep()
+    left = sorted(os.listdir(tmp_path))
+    assert left == sorted([".visual-cache", f"{ids[2]}.pdf", f"{ids[3]}.pdf", "fresh.tmp"])
+    assert os.path.exists(tmp_path / ".visual-cache" / "old.png")
+    assert stats["deleted_files"] == 2 and stats["deleted_bytes"] == 200
+    assert stats["deleted_tmp_files"] == 1
+    assert stats["expired_jobs"] == 2 and stats["files"] == 2 and stats["bytes"] == 200
+    assert store.get(ids[0]).status == "expired"
+    assert store.get(ids[0]).downloadUrl is None
+    assert store.get(ids[2]).status == "completed"
+
+
+def test_download_of_swept_export_returns_410():
+    client = TestClient(app)
+    content = [{"type": "text_box", "content": "a"}]
+    res = client.post("/export", json={"title": "t", "format": "pdf", "content": content})
+    job = res.json()
+    path = os.path.join(exporter.out_dir, f"{job['jobId']}.pdf")
+    t = time.time() - 30 * 86400
+    os.utime(path, (t, t))
+    old_age = sweeper.max_age_seconds
+    sweeper.max_age_seconds = 7 * 86400
+    try:
+        sweeper.sweep()
+    finally:
+        sweeper.max_age_seconds = old_age
+    assert client.get(f"/export-jobs/{job['jobId']}").json()["status"] == "expired"
+    assert client.get(job["downloadUrl"]).status_code == 410
+    assert client.get("/export-sweeper/stats").json()["runs"] >= 1
+
+
+def test_sweeping_a_profile_keeps_the_job(tmp_path):
+    store = MemoryJobStore()
+    job_id = "f" * 32
+    store.create(ExportJob(jobId=job_id, status="completed", downloadUrl=f"/exports/{job_id}.pdf"))
+    _write(tmp_path / f"{job_id}.pdf", 10, age=0)
+    _write(tmp_path / f"{job_id}.prof", 10, age=10 * 86400)
+    stats = ExportSweeper(str(tmp_path), store, max_age_seconds=7 * 86400).sweep()
+    assert os.listdir(tmp_path) == [f"{job_id}.pdf"]
+    assert stats["deleted_files"] == 1 and stats["expired_jobs"] == 0
+    assert store.get(job_id).status == "completed"
+
+
+def test_sweep_applies_blob_store_retention(tmp_path):
+    blobs = LocalBlobStore(str(tmp_path / "blobs"), max_age_seconds=86400, max_bytes=250)
+    old, lru, recent, fresh = (blobs.put(bytes([i]) * 100) for i in range(4))
+    _write(blobs.path(old), 100, age=2 * 86400)  # 期限切れ
+    _write(blobs.path(lru), 100, age=3000)  # 容量超過で LRU 削除
+    _write(blobs.path(recent), 100, age=2000)
+    _write(blobs.path(fresh), 100, age=1000)
+    assert blobs.get(recent) is not None  # 読み出しで最終アクセスが更新される
+    _write(blobs.path(fresh) + ".abc.tmp", 10, age=7200)
+
+    sw = ExportSweeper(str(tmp_path / "exports"), max_age_seconds=0, blob_store=blobs)
+    stats = sw.sweep()
+    assert [blobs.exists(s) for s in (old, lru, recent, fresh)] == [False, False, True, True]
+    assert not os.path.exists(blobs.path(fresh) + ".abc.tmp")
+    assert stats["deleted_blobs"] == 2 and stats["deleted_blob_bytes"] == 200
+    assert stats["blob_files"] == 2 and stats["blob_bytes"] == 200
+
+
+def test_sweep_removes_stale_batch_caches(tmp_path):
+    stale = tmp_path / ".batch-cache" / "old" / "visuals"
+    active = tmp_path / ".batch-cache" / "new" / "visuals"
+    os.makedirs(stale)
+    os.makedirs(active)
+    t = time.time() - 7200
+    for path in (stale, stale.parent):
+        os.utime(path, (t, t))
+    stats = ExportSweeper(str(tmp_path), tmp_grace_seconds=3600).sweep()
+    assert stats["deleted_batch_caches"] == 1
+    assert os.listdir(tmp_path / ".batch-cache") == ["new"]
@@ -0,0 +1,164 @@
+import io
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from PyPDF2 import PdfReader
+
+from app.schemas_export import ExportRequest
+from app.services import pdf_fragment
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.plotly_renderer import PlotlyRenderer
+from app.services.visual_cache import VisualCache
+
+
+def png_b64(color=(255, 0, 0), mode="RGB", format="PNG") -> str:
+    import base64
+
+    buf = io.BytesIO()
+    Image.new(mode, (40, 30), color).save(buf, format=format)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def content(n=6):
+    items = []
+    for i in range(n):
+        if i % 3 == 2:
+            png = png_b64((i * 40, 0, 0, 128), "RGBA")
+            items.append({
+                "type": "notebook_code",
+                "source": f"plot({i})",
+                "outputs": [{"output_type": "display_data", "data": {"image/png": png}}],
+            })
+        else:
+            source = f"# Section {i}\n" + "body text " * 50
+            items.append({"type": "notebook_markdown", "source": source})
+    return items
+
+
+def texts(path):
+    reader = PdfReader(io.BytesIO(open(path, "rb").read()))
+    return [p.extract_text() for p in reader.pages[2:]]  # 表紙と目次（生成日時を含む）以外
+
+
+def test_pdf_reexport_only_lays_out_changed_items(tmp_path, monkeypatch):
+    exp = Exporter(str(tmp_path))
+    laid_out = []
+    original = exp._layout_pdf_item
+
+    def counting(c, item, *args, **kwargs):
+        laid_out.append(item.raw)
+        return original(c, item, *args, **kwargs)
+
+    monkeypatch.setattr(exp, "_layout_pdf_item", counting)
+    items = content()
+    exp.render("a", ExportRequest(title="R", format="pdf", content=items))
+    assert len(laid_out) == len(items)
+
+    laid_out.clear()
+    edited = list(items)
+    edited[3] = {"type": "notebook_markdown", "source": "# Section 3\nchanged text"}
+    path, _ = exp.render("b", ExportRequest(title="R", format="pdf", content=edited))
+    assert laid_out == [edited[3]]
+
+    # キャッシュなしで生成したものと同じ内容になる
+    fresh = Exporter(str(tmp_path / "fresh"), fragment_cache=FragmentCache(None))
+    fresh_path, _ = fresh.render("b", ExportRequest(title="R", format="pdf", content=edited))
+    assert texts(path) == texts(fresh_path)
+    assert "changed text" in "".join(texts(path))
+
+
+def test_pptx_reexport_replays_cached_slides(tmp_path, monkeypatch):
+    exp = Exporter(str(tmp_path))
+    items = content()
+    exp.render("a", ExportRequest(title="R", content=items))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached item was rendered again")
+
+    monkeypatch.setattr(exp, "_add_image_slide", fail)
+    edited = list(items)
+    edited[0] = {"type": "text_box", "content": "changed"}
+    path, _ = exp.render("b", ExportRequest(title="R", content=edited))
+
+    prs = Presentation(path)
+    slides = list(prs.slides)[1:-1]
+    assert len(slides) == len(items)
+    assert any("changed" in sh.text_frame.text for sh in slides[0].shapes if sh.has_text_frame)
+    pictures = [sh for s in slides for sh in s.shapes if sh.shape_type == 13]
+    assert len(pictures) == 2
+    assert all(Image.open(io.BytesIO(p.image.blob)).size == (40, 30) for p in pictures)
+
+
+def test_placeholder_figures_are_not_cached(tmp_path, monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    calls = []
+
+    def broken(fig, format="png"):
+        calls.append(fig)
+        raise RuntimeError("kaleido crashed")
+
+    monkeypatch.setattr(renderer_mod.pio, "to_image", broken)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        plotly_renderer=PlotlyRenderer(0),
+    )
+    item = {
+        "type": "notebook_code",
+        "source": "fig",
+        "outputs": [{
+            "output_type": "display_data",
+            "data": {"application/vnd.plotly.v1+json": {"data": []}},
+        }],
+    }
+    for job in ("a", "b"):
+        exp.render(job, ExportRequest(title="R", format="pdf", content=[item]))
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("mode,color,format", [
+    ("RGB", (10, 200, 30), "PNG"),
+    ("RGBA", (10, 200, 30, 128), "PNG"),
+    ("L", 77, "PNG"),
+    ("RGB", (10, 200, 30), "JPEG"),
+])
+def test_encoded_pdf_image_decodes_back(mode, color, format):
+    import base64
+
+    raw = base64.b64decode(png_b64(color, mode, format))
+    im = pdf_fragment.decode_pdf_image(pdf_fragment.encode_pdf_image(raw))
+    assert im.size == (40, 30)
+    if format == "PNG":
+        assert im.tobytes() == Image.open(io.BytesIO(raw)).tobytes()
+
+
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_pdf_images_share_one_xobject(tmp_path, monkeypatch, fast_path):
+    # 非公開 API が使えない reportlab でも公開 API（drawImage）で同じ画像を共有する
+    monkeypatch.setattr(pdf_fragment, "FAST_PATH", fast_path)
+    colors = [(255, 0, 0, 128), (0, 0, 255, 255)]
+    items = [
+        {
+            "type": "notebook_code",
+            "source": f"plot({i})",
+            "outputs": [{"data": {"image/png": png_b64(colors[i % 2], "RGBA")}}],
+        }
+        for i in range(6)
+    ]
+    exp = Exporter(str(tmp_path), fragment_cache=FragmentCache(None))
+    path, _ = exp.render("a", ExportRequest(title="R", format="pdf", content=items))
+
+    images = {}
+    for page in PdfReader(path).pages:
+        xobjects = page["/Resources"].get("/XObject") or {}
+        for ref in xobjects.values():
+            obj = ref.get_object()
+            if obj["/Subtype"] == "/Image":
+                images[ref.idnum] = obj
+    assert len(images) == 2
+    assert all(obj["/Width"] == 40 and obj["/Height"] == 30 for obj in images.values())
+    # 半透明の画像だけがソフトマスクを持つ
+    assert sorted("/SMask" in obj for obj in images.values()) == [False, True]
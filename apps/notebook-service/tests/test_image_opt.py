@@ -0,0 +1,89 @@
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+from pptx import Presentation
+
+from app.schemas_export import ExportRequest
+from app.services.exporter import Exporter
+from app.services.image_opt import ImageOptimizer, ImageTooLarge, optimize_image
+from app.services.visual_cache import VisualCache
+
+
+def encode(im: Image.Image, fmt: str = "PNG") -> bytes:
+    buf = io.BytesIO()
+    im.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def chart(size=(4000, 2000)) -> bytes:
+    im = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(im)
+    for i in range(0, size[0], 200):
+        draw.rectangle([i, size[1] // 3, i + 120, size[1]], fill=(31, 119, 180))
+    return encode(im)
+
+
+def photo(size=(600, 400)) -> bytes:
+    return encode(Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)))
+
+
+def opts(**kw):
+    base = ImageOptimizer(dpi={"pptx": 100}).options_for("pptx", 8.0, 6.5)
+    base.update(kw)
+    return base
+
+
+def test_downsamples_to_target_dpi_and_keeps_aspect():
+    out = optimize_image(chart(), opts())
+    im = Image.open(io.BytesIO(out))
+    assert im.format == "PNG"
+    assert im.size == (800, 400)
+
+
+def test_small_images_are_left_untouched():
+    data = chart((400, 200))
+    assert optimize_image(data, opts()) is data
+
+
+def test_pixel_budget_rejects_decompression_bombs():
+    with pytest.raises(ImageTooLarge):
+        optimize_image(chart((3000, 3000)), opts(max_pixels=1_000_000))
+
+
+def test_lossy_recompresses_photos_and_palette_reduces_charts():
+    jpeg = optimize_image(photo(), opts(lossy=True, jpeg_quality=70))
+    assert Image.open(io.BytesIO(jpeg)).format == "JPEG"
+    small_chart = chart((600, 300))
+    # グラフは写真扱いしない（lossy でも JPEG にならない）
+    assert optimize_image(small_chart, opts(lossy=True)) is small_chart
+    im = Image.new("RGB", (600, 300), (255, 255, 255))
+    ImageDraw.Draw(im).ellipse([20, 20, 580, 280], fill=(200, 30, 30), outline=(0, 0, 0))
+    antialiased = encode(im.resize((1200, 600), Image.LANCZOS).resize((600, 300), Image.LANCZOS))
+    pal = optimize_image(antialiased, opts(palette=True))
+    assert Image.open(io.BytesIO(pal)).mode == "P"
+    assert len(pal) < len(antialiased)
+
+
+def test_export_embeds_downsampled_image(tmp_path):
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        image_optimizer=ImageOptimizer(dpi={"pptx": 100, "pdf": 100}),
+    )
+    item = {
+        "type": "notebook_code",
+        "source": "plot()",
+        "outputs": [
+            {
+                "output_type": "display_data",
+                "data": {"image/png": base64.b64encode(chart()).decode("ascii")},
+            }
+        ],
+    }
+    path, _ = exp.render("job", ExportRequest(title="Big", content=[item]))
+    prs = Presentation(path)
+    pics = [sh for slide in prs.slides for sh in slide.shapes if sh.shape_type == 13]
+    assert Image.open(io.BytesIO(pics[0].image.blob)).size == (800, 400)
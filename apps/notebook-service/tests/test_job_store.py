@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.schemas_export import ExportJob, ExportRequest
+from app.services.exporter import Exporter
+from app.services.job_store import JobStore, MemoryJobStore, SqliteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        s = MemoryJobStore(ttl_seconds=60)
+    else:
+        s = SqliteJobStore(str(tmp_path / "jobs.sqlite3"), ttl_seconds=60)
+    yield s
+    s.close()
+
+
+def test_create_get_update_and_status_index(store):
+    store.create(ExportJob(jobId="a", status="queued"), {"title": "T"})
+    store.create(ExportJob(jobId="b", status="queued"))
+    job = store.update("a", status="completed", downloadUrl="/exports/a.pdf")
+    assert job.status == "completed"
+    assert store.get("a").downloadUrl == "/exports/a.pdf"
+    assert store.get_meta("a") == {"title": "T"}
+    assert [j.jobId for j in store.list_by_status("queued")] == ["b"]
+    assert [j.jobId for j in store.list_by_status("completed")] == ["a"]
+    assert store.update("missing", status="failed") is None
+
+
+def test_ttl_expiry(store):
+    store.ttl_seconds = 0.05
+    store.create(ExportJob(jobId="old", status="completed"))
+    time.sleep(0.1)
+    assert store.get("old") is None
+    assert store.get_meta("old") is None
+    assert store.purge_expired() == 1
+
+
+def test_concurrent_updates_are_not_lost(store):
+    store.create(ExportJob(jobId="c", status="queued"), {"n": 0})
+    errors = []
+
+    def worker(i):
+        try:
+            for _ in range(20):
+                store.update("c", error=f"w{i}")
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert store.get("c").error.startswith("w")
+
+
+def test_sqlite_store_is_shared_between_exporters(tmp_path):
+    # 別ワーカー（別 Exporter）でもジョブ状態とダウンロード名用メタデータが見える
+    path = str(tmp_path / "jobs.sqlite3")
+    a = Exporter(str(tmp_path / "out"), job_store=SqliteJobStore(path))
+    b = Exporter(str(tmp_path / "out"), job_store=SqliteJobStore(path))
+    job = a.create_job()
+    content = [{"type": "text_box", "content": "x"}]
+    a.submit(job.jobId, ExportRequest(title="共有", format="pdf", content=content))
+    got = b.get_job(job.jobId)
+    assert got is not None and got.status == "completed"
+    assert b.get_job_meta(job.jobId)["title"] == "共有"
+
+
+def test_claim_binds_alias_until_target_is_dead(store):
+    store.create(ExportJob(jobId="a", status="queued"))
+    store.create(ExportJob(jobId="b", status="queued"))
+    assert store.claim("req:x", "a") == "a"
+    assert store.claim("req:x", "b") == "a"
+    store.update("a", status="failed")
+    assert store.claim("req:x", "b") == "b"
+    store.delete("b")
+    store.create(ExportJob(jobId="c", status="queued"))
+    assert store.claim("req:x", "c") == "c"
+
+
+def test_job_store_is_abstract():
+    with pytest.raises(TypeError):
+        JobStore()
+
+    class Partial(JobStore):
+        def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_sqlite_close_closes_connections_of_all_threads(tmp_path):
+    s = SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    s.create(ExportJob(jobId="a", status="queued"))
+    conns = []
+
+    def worker():
+        s.get("a")
+        conns.append(s._conn())
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    conns.append(s._conn())
+    assert len({id(c) for c in conns}) == 4
+    s.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # 閉じた後も使えば接続し直す
+    assert s.get("a").status == "queued"
+    s.close()
+
+
+def test_batches_are_separate_records(store):
+    store.create(ExportJob(jobId="a", status="queued"))
+    store.create_batch("b1", ["a", "x"])
+    assert store.get_batch("b1") == ["a", "x"]
+    assert store.get("b1") is None
+    assert store.list_by_status("batch") == []
+    assert store.get_batch("missing") is None
+    store.ttl_seconds = 0.05
+    store.create_batch("b2", ["a"])
+    time.sleep(0.1)
+    assert store.get_batch("b2") is None
@@ -0,0 +1,48 @@
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from app.services.linebreak import text_width, wrap_text
+
+
+def _legacy_wrap(text, max_width, font_name="Helvetica", font_size=12):
+    lines = []
+    for raw_line in str(text or "").splitlines() or [""]:
+        cur = ""
+        for w in raw_line.split(" "):
+            trial = (cur + (" " if cur else "") + w).strip()
+            if stringWidth(trial, font_name, font_size) <= max_width:
+                cur = trial
+            else:
+                if cur:
+                    lines.append(cur)
+                cur = w
+        lines.append(cur)
+    return lines
+
+
+def test_english_wrap_matches_previous_behavior():
+    text = (
+        "The quick brown fox jumps over the lazy dog. " * 20
+        + "\n\nsecond  paragraph with  double spaces\n"
+    )
+    for width in (80, 150, 300):
+        assert wrap_text(text, width, "Helvetica", 11) == _legacy_wrap(text, width, "Helvetica", 11)
+
+
+def test_text_width_matches_string_width():
+    s = "Hello, world 12345"
+    assert abs(text_width(s, "Helvetica", 10) - stringWidth(s, "Helvetica", 10)) < 1e-6
+
+
+def test_japanese_breaks_between_characters_with_kinsoku():
+    text = (
+        "本レポートでは、ノートブックの実行結果を書き出します。"
+        "「日本語」の文章には空白がありません。"
+    ) * 3
+    lines = wrap_text(text, 120, "Helvetica", 10)
+    assert len(lines) > 3
+    assert "".join(lines) == text
+    for line in lines:
+        assert line[0] not in "、。」"
+        assert line[-1] != "「"
+        # 禁則で 1 文字はみ出す場合を除き枠に収まる
+        assert text_width(line[:-1], "Helvetica", 10) <= 120
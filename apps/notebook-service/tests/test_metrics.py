@@ -0,0 +1,71 @@
+import io
+import json
+import re
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.metrics import Counter, Gauge, Histogram, Registry, capture, replay
+
+client = TestClient(app)
+
+
+def _value(text: str, sample: str) -> float:
+    m = re.search(rf"^{re.escape(sample)} (\S+)$", text, re.M)
+    assert m, f"{sample} not found"
+    return float(m.group(1))
+
+
+def test_text_exposition_format():
+    reg = Registry()
+    c = reg.register(Counter("t_total", "Things.", ("kind",)))
+    h = reg.register(Histogram("t_seconds", "Time.", ("stage",), buckets=(0.1, 1.0)))
+    reg.register(Gauge("t_gauge", "Gauge.", ("who",), lambda: [({"who": 'a"b'}, 3)]))
+    c.inc(2, kind="x")
+    h.observe(0.05, stage="s")
+    h.observe(0.5, stage="s")
+    h.observe(5, stage="s")
+    text = reg.render()
+    assert "# TYPE t_total counter" in text
+    assert 't_total{kind="x"} 2.0' in text
+    assert 't_seconds_bucket{stage="s",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="s",le="1.0"} 2' in text
+    assert 't_seconds_bucket{stage="s",le="+Inf"} 3' in text
+    assert 't_seconds_count{stage="s"} 3' in text
+    assert 't_gauge{who="a\\"b"} 3.0' in text
+
+
+def test_capture_and_replay():
+    src = Registry()
+    dst = Registry()
+    for reg in (src, dst):
+        reg.register(Counter("r_total", "R.", ("k",)))
+    with capture() as samples:
+        src.get("r_total").inc(4, k="v")
+    replay(samples, dst)
+    assert 'r_total{k="v"} 4.0' in dst.render()
+
+
+def test_metrics_endpoint_reports_pipeline_stages():
+    cells = [{"cell_type": "markdown", "source": "# T"}]
+    nb = {"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 2}
+    files = {"file": ("m.ipynb", io.BytesIO(json.dumps(nb).encode()), "application/json")}
+    assert client.post("/parse", files=files).status_code == 200
+    content = [{"type": "text_box", "content": "metrics"}]
+    payload = {"title": "metrics", "format": "pdf", "content": content}
+    assert client.post("/export", json=payload).status_code == 200
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    stage = "notebook_stage_duration_seconds_count"
+    assert _value(text, stage + '{stage="parse",detail="fast"}') >= 1
+    assert _value(text, stage + '{stage="layout",detail="pdf"}') >= 1
+    assert _value(text, stage + '{stage="serialize",detail="pdf"}') >= 1
+    assert _value(text, 'notebook_bytes_total{direction="in",kind="notebook"}') > 0
+    assert _value(text, 'notebook_bytes_total{direction="out",kind="pdf"}') > 0
+    assert _value(text, 'notebook_export_dedup_total{result="requests"}') >= 1
+    assert 'notebook_cache_requests_total{cache="visual",result="miss"}' in text
+    assert _value(text, 'notebook_export_jobs_inflight{state="running"}') == 0
+    assert re.search(r'^notebook_process_rss_bytes\{role="api",pid="\d+"\} \d', text, re.M)
@@ -0,0 +1,67 @@
+import json
+
+import app.services.parser as parser_mod
+from app.services.parser import parse_ipynb_bytes
+
+
+def notebook(nbformat: int = 4) -> bytes:
+    nb = {
+        "cells": [
+            {"id": "a", "cell_type": "markdown", "metadata": {}, "source": ["# Title\n", "text"]},
+            {
+                "id": "b",
+                "cell_type": "code",
+                "execution_count": 1,
+                "metadata": {},
+                "source": "fig",
+                "outputs": [
+                    {
+                        "output_type": "display_data",
+                        "metadata": {},
+                        "data": {"image/png": "iVBORw0KGgo=", "text/html": ["<b>x</b>"]},
+                    },
+                ],
+            },
+        ],
+        "metadata": {},
+        "nbformat": nbformat,
+        "nbformat_minor": 5,
+    }
+    return json.dumps(nb).encode("utf-8")
+
+
+def strip(cells):
+    return [c.model_dump(exclude={"id"}) for c in cells]
+
+
+def test_fast_and_strict_paths_agree():
+    content = notebook()
+    fast = parse_ipynb_bytes(content, "n.ipynb", "fast")
+    strict = parse_ipynb_bytes(content, "n.ipynb", "strict")
+    assert strip(fast) == strip(strict)
+    assert fast[1].outputs[0].data == {"image/png": "iVBORw0KGgo="}
+
+
+def test_fast_path_skips_nbformat_unless_sampled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(parser_mod.nbformat, "reads", lambda *a, **k: calls.append("reads"))
+    monkeypatch.setattr(parser_mod.nbformat, "validate", lambda *a, **k: calls.append("validate"))
+    monkeypatch.setattr(parser_mod, "PARSE_VALIDATE_SAMPLE_RATE", 0.0)
+    parse_ipynb_bytes(notebook(), "n.ipynb", "fast")
+    assert calls == []
+    monkeypatch.setattr(parser_mod, "PARSE_VALIDATE_SAMPLE_RATE", 1.0)
+    parse_ipynb_bytes(notebook(), "n.ipynb", "fast")
+    assert calls == ["validate"]
+
+
+def test_fast_path_defers_non_v4_notebooks_to_nbformat(monkeypatch):
+    seen = []
+    original = parser_mod.nbformat.reads
+
+    def spy(*args, **kwargs):
+        seen.append(True)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(parser_mod.nbformat, "reads", spy)
+    parse_ipynb_bytes(notebook(nbformat=3), "old.ipynb", "fast")
+    assert seen
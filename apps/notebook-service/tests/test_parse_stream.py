@@ -0,0 +1,94 @@
+import asyncio
+import gc
+import io
+import json
+import os
+import tempfile
+
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import app
+from app.services.parser import iter_ipynb_cells, parse_ipynb_bytes
+
+client = TestClient(app)
+
+
+def make_notebook() -> bytes:
+    nb = {
+        "cells": [
+            {"cell_type": "markdown", "metadata": {}, "source": ["# Title\n", "body"]},
+            {"cell_type": "raw", "metadata": {}, "source": "skip"},
+            {
+                "cell_type": "code",
+                "execution_count": 1,
+                "metadata": {},
+                "source": ["x = 1\n", "x"],
+                "outputs": [
+                    {"output_type": "stream", "name": "stdout", "text": ["a\n", "b\n"]},
+                    {
+                        "output_type": "execute_result",
+                        "execution_count": 1,
+                        "metadata": {},
+                        "data": {
+                            "text/plain": ["1"],
+                            "application/vnd.plotly.v1+json": {"data": [{"y": [1.5, 2]}]},
+                        },
+                    },
+                ],
+            },
+        ],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+    return json.dumps(nb).encode("utf-8")
+
+
+def test_parse_stream_emits_ndjson_cells():
+    files = {"file": ("big.ipynb", io.BytesIO(make_notebook()), "application/json")}
+    res = client.post("/parse/stream", files=files)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    cells = [json.loads(line) for line in res.text.splitlines() if line]
+    assert [c["index"] for c in cells] == [0, 2]
+    assert cells[0]["source"] == "# Title\nbody"
+    assert cells[1]["outputs"][0]["text"] == "a\nb\n"
+    fig = cells[1]["outputs"][1]["data"]["application/vnd.plotly.v1+json"]
+    assert fig["data"][0]["y"] == [1.5, 2]
+
+
+def test_stream_parser_matches_nbformat_parser():
+    content = make_notebook()
+    streamed = list(iter_ipynb_cells(io.BytesIO(content), "n.ipynb"))
+    parsed = parse_ipynb_bytes(content, "n.ipynb")
+    strip = lambda cells: [c.model_dump(exclude={"id"}) for c in cells]  # noqa: E731
+    assert strip(streamed) == strip(parsed)
+
+
+def test_parse_stream_reports_invalid_json_in_stream():
+    broken = b'{"cells": [{"cell_type": "markdown", "source": "a"}, {not-json'
+    files = {"file": ("broken.ipynb", io.BytesIO(broken), "application/json")}
+    res = client.post("/parse/stream", files=files)
+    lines = [json.loads(line) for line in res.text.splitlines() if line]
+    assert lines[0]["source"] == "a"
+    assert lines[-1] == {"error": "Invalid notebook file"}
+
+
+def test_parse_stream_removes_spooled_upload_when_body_is_never_sent(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    upload = UploadFile(io.BytesIO(make_notebook()), filename="big.ipynb")
+    res = asyncio.run(main.parse_stream(upload))
+    assert len(os.listdir(tmp_path)) == 1
+    # 送信を始める前に切断された場合など、本文を読まずにレスポンスを破棄する
+    del res
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+
+def test_parse_stream_removes_spooled_upload_after_sending(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    files = {"file": ("big.ipynb", io.BytesIO(make_notebook()), "application/json")}
+    assert client.post("/parse/stream", files=files).status_code == 200
+    assert os.listdir(tmp_path) == []
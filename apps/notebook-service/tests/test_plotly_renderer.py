@@ -0,0 +1,89 @@
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.schemas_export import ExportRequest
+from app.services.exporter import Exporter
+from app.services.plotly_renderer import PlotlyRenderer, RenderTimeout
+from app.services.visual_cache import VisualCache
+
+
+def png_bytes() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (4, 4), (0, 0, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def plotly_item(title: str) -> dict:
+    fig = {"data": [], "layout": {"title": {"text": title}}}
+    output = {"output_type": "display_data", "data": {"application/vnd.plotly.v1+json": fig}}
+    return {"type": "notebook_code", "source": "fig", "outputs": [output]}
+
+
+def test_batch_renders_each_figure_once_and_falls_back_to_placeholder(tmp_path, monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    calls = []
+
+    def fake_to_image(fig, format="png"):
+        calls.append(fig["layout"]["title"]["text"])
+        if fig["layout"]["title"]["text"] == "bad":
+            raise RuntimeError("kaleido failed")
+        return png_bytes()
+
+    monkeypatch.setattr(renderer_mod.pio, "to_image", fake_to_image)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        plotly_renderer=PlotlyRenderer(0),
+    )
+    items = [plotly_item("a"), plotly_item("a"), plotly_item("bad")]
+    rendered = exp._prerender_visuals(items)
+    assert sorted(calls) == ["a", "bad"]
+    sizes = [Image.open(BytesIO(rendered[i])).size for i in range(3)]
+    assert sizes == [(4, 4), (4, 4), (640, 360)]
+
+    path, _ = exp.render("job", ExportRequest(title="Batch", format="pdf", content=items))
+    assert sorted(calls) == ["a", "bad", "bad"]  # 失敗した図はキャッシュしない
+
+
+def test_pool_enforces_per_figure_timeout():
+    renderer = PlotlyRenderer(size=1, timeout=0.001)
+    try:
+        try:
+            renderer.render({"data": [], "layout": {}})
+        except RenderTimeout:
+            pass
+        else:  # pragma: no cover - 1ms で描画が終わることはない
+            raise AssertionError("expected timeout")
+        assert renderer.render_batch([{"data": [], "layout": {}}]) == [None]
+    finally:
+        renderer.shutdown()
+
+
+def test_in_process_renderer_enforces_timeout(monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    release = threading.Event()
+    monkeypatch.setattr(renderer_mod.pio, "to_image", lambda fig, format="png": release.wait(5))
+    renderer = PlotlyRenderer(0, timeout=0.05)
+    try:
+        with pytest.raises(RenderTimeout):
+            renderer.render({"data": [], "layout": {}})
+        assert renderer.render_batch([{"data": [], "layout": {}}]) == [None]
+    finally:
+        release.set()
+
+
+def test_process_workers_render_plotly_in_a_killable_process(tmp_path, monkeypatch):
+    from app.services import exporter as exporter_mod
+
+    monkeypatch.setenv("PLOTLY_RENDER_TIMEOUT", "7")
+    exp = exporter_mod._worker_exporter(str(tmp_path))
+    try:
+        assert exp.plotly_renderer.size == 1
+        assert exp.plotly_renderer.timeout == 7.0
+    finally:
+        exporter_mod._worker_exporters.pop(str(tmp_path), None)
@@ -0,0 +1,80 @@
+import base64
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+from app.schemas_export import ExportRequest
+from app.services.exporter import Exporter
+from app.services.plotly_renderer import PlotlyRenderer
+from app.services.prerender import VisualPool
+from app.services.visual_cache import VisualCache
+
+SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="50">'
+    '<rect width="100" height="50" fill="#0bf"/></svg>'
+)
+
+
+def png_b64(size=(8, 6)) -> str:
+    buf = BytesIO()
+    Image.new("RGB", size, (0, 128, 0)).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def code_item(data: dict) -> dict:
+    outputs = [{"output_type": "display_data", "data": data}]
+    return {"type": "notebook_code", "source": "x", "outputs": outputs}
+
+
+def test_prerender_collects_all_visuals_before_layout(tmp_path, monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    png = base64.b64decode(png_b64((3, 3)))
+    monkeypatch.setattr(renderer_mod.pio, "to_image", lambda fig, format="png": png)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        plotly_renderer=PlotlyRenderer(0),
+        visual_pool=VisualPool(workers=3),
+    )
+    items = [
+        {"type": "text_box", "content": "hello"},
+        code_item({"image/png": png_b64()}),
+        code_item({"image/svg+xml": SVG}),
+        code_item({"application/vnd.plotly.v1+json": {"data": [], "layout": {}}}),
+        {
+            "type": "notebook_code",
+            "source": "print(1)",
+            "outputs": [{"output_type": "stream", "text": "1"}],
+        },
+        code_item({"image/png": "!!not-base64!!"}),
+    ]
+    visuals = exp._prerender_visuals(items)
+    assert sorted(visuals) == [1, 2, 3]
+    assert Image.open(BytesIO(visuals[1])).size == (8, 6)
+    assert Image.open(BytesIO(visuals[3])).size == (3, 3)
+    exp.visual_pool.shutdown()
+
+
+def test_layout_uses_prerendered_bytes_from_pool_threads(tmp_path, monkeypatch):
+    import app.services.exporter as exporter_mod
+
+    threads = set()
+    original = exporter_mod.decode_png
+
+    def tracking(b64):
+        threads.add(threading.current_thread().name)
+        return original(b64)
+
+    monkeypatch.setattr(exporter_mod, "decode_png", tracking)
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(None, max_disk_bytes=0),
+        visual_pool=VisualPool(workers=2),
+    )
+    content = [code_item({"image/png": png_b64()}) for _ in range(4)]
+    for fmt in ("pptx", "pdf"):
+        path, _ = exp.render(f"job-{fmt}", ExportRequest(title="Pool", format=fmt, content=content))
+    assert threads and all(t.startswith("visual") for t in threads)
+    exp.visual_pool.shutdown()
@@ -0,0 +1,64 @@
+import os
+import time
+
+from fastapi.testclient import TestClient
+from pptx import Presentation
+
+from app.main import app, exporter
+from app.services.template_cache import TemplateCache
+
+client = TestClient(app)
+
+
+def make_template(path) -> str:
+    prs = Presentation()
+    prs.slides.add_slide(prs.slide_layouts[0]).shapes.title.text = "Cover"
+    prs.save(str(path))
+    return str(path)
+
+
+def test_cache_returns_independent_copies_and_reloads_on_change(tmp_path):
+    path = make_template(tmp_path / "corp.pptx")
+    cache = TemplateCache(max_entries=4)
+    a = cache.load(path)
+    a.slides.add_slide(a.slide_layouts[5])
+    b = cache.load(path)
+    assert len(a.slides) == 2 and len(b.slides) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    time.sleep(0.01)
+    prs = Presentation(path)
+    prs.slides.add_slide(prs.slide_layouts[5])
+    prs.save(path)
+    os.utime(path, None)
+    assert len(cache.load(path).slides) == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_is_bounded(tmp_path):
+    cache = TemplateCache(max_entries=2)
+    paths = [make_template(tmp_path / f"t{i}.pptx") for i in range(3)]
+    for p in paths:
+        cache.load(p)
+    assert cache.stats()["entries"] == 2
+    cache.load(paths[0])
+    assert cache.stats()["misses"] == 4
+
+
+def test_preflight_endpoint_validates_and_warms(tmp_path):
+    path = make_template(tmp_path / "upload.pptx")
+    res = client.post("/templates/preflight", json={"templatePath": path})
+    assert res.status_code == 200
+    assert res.json()["valid"] is True
+    hits = exporter.template_cache.stats()["hits"]
+    job = client.post("/export", json={"title": "T", "content": [], "templatePath": path}).json()
+    assert job["status"] == "completed"
+    assert exporter.template_cache.stats()["hits"] == hits + 1
+
+    bogus = tmp_path / "bogus.pptx"
+    bogus.write_bytes(b"NOT_A_PPTX")
+    res = client.post("/templates/preflight", json={"templatePath": str(bogus)})
+    assert res.json()["valid"] is False and res.json()["errors"]
+    missing_path = str(tmp_path / "missing.pptx")
+    missing = client.post("/templates/preflight", json={"templatePath": missing_path})
+    assert missing.status_code == 404
@@ -0,0 +1,79 @@
+from io import BytesIO
+
+from PIL import Image
+
+from app.schemas_export import ExportRequest
+from app.services.exporter import Exporter
+from app.services.fragment_cache import FragmentCache
+from app.services.visual_cache import VisualCache, visual_key
+
+
+def png_bytes(color=(255, 0, 0)) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (4, 4), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_key_depends_on_payload_and_params():
+    fig = {"data": [{"y": [1, 2]}], "layout": {}}
+    same = {"layout": {}, "data": [{"y": [1, 2]}]}
+    png = {"format": "png"}
+    assert visual_key("plotly", fig, png) == visual_key("plotly", same, png)
+    assert visual_key("plotly", fig, png) != visual_key("plotly", fig, {"format": "svg"})
+    assert visual_key("svg", "<svg/>") != visual_key("svg", "<svg />")
+
+
+def test_memory_tier_is_size_bounded_lru(tmp_path):
+    cache = VisualCache(None, max_memory_bytes=25, max_disk_bytes=0)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"x" * 10)
+    assert cache.get("a") is not None  # a を最近使用に
+    cache.put("c", b"x" * 10)  # b が追い出される
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    st = cache.stats()
+    assert st["misses"] == 1 and st["hits_memory"] == 3 and st["evictions"] == 1
+
+
+def test_disk_tier_survives_restart_and_evicts(tmp_path):
+    cache = VisualCache(str(tmp_path), max_memory_bytes=0, max_disk_bytes=25)
+    cache.put("a", b"1" * 10)
+    cache.put("b", b"2" * 10)
+    cache.put("c", b"3" * 10)
+    assert not (tmp_path / "a.png").exists()
+    again = VisualCache(str(tmp_path), max_memory_bytes=1024, max_disk_bytes=25)
+    assert again.get("c") == b"3" * 10
+    assert again.get("c") == b"3" * 10
+    assert again.stats()["hits_disk"] == 1 and again.stats()["hits_memory"] == 1
+
+
+def test_reexport_reuses_rendered_plotly(tmp_path, monkeypatch):
+    import app.services.plotly_renderer as renderer_mod
+
+    calls = []
+
+    def fake_to_image(fig, format="png"):
+        calls.append(fig)
+        return png_bytes()
+
+    monkeypatch.setattr(renderer_mod.pio, "to_image", fake_to_image)
+    # フラグメントキャッシュを有効にすると 3 回目は可視出力のキャッシュも参照しないため無効にする
+    exp = Exporter(
+        str(tmp_path),
+        visual_cache=VisualCache(str(tmp_path / "cache")),
+        fragment_cache=FragmentCache(None),
+    )
+    item = {
+        "type": "notebook_code",
+        "source": "fig",
+        "outputs": [
+            {
+                "output_type": "display_data",
+                "data": {"application/vnd.plotly.v1+json": {"data": [], "layout": {}}},
+            }
+        ],
+    }
+    for fmt in ("pptx", "pdf", "pptx"):
+        exp.render(f"job-{fmt}", ExportRequest(title="Cached", content=[item], format=fmt))
+    assert len(calls) == 1
+    assert exp.visual_cache.stats()["hits_memory"] == 2